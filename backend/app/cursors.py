@@ -0,0 +1,42 @@
+"""
+Cursores opacos para paginación keyset.
+
+Un cursor codifica los valores de ordenamiento del último elemento de una página
+(por ejemplo timestamp e id) en base64 URL-safe. La página siguiente se obtiene con
+WHERE (timestamp, id) < (cursor) en lugar de OFFSET, por lo que su costo no depende
+de cuántas páginas se hayan recorrido.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List
+
+
+class InvalidCursor(ValueError):
+    """El cursor recibido no se pudo decodificar"""
+
+
+def encode_cursor(*values: Any) -> str:
+    """Codificar los valores de ordenamiento de un elemento como token opaco"""
+    payload = [
+        {"dt": value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> List[Any]:
+    """Decodificar un token generado por encode_cursor con `size` valores"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        values = [
+            datetime.fromisoformat(value["dt"]) if isinstance(value, dict) else value
+            for value in payload
+        ]
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor(f"Cursor inválido: {token}") from e
+    if len(values) != size:
+        raise InvalidCursor(f"Cursor inválido: {token}")
+    return values
@@ -1,8 +1,18 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import sessionmaker
 import os
+import time
 from dotenv import load_dotenv
 
+from app.db_pool import PoolMonitor, TimedQueuePool, TimedAsyncAdaptedQueuePool, pool_options
+from app.log_config import get_logger
+from app import sqlite_local
+from app.metrics import record_db_time
+
+logger = get_logger(__name__)
+
 load_dotenv()
 
 # Obtener DATABASE_URL de las variables de entorno
@@ -34,14 +44,18 @@ connect_args = {}
 if "sqlite" in SQLALCHEMY_DATABASE_URL:
     connect_args = {"check_same_thread": False}
 
-# Crear engine con pool_pre_ping para verificar conexiones
+# Crear engine con el pool configurado por entorno (ver app/db_pool.py)
 try:
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
         connect_args=connect_args,
-        pool_pre_ping=True,  # Verificar conexiones antes de usarlas
-        echo=False
+        poolclass=TimedQueuePool,
+        echo=False,
+        **pool_options()
     )
+    pool_monitor = PoolMonitor(engine, "sync")
+    if engine.url.get_backend_name() == "sqlite":
+        sqlite_local.configure_engine(engine)
     print(f"[INFO] Database engine created successfully")
     print(f"[INFO] Database URL: {SQLALCHEMY_DATABASE_URL[:50]}...")  # Solo primeros 50 chars por seguridad
 except Exception as e:
@@ -50,3 +64,83 @@ except Exception as e:
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def run_query(query, *args):
+    """Correr una consulta de lectura query(db, *args) con una sesión propia
+
+    Si la conexión estaba cortada (el pool ya la invalidó) se reintenta una vez.
+    """
+    start = time.perf_counter()
+    try:
+        for attempt in range(2):
+            db = SessionLocal()
+            try:
+                return query(db, *args)
+            except DBAPIError as e:
+                if attempt or not e.connection_invalidated:
+                    raise
+                logger.warning(f"Conexión a la base cortada, reintentando la consulta: {' '.join(str(e.orig).split())[:100]}")
+            finally:
+                db.close()
+    finally:
+        record_db_time(time.perf_counter() - start)
+
+# Modo local SQLite: todas las escrituras de la API pasan por un único hilo escritor
+sqlite_writer = None
+if engine.url.get_backend_name() == "sqlite" and sqlite_local.SQLITE_SINGLE_WRITER:
+    sqlite_writer = sqlite_local.SQLiteWriter(SQLALCHEMY_DATABASE_URL, connect_args)
+    print("[INFO] SQLite en modo WAL con un único hilo escritor", flush=True)
+
+def run_write(write, *args):
+    """Correr una escritura write(db, *args), que confirma su propia transacción, con una sesión propia
+
+    Con SQLite se ejecuta en el hilo escritor (ver app/sqlite_local.py).
+    """
+    start = time.perf_counter()
+    try:
+        if sqlite_writer is not None:
+            return sqlite_writer.submit(write, *args)
+        db = SessionLocal()
+        try:
+            return write(db, *args)
+        finally:
+            db.close()
+    finally:
+        record_db_time(time.perf_counter() - start)
+
+# Engine asíncrono para los endpoints de lectura (ver app/db_async.py): mismo servidor con
+# asyncpg o aiosqlite. Los scripts y las escrituras siguen usando engine/SessionLocal.
+# Con ASYNC_DB_ENABLED=false, o sin el driver instalado, db_async corre las mismas
+# consultas con el engine sync en el threadpool.
+ASYNC_DB_ENABLED = os.getenv("ASYNC_DB_ENABLED", "true").lower() in ("1", "true", "yes")
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def async_database_url(url: str):
+    """URL del engine sync con el driver asíncrono del mismo dialecto"""
+    url = make_url(url)
+    url = url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+    if "sslmode" in url.query:
+        # asyncpg recibe el modo SSL como ssl=require, no sslmode=require
+        url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": url.query["sslmode"]})
+    return url
+
+async_engine = None
+async_pool_monitor = None
+AsyncSessionLocal = None
+if ASYNC_DB_ENABLED:
+    try:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        async_engine = create_async_engine(
+            async_database_url(SQLALCHEMY_DATABASE_URL),
+            # aiosqlite usa NullPool por defecto: una conexión (y un hilo) nueva por consulta
+            poolclass=TimedAsyncAdaptedQueuePool,
+            echo=False,
+            **pool_options()
+        )
+        async_pool_monitor = PoolMonitor(async_engine.sync_engine, "async")
+        if async_engine.url.get_backend_name() == "sqlite":
+            sqlite_local.configure_engine(async_engine.sync_engine)
+        AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+        print(f"[INFO] Async database engine created ({async_engine.url.drivername})")
+    except Exception as e:
+        print(f"[WARNING] No se pudo crear el engine asíncrono ({str(e)}), las lecturas usan el threadpool")
@@ -0,0 +1,172 @@
+"""
+Versiones async de las consultas de lectura, para los endpoints async de main.py.
+
+Cada función corre la misma consulta sync de db_models o test_executor (por ejemplo
+_get_test_results(db, ...)) con AsyncSession.run_sync sobre el engine asíncrono
+(asyncpg o aiosqlite, ver app/database.py): mientras la base responde, el event loop
+atiende otros requests en lugar de tener un hilo del threadpool esperando por cada uno.
+Sin engine asíncrono (ASYNC_DB_ENABLED=false o sin el driver) la consulta corre con el
+engine sync en el threadpool.
+
+Las funciones tienen el mismo nombre y los mismos argumentos que en db_models, así que
+comparten las entradas de la caché de consultas. Las escrituras, la exportación y los
+scripts (migrar_sqlite_a_postgresql.py, retención, rollup) siguen siendo sync.
+
+Las tablas dim_* se cargan al arrancar (load_dimensions): traducir un id o filtrar por
+un nombre desconocido las vuelve a leer con la misma sesión async de la consulta
+(read_with_session), sin abrir una conexión sync.
+"""
+import time
+from datetime import datetime, date
+from typing import Optional, Dict, Any, List, Tuple
+
+from sqlalchemy.exc import DBAPIError
+from starlette.concurrency import run_in_threadpool
+
+from app.database import AsyncSessionLocal, run_query
+from app.log_config import get_logger
+from app.metrics import record_db_time
+from app.query_cache import cached_query
+from app.dimensions import read_with_session
+from app import db_models, test_executor
+
+logger = get_logger(__name__)
+
+
+async def run_query_async(query, *args):
+    """Correr una consulta query(db, *args) sin bloquear el event loop (reintenta como run_query)"""
+    if AsyncSessionLocal is None:
+        return await run_in_threadpool(run_query, query, *args)
+    start = time.perf_counter()
+    try:
+        for attempt in range(2):
+            try:
+                async with AsyncSessionLocal() as db:
+                    return await db.run_sync(read_with_session, query, *args)
+            except DBAPIError as e:
+                if attempt or not e.connection_invalidated:
+                    raise
+                logger.warning(f"Conexión a la base cortada, reintentando la consulta: {' '.join(str(e.orig).split())[:100]}")
+    finally:
+        record_db_time(time.perf_counter() - start)
+
+
+async def data_version() -> str:
+    """Versión barata de los datos (ver db_models.data_version)"""
+    return await run_query_async(db_models._data_version)
+
+
+async def get_test_result(result_id: str) -> Optional[Dict[str, Any]]:
+    """Obtener un resultado por ID"""
+    return await run_query_async(db_models._get_test_result, result_id)
+
+
+@cached_query
+async def get_test_results(
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None,
+    resultado_final: Optional[str] = None,
+    limit: int = 100,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """Obtener resultados con filtros (ver db_models.get_test_results)"""
+    return await run_query_async(
+        db_models._get_test_results, test_type, environment, resultado_final, limit, offset, cursor, fields
+    )
+
+
+@cached_query
+async def search_test_results(
+    q: str,
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None,
+    resultado_final: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Búsqueda de texto completo (ver db_models.search_test_results)"""
+    return await run_query_async(
+        db_models._search_test_results, q, test_type, environment, resultado_final, limit, cursor, fields
+    )
+
+
+@cached_query
+async def get_recent_results(hours: int = 24, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Obtener resultados recientes (con `fields`, solo esas columnas)"""
+    return await run_query_async(db_models._get_recent_results, hours, fields)
+
+
+async def run_exists(run_id: str) -> bool:
+    """Si hay al menos un resultado de esa ejecución"""
+    return await run_query_async(db_models._run_exists, run_id)
+
+
+@cached_query
+async def get_trends(
+    bucket: str = "1h",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Tendencia por bucket de tiempo (ver db_models.get_trends)"""
+    return await run_query_async(db_models._get_trends, bucket, since, until, test_type, environment)
+
+
+@cached_query
+async def get_statistics(
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Estadísticas agrupadas desde el rollup"""
+    return await run_query_async(db_models._get_statistics, test_type, environment)
+
+
+@cached_query
+async def get_latency(
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None,
+    categoria: Optional[str] = None,
+    group_by: Optional[List[str]] = None,
+    exact: bool = False
+) -> List[Dict[str, Any]]:
+    """Percentiles de tiempo de respuesta (ver db_models.get_latency)"""
+    return await run_query_async(
+        db_models._get_latency, since, until, test_type, environment, categoria, group_by, exact
+    )
+
+
+@cached_query
+async def get_flaky_questions(
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None,
+    min_runs: int = 5,
+    sort: str = "flakiness",
+    limit: int = 50
+) -> List[Dict[str, Any]]:
+    """Preguntas ordenadas por flakiness o fail_rate (ver db_models.get_flaky_questions)"""
+    return await run_query_async(db_models._get_flaky_questions, test_type, environment, min_runs, sort, limit)
+
+
+@cached_query
+async def get_summary(
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None
+) -> Dict[str, Any]:
+    """Resumen general desde el rollup"""
+    return await run_query_async(db_models._get_summary, test_type, environment)
+
+
+async def get_test_status(test_id: str) -> Optional[Dict]:
+    """Estado de una ejecución de test"""
+    return await run_query_async(test_executor._get_test_status, test_id)
+
+
+async def get_running_tests() -> List[str]:
+    """test_ids que están corriendo o en cola"""
+    return await run_query_async(test_executor._get_running_tests)
@@ -1,12 +1,97 @@
 """
 Funciones para trabajar con PostgreSQL usando SQLAlchemy
 """
-from typing import Optional, Dict, Any, List
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
-from app.database import SessionLocal
-from app.models import TestResult
+import io
+import os
+import re
+import uuid
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+from datetime import datetime, date, timedelta, timezone
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func, and_, or_, tuple_, case, cast, select, exists, literal, literal_column, true, false, Integer, Float
+from sqlalchemy.sql import table, column
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.database import SessionLocal, run_query, run_write
+from app.log_config import get_logger
+from app.models import TestResult, ResultRollup, LatencySketch, QuestionHistory
+from app.rollup import update_rollup, sketch_quantiles
+from app.flakiness import update_question_history, outcomes_string, question_hash
+from app.text_store import TEXT_FIELDS, text_hash, text_column, store_texts
+from app.dimensions import (
+    RESULT_DIMENSIONS, result_column, decode, decode_result, dimension_filter, id_column,
+    split_resultado, resolve_dimensions
+)
+from app.query_cache import cached_query, bump_generation
+from app.cursors import encode_cursor, decode_cursor
+
+logger = get_logger(__name__)
+
+# Columnas que se escriben al ingerir un resultado (todas salvo el id autoincremental);
+# los textos repetidos van a text_blobs y la fila guarda su hash (ver app/text_store.py),
+# y las dimensiones y el resultado se guardan como enteros (ver app/dimensions.py)
+INSERT_COLUMNS = [
+    "test_id", "categoria_id", "pregunta", "palabras_clave_hash", "respuesta_bot_hash",
+    "validacion_correcta", "palabras_encontradas_hash", "passed", "fail_reason_id",
+    "tiempo_segundos", "timestamp", "error", "test_type_id", "environment_id", "sheet_name_id",
+    "pregunta_hash", "run_id"
+]
+
+# Clave de idempotencia (índice único uq_test_results_run_question): el mismo resultado
+# reenviado por la misma ejecución no se duplica; otra ejecución, test_type o environment
+# con el mismo test_id (el número de la pregunta en la planilla) es otro resultado
+IDEMPOTENCY_KEY_COLUMNS = ["run_id", "test_type_id", "environment_id", "test_id", "pregunta_hash"]
+
+# Campos de un resultado expuestos por la API, en orden, y la columna de la que se leen
+# (las dimensiones se leen como código y _row_to_dict las traduce al nombre)
+RESULT_FIELDS = {
+    "id": TestResult.id,
+    "run_id": TestResult.run_id,
+    "test_id": TestResult.test_id,
+    "categoria": result_column("categoria"),
+    "pregunta": TestResult.pregunta,
+    "palabras_clave": text_column("palabras_clave"),
+    "respuesta_bot": text_column("respuesta_bot"),
+    "validacion_correcta": TestResult.validacion_correcta,
+    "palabras_encontradas": text_column("palabras_encontradas"),
+    "resultado_final": result_column("resultado_final"),
+    "tiempo_segundos": TestResult.tiempo_segundos,
+    "timestamp": TestResult.timestamp,
+    "error": TestResult.error,
+    "test_type": result_column("test_type"),
+    "environment": result_column("environment"),
+    "sheet_name": result_column("sheet_name"),
+}
+
+# Tamaños de bucket aceptados por get_trends, en segundos
+TREND_BUCKETS = {"15m": 15 * 60, "1h": 60 * 60, "1d": 24 * 60 * 60}
+
+class InvalidFields(ValueError):
+    """El parámetro fields pide columnas que no existen"""
+
+class InvalidSearch(ValueError):
+    """El texto de búsqueda no tiene ninguna palabra"""
+
+class InvalidLatencyQuery(ValueError):
+    """group_by desconocido o percentiles exactos pedidos fuera de PostgreSQL"""
+
+# Percentiles de tiempo_segundos que devuelven /api/statistics y /api/latency
+LATENCY_PERCENTILES = {"p50": 0.5, "p90": 0.9, "p95": 0.95, "p99": 0.99}
+
+# Dimensiones por las que se puede agrupar /api/latency
+LATENCY_GROUP_BY = ["test_type", "environment", "categoria", "day"]
+
+# Estados de una pregunta al comparar dos ejecuciones (iter_run_diff)
+RUN_DIFF_STATUSES = ["newly_failing", "newly_passing", "still_failing", "still_passing", "added", "removed"]
+
+# Palabras de q que se usan como máximo en una búsqueda
+SEARCH_MAX_TERMS = 10
+
+# Tabla FTS5 de SQLite creada por la migración 0004
+_fts_table = table("test_results_fts", column("rowid"))
+
+# A partir de este tamaño de lote se usa COPY en PostgreSQL en lugar de INSERT multi-fila
+BULK_COPY_THRESHOLD = int(os.getenv("BULK_COPY_THRESHOLD", "1000"))
 
 def get_db():
     """Obtener sesión de base de datos"""
@@ -16,269 +101,893 @@ def get_db():
     finally:
         db.close()
 
+def new_run_id() -> str:
+    """run_id para resultados que llegan sin uno: los de un mismo envío lo comparten"""
+    return uuid.uuid4().hex
+
 def create_test_result(data: Dict[str, Any]) -> Dict[str, Any]:
-    """Crear un nuevo resultado de test en PostgreSQL"""
-    db = SessionLocal()
+    """
+    Crear un nuevo resultado de test en PostgreSQL.
+    Si ya existe uno con la misma clave de idempotencia (reintento), retorna el existente.
+    """
+    row = _normalize_insert_row(data, new_run_id())
+    status = run_write(_create_test_result, row)
+    
+    if status["status"] == "duplicate":
+        logger.debug("Registro duplicado ignorado", extra={"result_id": status["id"], "test_id": row["test_id"]})
+        return get_test_result(status["id"])
+    
+    logger.debug("Registro guardado", extra={"result_id": status["id"], "test_id": row["test_id"]})
+    
+    # Convertir a diccionario (id como string para compatibilidad con API)
+    result = {field: row[field] for field in RESULT_FIELDS if field != "id"}
+    result["id"] = status["id"]
+    return result
+
+def _create_test_result(db: Session, row: Dict[str, Any]) -> Dict[str, Any]:
     try:
-        # Crear instancia del modelo
-        db_result = TestResult(**data)
-        
-        # Agregar a la sesión y commit
-        db.add(db_result)
+        status = _insert_rows(db, [row])[0]
         db.commit()
-        db.refresh(db_result)
-        
-        # Verificar que realmente se guardó
-        if not db_result.id:
-            raise Exception("El registro no se guardó correctamente - no tiene ID")
-        
-        print(f"[DB] Registro guardado en PostgreSQL - ID: {db_result.id}, Test ID: {db_result.test_id}", flush=True)
+        if status["status"] == "created":
+            bump_generation()
+        return status
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"Error en create_test_result: {str(e)}")
+        raise
+
+def create_test_results_batch(rows: List[Dict[str, Any]], run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Guardar un lote de resultados en una sola sesión y una sola transacción.
+    Retorna un estado por fila, en el mismo orden: {"status": "created" | "duplicate", "id": ...}
+    o {"status": "error", "error": ...}. Una fila con error no aborta el resto del lote.
+    Los duplicados (misma IDEMPOTENCY_KEY_COLUMNS) se detectan en la base con ON CONFLICT DO NOTHING.
+    Las filas sin run_id usan `run_id` (por ejemplo el header Idempotency-Key, para que un
+    reintento del mismo lote se deduplique); sin él comparten uno nuevo y solo se
+    deduplican dentro del lote.
+    """
+    if not rows:
+        return []
+    
+    run_id = run_id or new_run_id()
+    rows = [_normalize_insert_row(row, run_id) for row in rows]
+    return run_write(_create_test_results_batch, rows)
+
+def _create_test_results_batch(db: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    try:
+        try:
+            statuses = _insert_rows(db, rows)
+        except Exception as e:
+            # El INSERT multi-fila falló: aislar las filas problemáticas con un SAVEPOINT por fila
+            db.rollback()
+            logger.warning(f"Falló el insert masivo ({str(e).splitlines()[0]}), reintentando fila por fila")
+            statuses = _insert_rows_individually(db, rows)
         
-        # Convertir a diccionario
-        result = {
-            "id": str(db_result.id),  # Convertir a string para compatibilidad con API
-            "test_id": db_result.test_id,
-            "categoria": db_result.categoria,
-            "pregunta": db_result.pregunta,
-            "palabras_clave": db_result.palabras_clave,
-            "respuesta_bot": db_result.respuesta_bot,
-            "validacion_correcta": db_result.validacion_correcta,
-            "palabras_encontradas": db_result.palabras_encontradas,
-            "resultado_final": db_result.resultado_final,
-            "tiempo_segundos": db_result.tiempo_segundos,
-            "timestamp": db_result.timestamp,
-            "error": db_result.error,
-            "test_type": db_result.test_type,
-            "environment": db_result.environment,
-            "sheet_name": db_result.sheet_name
-        }
+        db.commit()
         
-        return result
+        created = sum(1 for status in statuses if status["status"] == "created")
+        duplicates = sum(1 for status in statuses if status["status"] == "duplicate")
+        if created:
+            bump_generation()
+        logger.debug("Lote guardado", extra={"rows": len(rows), "created": created, "duplicates": duplicates})
+        return statuses
     except Exception as e:
         db.rollback()
-        print(f"[ERROR] Error en create_test_result: {str(e)}", flush=True)
-        import traceback
-        print(f"[TRACEBACK] {traceback.format_exc()}", flush=True)
+        logger.error(f"Error en create_test_results_batch: {str(e)}")
         raise
+
+def _normalize_insert_row(data: Dict[str, Any], run_id: str) -> Dict[str, Any]:
+    """
+    Completar una fila con todas las columnas de INSERT_COLUMNS (executemany requiere las
+    mismas claves), los textos que se guardan aparte en text_blobs y los nombres de las
+    dimensiones (los ids los completa resolve_dimensions al insertar)
+    """
+    row = {column: data.get(column) for column in INSERT_COLUMNS}
+    if not row["run_id"]:
+        row["run_id"] = run_id
+    if row["timestamp"] is None:
+        row["timestamp"] = datetime.utcnow()
+    if row["validacion_correcta"] is None:
+        row["validacion_correcta"] = False
+    row["pregunta_hash"] = question_hash(row["pregunta"])
+    for field, hash_column in TEXT_FIELDS.items():
+        row[field] = data.get(field)
+        row[hash_column] = text_hash(row[field])
+    for field in RESULT_DIMENSIONS:
+        row[field] = data.get(field)
+    row["passed"], row["fail_reason"] = split_resultado(row["resultado_final"])
+    return row
+
+def _idempotency_key(row: Dict[str, Any]) -> tuple:
+    return tuple(row[column] for column in IDEMPOTENCY_KEY_COLUMNS)
+
+def _insert_statement(db: Session):
+    """INSERT ... ON CONFLICT (clave de idempotencia) DO NOTHING RETURNING id y clave, según el dialecto"""
+    dialect_insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    return dialect_insert(TestResult).on_conflict_do_nothing(
+        index_elements=IDEMPOTENCY_KEY_COLUMNS
+    ).returning(TestResult.id, *[getattr(TestResult, column) for column in IDEMPOTENCY_KEY_COLUMNS])
+
+def _insert_rows(db: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Insertar filas ya normalizadas ignorando las que ya existen.
+    Retorna un estado por fila, en el orden recibido, con el id nuevo o el existente.
+    """
+    # Las dimensiones van primero: sus ids son parte de la clave de idempotencia
+    resolve_dimensions(db, rows)
+    
+    # Duplicados dentro del mismo lote: solo se envía la primera aparición
+    unique_rows = {}
+    for row in rows:
+        unique_rows.setdefault(_idempotency_key(row), row)
+    to_insert = list(unique_rows.values())
+    
+    # Los textos van antes que las filas: el trigger de search_vector (PostgreSQL) y el
+    # de FTS5 (SQLite) leen la respuesta desde text_blobs al insertar
+    store_texts(db, to_insert)
+    
+    if db.get_bind().dialect.name == "postgresql" and len(to_insert) >= BULK_COPY_THRESHOLD:
+        returned = _copy_insert(db, to_insert)
+    else:
+        # SQLAlchemy agrupa el executemany en INSERT ... VALUES (...), (...) ON CONFLICT DO NOTHING RETURNING
+        returned = db.execute(
+            _insert_statement(db),
+            [{column: row[column] for column in INSERT_COLUMNS} for row in to_insert]
+        ).all()
+    inserted = {tuple(key): row_id for row_id, *key in returned}
+    
+    # El rollup y el historial por pregunta se actualizan en la misma transacción,
+    # solo con las filas realmente insertadas
+    update_rollup(db, [unique_rows[key] for key in inserted])
+    update_question_history(db, [unique_rows[key] for key in inserted])
+    
+    # Las filas que no volvieron en el RETURNING ya existían: buscar sus ids en una sola consulta
+    missing = [key for key in unique_rows if key not in inserted]
+    existing = {}
+    if missing:
+        key_columns = [getattr(TestResult, column) for column in IDEMPOTENCY_KEY_COLUMNS]
+        query = db.query(TestResult.id, *key_columns).filter(tuple_(*key_columns).in_(missing))
+        existing = {tuple(key): row_id for row_id, *key in query}
+    
+    statuses = []
+    seen = set()
+    for row in rows:
+        key = _idempotency_key(row)
+        if key in inserted and key not in seen:
+            statuses.append({"status": "created", "id": str(inserted[key])})
+        else:
+            row_id = inserted.get(key) or existing.get(key)
+            statuses.append({"status": "duplicate", "id": str(row_id) if row_id else None})
+        seen.add(key)
+    return statuses
+
+def _insert_rows_individually(db: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Insertar fila por fila dentro de la misma transacción, reportando el error de cada una"""
+    statuses = []
+    for row in rows:
+        try:
+            with db.begin_nested():
+                statuses.extend(_insert_rows(db, [row]))
+        except Exception as e:
+            statuses.append({"status": "error", "error": str(e).splitlines()[0]})
+    return statuses
+
+def _copy_insert(db: Session, rows: List[Dict[str, Any]]) -> List[tuple]:
+    """
+    Insertar con COPY (PostgreSQL): se copia a una tabla temporal y luego
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING para obtener los ids.
+    """
+    connection = db.connection()
+    dialect = connection.dialect
+    table = TestResult.__table__
+    column_defs = ", ".join(
+        f"{column} {table.c[column].type.compile(dialect=dialect)}" for column in INSERT_COLUMNS
+    )
+    column_list = ", ".join(INSERT_COLUMNS)
+    key_list = ", ".join(IDEMPOTENCY_KEY_COLUMNS)
+    
+    connection.exec_driver_sql("DROP TABLE IF EXISTS _ingest_buffer")
+    connection.exec_driver_sql(
+        f"CREATE TEMP TABLE _ingest_buffer (_ord integer, {column_defs}) ON COMMIT DROP"
+    )
+    
+    buffer = io.StringIO()
+    for ord_, row in enumerate(rows):
+        values = [str(ord_)] + [_copy_value(row[column]) for column in INSERT_COLUMNS]
+        buffer.write("\t".join(values))
+        buffer.write("\n")
+    buffer.seek(0)
+    
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY _ingest_buffer (_ord, {column_list}) FROM STDIN", buffer)
     finally:
-        db.close()
+        cursor.close()
+    
+    result = connection.exec_driver_sql(
+        f"INSERT INTO test_results ({column_list}) "
+        f"SELECT {column_list} FROM _ingest_buffer ORDER BY _ord "
+        f"ON CONFLICT ({key_list}) DO NOTHING "
+        f"RETURNING id, {key_list}"
+    )
+    return [tuple(row) for row in result]
+
+def _copy_value(value: Any) -> str:
+    """Serializar un valor al formato de texto de COPY"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+def data_version() -> str:
+    """Versión barata de los datos (máximo id y total del rollup): cambia con cada alta o baja"""
+    return run_query(_data_version)
+
+def _data_version(db: Session) -> str:
+    max_id, total = db.execute(select(
+        select(func.max(TestResult.id)).scalar_subquery(),
+        select(func.sum(ResultRollup.count)).scalar_subquery()
+    )).one()
+    return f"{max_id or 0}-{int(total or 0)}"
+
+def _resultado_filter(resultado_final: str):
+    """'FAIL' incluye todas sus variantes ('FAIL (JSON)', etc.), como en estadísticas y tendencias"""
+    # true()/false() se escriben como literales: SQLite puede usar el índice parcial WHERE passed = 0
+    if resultado_final == "FAIL":
+        return TestResult.passed == false()
+    if resultado_final == "PASS":
+        return TestResult.passed == true()
+    return dimension_filter("fail_reason", resultado_final)
+
+def _utc_naive(value: datetime) -> datetime:
+    """Los timestamps se guardan en UTC sin zona; convertir filtros con zona a ese formato"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Convertir el parámetro `fields=a,b,c` en la lista de columnas a leer.
+    Siempre incluye id y timestamp (necesarios para el cursor). None = todas las columnas.
+    """
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in RESULT_FIELDS]
+    if unknown:
+        raise InvalidFields(f"Campos desconocidos: {', '.join(unknown)}. Disponibles: {', '.join(RESULT_FIELDS)}")
+    return [field for field in RESULT_FIELDS if field in ("id", "timestamp") or field in requested]
+
+def _row_to_dict(row, fields: List[str]) -> Dict[str, Any]:
+    """Convertir una fila de columnas seleccionadas a diccionario (id como string, dimensiones con su nombre)"""
+    result = decode_result(dict(zip(fields, row)))
+    if "id" in result:
+        result["id"] = str(result["id"])
+    return result
 
 def get_test_result(result_id: str) -> Optional[Dict[str, Any]]:
     """Obtener un resultado por ID"""
-    db = SessionLocal()
+    return run_query(_get_test_result, result_id)
+
+def _get_test_result(db: Session, result_id: str) -> Optional[Dict[str, Any]]:
+    # Intentar convertir a int primero (PostgreSQL usa int)
     try:
-        # Intentar convertir a int primero (PostgreSQL usa int)
-        try:
-            id_int = int(result_id)
-        except ValueError:
-            return None
-        
-        db_result = db.query(TestResult).filter(TestResult.id == id_int).first()
-        
-        if not db_result:
-            return None
-        
-        return {
-            "id": str(db_result.id),
-            "test_id": db_result.test_id,
-            "categoria": db_result.categoria,
-            "pregunta": db_result.pregunta,
-            "palabras_clave": db_result.palabras_clave,
-            "respuesta_bot": db_result.respuesta_bot,
-            "validacion_correcta": db_result.validacion_correcta,
-            "palabras_encontradas": db_result.palabras_encontradas,
-            "resultado_final": db_result.resultado_final,
-            "tiempo_segundos": db_result.tiempo_segundos,
-            "timestamp": db_result.timestamp,
-            "error": db_result.error,
-            "test_type": db_result.test_type,
-            "environment": db_result.environment,
-            "sheet_name": db_result.sheet_name
-        }
-    finally:
-        db.close()
+        id_int = int(result_id)
+    except ValueError:
+        return None
+    
+    row = db.query(*RESULT_FIELDS.values()).filter(TestResult.id == id_int).first()
+    
+    if not row:
+        return None
+    
+    return _row_to_dict(row, list(RESULT_FIELDS))
 
+@cached_query
 def get_test_results(
     test_type: Optional[str] = None,
     environment: Optional[str] = None,
     resultado_final: Optional[str] = None,
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Obtener resultados con filtros.
+    Con `cursor` (ver result_cursor) se continúa después del último resultado de la
+    página anterior usando el índice, sin recorrer las filas ya vistas como hace OFFSET.
+    Con `fields` (ver parse_fields) solo se leen esas columnas.
+    """
+    return run_query(_get_test_results, test_type, environment, resultado_final, limit, offset, cursor, fields)
+
+def _get_test_results(
+    db: Session,
+    test_type: Optional[str],
+    environment: Optional[str],
+    resultado_final: Optional[str],
+    limit: int,
+    offset: int,
+    cursor: Optional[str],
+    fields: Optional[List[str]]
 ) -> List[Dict[str, Any]]:
-    """Obtener resultados con filtros"""
+    fields = fields or list(RESULT_FIELDS)
+    query = db.query(*[RESULT_FIELDS[field] for field in fields])
+    
+    # Aplicar filtros
+    if test_type:
+        query = query.filter(dimension_filter("test_type", test_type))
+    if environment:
+        query = query.filter(dimension_filter("environment", environment))
+    if resultado_final:
+        query = query.filter(_resultado_filter(resultado_final))
+    if cursor:
+        cursor_timestamp, cursor_id = decode_cursor(cursor, 2)
+        query = query.filter(
+            tuple_(TestResult.timestamp, TestResult.id) < tuple_(cursor_timestamp, cursor_id)
+        )
+    
+    # Ordenar por timestamp descendente (id como desempate para que el cursor sea estable)
+    query = query.order_by(TestResult.timestamp.desc(), TestResult.id.desc())
+    
+    # Aplicar paginación
+    results = query.offset(offset).limit(limit).all()
+    
+    # Convertir a lista de diccionarios
+    return [_row_to_dict(row, fields) for row in results]
+
+def result_cursor(result: Dict[str, Any]) -> str:
+    """Cursor que apunta inmediatamente después de este resultado"""
+    return encode_cursor(result["timestamp"], int(result["id"]))
+
+def iter_test_results(
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None,
+    resultado_final: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[List[str]] = None,
+    batch_size: int = 1000
+) -> Iterator[Dict[str, Any]]:
+    """
+    Recorrer todos los resultados que cumplan los filtros sin cargarlos en memoria.
+    Usa un cursor del lado del servidor (stream_results / yield_per): en memoria
+    solo hay `batch_size` filas a la vez. La sesión se cierra al agotar el iterador.
+    """
+    fields = fields or list(RESULT_FIELDS)
     db = SessionLocal()
     try:
-        query = db.query(TestResult)
+        query = db.query(*[RESULT_FIELDS[field] for field in fields])
         
         # Aplicar filtros
         if test_type:
-            query = query.filter(TestResult.test_type == test_type)
+            query = query.filter(dimension_filter("test_type", test_type))
         if environment:
-            query = query.filter(TestResult.environment == environment)
+            query = query.filter(dimension_filter("environment", environment))
         if resultado_final:
-            query = query.filter(TestResult.resultado_final == resultado_final)
-        
-        # Ordenar por timestamp descendente
-        query = query.order_by(TestResult.timestamp.desc())
-        
-        # Aplicar paginación
-        results = query.offset(offset).limit(limit).all()
+            query = query.filter(_resultado_filter(resultado_final))
+        if since:
+            query = query.filter(TestResult.timestamp >= _utc_naive(since))
+        if until:
+            query = query.filter(TestResult.timestamp < _utc_naive(until))
         
-        # Convertir a lista de diccionarios
-        result_list = []
-        for db_result in results:
-            result_list.append({
-                "id": str(db_result.id),
-                "test_id": db_result.test_id,
-                "categoria": db_result.categoria,
-                "pregunta": db_result.pregunta,
-                "palabras_clave": db_result.palabras_clave,
-                "respuesta_bot": db_result.respuesta_bot,
-                "validacion_correcta": db_result.validacion_correcta,
-                "palabras_encontradas": db_result.palabras_encontradas,
-                "resultado_final": db_result.resultado_final,
-                "tiempo_segundos": db_result.tiempo_segundos,
-                "timestamp": db_result.timestamp,
-                "error": db_result.error,
-                "test_type": db_result.test_type,
-                "environment": db_result.environment,
-                "sheet_name": db_result.sheet_name
-            })
+        query = query.order_by(TestResult.timestamp.desc(), TestResult.id.desc())
         
-        return result_list
+        for row in query.yield_per(batch_size):
+            yield _row_to_dict(row, fields)
     finally:
         db.close()
 
-def get_recent_results(hours: int = 24) -> List[Dict[str, Any]]:
-    """Obtener resultados recientes"""
+def run_exists(run_id: str) -> bool:
+    """Si hay al menos un resultado de esa ejecución (usa ix_test_results_run_pregunta)"""
+    return run_query(_run_exists, run_id)
+
+def _run_exists(db: Session, run_id: str) -> bool:
+    return db.query(TestResult.id).filter(TestResult.run_id == run_id).first() is not None
+
+def iter_run_diff(
+    run_a: str,
+    run_b: str,
+    statuses: Optional[List[str]] = None,
+    batch_size: int = 1000
+) -> Iterator[Dict[str, Any]]:
+    """
+    Comparar dos ejecuciones (run_id) pregunta por pregunta, uniendo por pregunta_hash en
+    la base. Las dos pasadas (a LEFT JOIN b y las preguntas que solo están en b) recorren
+    el índice (run_id, pregunta_hash) en orden; el estado se calcula y filtra en SQL. Se
+    recorre con cursor del lado del servidor, como iter_test_results.
+    """
+    statuses = statuses or RUN_DIFF_STATUSES
+    a = aliased(TestResult)
+    b = aliased(TestResult)
+    a_pass = a.passed == true()
+    b_pass = b.passed == true()
+    status = case(
+        (b.id.is_(None), literal("removed")),
+        (and_(a_pass, b_pass), literal("still_passing")),
+        (a_pass, literal("newly_failing")),
+        (b_pass, literal("newly_passing")),
+        else_=literal("still_failing")
+    )
+    
     db = SessionLocal()
     try:
-        since = datetime.utcnow() - timedelta(hours=hours)
-        
-        results = db.query(TestResult)\
-            .filter(TestResult.timestamp >= since)\
-            .order_by(TestResult.timestamp.desc())\
-            .all()
+        queries = []
+        if set(statuses) - {"added"}:
+            queries.append(
+                db.query(
+                    status.label("status"), a.pregunta_hash, a.pregunta, result_column("categoria", a),
+                    a.id.label("id_a"), b.id.label("id_b"),
+                    result_column("resultado_final", a, "resultado_a"),
+                    result_column("resultado_final", b, "resultado_b"),
+                    a.tiempo_segundos.label("tiempo_a"), b.tiempo_segundos.label("tiempo_b")
+                )
+                .outerjoin(b, and_(b.run_id == run_b, b.pregunta_hash == a.pregunta_hash))
+                .filter(a.run_id == run_a, a.pregunta_hash.isnot(None), status.in_(statuses))
+                .order_by(a.pregunta_hash)
+            )
+        if "added" in statuses:
+            in_a = exists().where(a.run_id == run_a, a.pregunta_hash == b.pregunta_hash)
+            queries.append(
+                db.query(
+                    literal("added").label("status"), b.pregunta_hash, b.pregunta, result_column("categoria", b),
+                    literal(None).label("id_a"), b.id.label("id_b"),
+                    literal(None).label("resultado_a"), result_column("resultado_final", b, "resultado_b"),
+                    literal(None).label("tiempo_a"), b.tiempo_segundos.label("tiempo_b")
+                )
+                .filter(b.run_id == run_b, b.pregunta_hash.isnot(None), ~in_a)
+                .order_by(b.pregunta_hash)
+            )
         
-        result_list = []
-        for db_result in results:
-            result_list.append({
-                "id": str(db_result.id),
-                "test_id": db_result.test_id,
-                "categoria": db_result.categoria,
-                "pregunta": db_result.pregunta,
-                "palabras_clave": db_result.palabras_clave,
-                "respuesta_bot": db_result.respuesta_bot,
-                "validacion_correcta": db_result.validacion_correcta,
-                "palabras_encontradas": db_result.palabras_encontradas,
-                "resultado_final": db_result.resultado_final,
-                "tiempo_segundos": db_result.tiempo_segundos,
-                "timestamp": db_result.timestamp,
-                "error": db_result.error,
-                "test_type": db_result.test_type,
-                "environment": db_result.environment,
-                "sheet_name": db_result.sheet_name
-            })
-        
-        return result_list
+        for query in queries:
+            for row in query.yield_per(batch_size):
+                diff = dict(row._mapping)
+                diff["categoria"] = decode("categoria", diff["categoria"])
+                diff["resultado_a"] = decode("resultado_final", diff["resultado_a"])
+                diff["resultado_b"] = decode("resultado_final", diff["resultado_b"])
+                diff["id_a"] = str(diff["id_a"]) if diff["id_a"] is not None else None
+                diff["id_b"] = str(diff["id_b"]) if diff["id_b"] is not None else None
+                diff["latency_delta"] = (
+                    round(diff["tiempo_b"] - diff["tiempo_a"], 2)
+                    if diff["tiempo_a"] is not None and diff["tiempo_b"] is not None else None
+                )
+                yield diff
     finally:
         db.close()
 
+def _fts5_match(terms: List[str]) -> str:
+    """Consulta FTS5 a partir de las palabras de q: prefijos unidos por AND, o por OR donde se escribió 'or'"""
+    parts = []
+    for term in terms:
+        if term.lower() == "or":
+            if parts and parts[-1] != "OR":
+                parts.append("OR")
+            continue
+        parts.append(f'"{term}"*')
+    if parts and parts[-1] == "OR":
+        parts.pop()
+    return " ".join(parts)
+
+@cached_query
+def search_test_results(
+    q: str,
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None,
+    resultado_final: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Buscar en pregunta y respuesta_bot, de más a menos relevante.
+    En PostgreSQL q admite la sintaxis de websearch_to_tsquery ("frase", or, -excluir)
+    con stemming en español; en SQLite cada palabra se busca como prefijo, sin distinguir
+    acentos, y todas deben aparecer salvo que se separen con "or".
+    Retorna (resultados, cursor de la página siguiente o None).
+    """
+    return run_query(_search_test_results, q, test_type, environment, resultado_final, limit, cursor, fields)
+
+def _search_test_results(
+    db: Session,
+    q: str,
+    test_type: Optional[str],
+    environment: Optional[str],
+    resultado_final: Optional[str],
+    limit: int,
+    cursor: Optional[str],
+    fields: Optional[List[str]]
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    terms = re.findall(r"\w+", q or "")[:SEARCH_MAX_TERMS]
+    if not [term for term in terms if term.lower() != "or"]:
+        raise InvalidSearch("q debe contener al menos una palabra")
+    fields = fields or list(RESULT_FIELDS)
+    columns = [RESULT_FIELDS[field] for field in fields]
+    if db.get_bind().dialect.name == "postgresql":
+        tsquery = func.websearch_to_tsquery("spanish", q)
+        search_vector = literal_column("test_results.search_vector")
+        score = cast(func.ts_rank(search_vector, tsquery), Float)
+        query = db.query(*columns, score.label("score")).filter(search_vector.op("@@")(tsquery))
+    else:
+        fts = literal_column("test_results_fts")
+        # bm25 es menor cuanto más relevante: se invierte para ordenar igual que en PostgreSQL
+        score = -func.bm25(fts)
+        query = db.query(*columns, score.label("score"))\
+            .join(_fts_table, _fts_table.c.rowid == TestResult.id)\
+            .filter(fts.op("MATCH")(_fts5_match(terms)))
+    
+    # Aplicar filtros
+    if test_type:
+        query = query.filter(dimension_filter("test_type", test_type))
+    if environment:
+        query = query.filter(dimension_filter("environment", environment))
+    if resultado_final:
+        query = query.filter(_resultado_filter(resultado_final))
+    if cursor:
+        cursor_score, cursor_id = decode_cursor(cursor, 2)
+        query = query.filter(or_(
+            score < cursor_score,
+            and_(score == cursor_score, TestResult.id < cursor_id)
+        ))
+    
+    rows = query.order_by(score.desc(), TestResult.id.desc()).limit(limit).all()
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(float(rows[-1].score), rows[-1].id)
+    return [_row_to_dict(row, fields) for row in rows], next_cursor
+
+@cached_query
+def get_recent_results(hours: int = 24, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Obtener resultados recientes (con `fields`, solo esas columnas)"""
+    return run_query(_get_recent_results, hours, fields)
+
+def _get_recent_results(db: Session, hours: int, fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+    fields = fields or list(RESULT_FIELDS)
+    since = datetime.utcnow() - timedelta(hours=hours)
+    
+    results = db.query(*[RESULT_FIELDS[field] for field in fields])\
+        .filter(TestResult.timestamp >= since)\
+        .order_by(TestResult.timestamp.desc())\
+        .all()
+    
+    return [_row_to_dict(row, fields) for row in results]
+
+def _epoch_bucket(db: Session, seconds: int):
+    """Expresión SQL con el inicio del bucket de `seconds` (epoch UTC, entero) de cada resultado"""
+    if db.get_bind().dialect.name == "postgresql":
+        epoch = func.extract("epoch", TestResult.timestamp)
+        return cast(func.floor(epoch / seconds) * seconds, Integer)
+    epoch = cast(func.strftime("%s", TestResult.timestamp), Integer)
+    return (epoch // seconds) * seconds
+
+@cached_query
+def get_trends(
+    bucket: str = "1h",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Cantidad de tests por bucket de tiempo, test_type, environment y PASS/FAIL, agrupados en la base"""
+    return run_query(_get_trends, bucket, since, until, test_type, environment)
+
+def _get_trends(
+    db: Session,
+    bucket: str,
+    since: Optional[datetime],
+    until: Optional[datetime],
+    test_type: Optional[str],
+    environment: Optional[str]
+) -> List[Dict[str, Any]]:
+    bucket_start = _epoch_bucket(db, TREND_BUCKETS[bucket]).label("bucket")
+    # Se agrupa por los ids y por passed (todos los tipos de FAIL juntos); los nombres se ponen al final
+    test_type_id = id_column("test_type")
+    environment_id = id_column("environment")
+    passed = func.coalesce(TestResult.passed, false()).label("passed")
+    query = db.query(
+        bucket_start,
+        test_type_id,
+        environment_id,
+        passed,
+        func.count(TestResult.id).label("count"),
+        func.avg(TestResult.tiempo_segundos).label("avg_time")
+    )
+    
+    since = since or datetime.utcnow() - timedelta(hours=24)
+    query = query.filter(TestResult.timestamp >= _utc_naive(since))
+    if until:
+        query = query.filter(TestResult.timestamp < _utc_naive(until))
+    if test_type:
+        query = query.filter(dimension_filter("test_type", test_type))
+    if environment:
+        query = query.filter(dimension_filter("environment", environment))
+    
+    query = query.group_by(bucket_start, test_type_id, environment_id, passed)\
+        .order_by(bucket_start)
+    
+    return [
+        {
+            "bucket": datetime.utcfromtimestamp(int(row.bucket)),
+            "test_type": decode("test_type", row.test_type_id) or "unknown",
+            "environment": decode("environment", row.environment_id) or "all",
+            "resultado_final": "PASS" if row.passed else "FAIL",
+            "count": row.count,
+            "avg_time": round(float(row.avg_time or 0), 2)
+        }
+        for row in query.all()
+    ]
+
+@cached_query
 def get_statistics(
     test_type: Optional[str] = None,
     environment: Optional[str] = None
 ) -> List[Dict[str, Any]]:
-    """Obtener estadísticas agrupadas - todos los tipos de FAIL se normalizan a 'FAIL'"""
-    db = SessionLocal()
-    try:
+    """Obtener estadísticas agrupadas desde el rollup (FAIL ya normalizado al ingerir)"""
+    return run_query(_get_statistics, test_type, environment)
+
+def _get_statistics(db: Session, test_type: Optional[str], environment: Optional[str]) -> List[Dict[str, Any]]:
+    group_columns = [ResultRollup.test_type_id, ResultRollup.environment_id, ResultRollup.passed]
+    query = db.query(
+        *group_columns,
+        func.sum(ResultRollup.count).label('count'),
+        func.sum(ResultRollup.sum_tiempo).label('sum_tiempo')
+    )
+    
+    # Aplicar filtros
+    if test_type:
+        query = query.filter(dimension_filter("test_type", test_type, ResultRollup))
+    if environment:
+        query = query.filter(dimension_filter("environment", environment, ResultRollup))
+    
+    query = query.group_by(*group_columns)
+    
+    # Histogramas de latencia por grupo, combinados en la base sumando los buckets
+    sketch_columns = [LatencySketch.test_type_id, LatencySketch.environment_id, LatencySketch.passed]
+    sketch = db.query(*sketch_columns, LatencySketch.bucket, func.sum(LatencySketch.count))
+    if test_type:
+        sketch = sketch.filter(dimension_filter("test_type", test_type, LatencySketch))
+    if environment:
+        sketch = sketch.filter(dimension_filter("environment", environment, LatencySketch))
+    histograms = {}
+    for group_type, group_environment, group_passed, bucket, count in sketch.group_by(*sketch_columns, LatencySketch.bucket):
+        histograms.setdefault((group_type, group_environment, bool(group_passed)), {})[bucket] = int(count)
+    
+    response = []
+    for row in query.all():
+        count = int(row.count or 0)
+        percentiles = sketch_quantiles(
+            histograms.get((row.test_type_id, row.environment_id, bool(row.passed)), {}),
+            list(LATENCY_PERCENTILES.values())
+        )
+        # Los ids se traducen a nombres recién acá
+        response.append({
+            "test_type": decode("test_type", row.test_type_id) or "unknown",
+            "environment": decode("environment", row.environment_id) or "all",
+            "resultado_final": "PASS" if row.passed else "FAIL",
+            "count": count,
+            "avg_time": round(float(row.sum_tiempo or 0) / count, 2) if count > 0 else 0,
+            **dict(zip(LATENCY_PERCENTILES, percentiles))
+        })
+    return response
+
+def _latency_group_label(dimension: str, value) -> Any:
+    """Mismas etiquetas que estadísticas para las dimensiones sin valor"""
+    if dimension == "day":
+        return value if isinstance(value, date) else date.fromisoformat(str(value))
+    return value or ("all" if dimension == "environment" else "unknown")
+
+@cached_query
+def get_latency(
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None,
+    categoria: Optional[str] = None,
+    group_by: Optional[List[str]] = None,
+    exact: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Percentiles de tiempo_segundos por los días [since, until] (por defecto los últimos 7),
+    agrupados por `group_by`. Salen del sketch del rollup (error relativo acotado, costo
+    proporcional a la cantidad de días y claves); con exact=True se calculan con
+    percentile_cont sobre test_results (solo PostgreSQL).
+    """
+    return run_query(_get_latency, since, until, test_type, environment, categoria, group_by, exact)
+
+def _get_latency(
+    db: Session,
+    since: Optional[date],
+    until: Optional[date],
+    test_type: Optional[str],
+    environment: Optional[str],
+    categoria: Optional[str],
+    group_by: Optional[List[str]],
+    exact: bool
+) -> List[Dict[str, Any]]:
+    group_by = ["test_type", "environment"] if group_by is None else group_by
+    unknown = [dimension for dimension in group_by if dimension not in LATENCY_GROUP_BY]
+    if unknown:
+        raise InvalidLatencyQuery(f"group_by desconocido: {', '.join(unknown)}. Disponibles: {', '.join(LATENCY_GROUP_BY)}")
+    until = until or datetime.utcnow().date()
+    since = since or until - timedelta(days=6)
+    
+    if exact:
+        if db.get_bind().dialect.name != "postgresql":
+            raise InvalidLatencyQuery("exact=true requiere PostgreSQL (percentile_cont)")
+        dimensions = {
+            "test_type": result_column("test_type"),
+            "environment": result_column("environment"),
+            "categoria": result_column("categoria"),
+            "day": func.date(TestResult.timestamp),
+        }
+        columns = [dimensions[dimension] for dimension in group_by]
         query = db.query(
-            TestResult.test_type,
-            TestResult.environment,
-            TestResult.resultado_final,
-            func.count(TestResult.id).label('count'),
-            func.avg(TestResult.tiempo_segundos).label('avg_time')
+            *columns,
+            func.count(TestResult.tiempo_segundos),
+            *[
+                func.percentile_cont(quantile).within_group(TestResult.tiempo_segundos)
+                for quantile in LATENCY_PERCENTILES.values()
+            ]
+        ).filter(
+            TestResult.timestamp >= datetime.combine(since, datetime.min.time()),
+            TestResult.timestamp < datetime.combine(until + timedelta(days=1), datetime.min.time()),
+            TestResult.tiempo_segundos.isnot(None)
         )
-        
-        # Aplicar filtros
         if test_type:
-            query = query.filter(TestResult.test_type == test_type)
+            query = query.filter(dimension_filter("test_type", test_type))
         if environment:
-            query = query.filter(TestResult.environment == environment)
-        
-        # Agrupar
-        query = query.group_by(
-            TestResult.test_type,
-            TestResult.environment,
-            TestResult.resultado_final
-        )
-        
-        results = query.all()
-        
-        # Agrupar manualmente normalizando todos los tipos de FAIL a 'FAIL'
-        stats_dict = {}
-        for row in results:
-            # Normalizar resultado_final: todos los tipos de FAIL se convierten a 'FAIL'
-            resultado_normalizado = 'PASS' if row.resultado_final == 'PASS' else 'FAIL'
-            
-            key = (row.test_type or "unknown", row.environment or "all", resultado_normalizado)
-            
-            if key not in stats_dict:
-                stats_dict[key] = {
-                    "test_type": row.test_type or "unknown",
-                    "environment": row.environment or "all",
-                    "resultado_final": resultado_normalizado,
-                    "count": 0,
-                    "total_time": 0.0,
-                    "count_records": 0
-                }
-            
-            stats_dict[key]["count"] += row.count
-            stats_dict[key]["total_time"] += float(row.avg_time or 0) * row.count
-            stats_dict[key]["count_records"] += row.count
+            query = query.filter(dimension_filter("environment", environment))
+        if categoria:
+            query = query.filter(dimension_filter("categoria", categoria))
+        if columns:
+            query = query.group_by(*columns)
         
-        # Convertir a formato de respuesta calculando el promedio de tiempo
-        response = []
-        for key, data in stats_dict.items():
-            avg_time = round(data["total_time"] / data["count_records"], 2) if data["count_records"] > 0 else 0
-            response.append({
-                "test_type": data["test_type"],
-                "environment": data["environment"],
-                "resultado_final": data["resultado_final"],
-                "count": data["count"],
-                "avg_time": avg_time
+        groups = []
+        for row in query.all():
+            values = list(row)
+            count = int(values[len(group_by)])
+            if not count:
+                continue
+            # Se agrupó por ids: traducir a nombres ('' si no hay) para ordenar como el camino del sketch
+            key = tuple(
+                value if dimension == "day" else decode(dimension, value) or ""
+                for dimension, value in zip(group_by, values)
+            )
+            point = {dimension: _latency_group_label(dimension, value) for dimension, value in zip(group_by, key)}
+            point["count"] = count
+            point.update({
+                name: round(float(value), 3)
+                for name, value in zip(LATENCY_PERCENTILES, values[len(group_by) + 1:])
             })
-        
-        return response
-    finally:
-        db.close()
+            groups.append((key, point))
+        return [point for _, point in sorted(groups, key=lambda group: group[0])]
+    
+    columns = [
+        LatencySketch.day if dimension == "day" else id_column(dimension, LatencySketch)
+        for dimension in group_by
+    ]
+    query = db.query(*columns, LatencySketch.bucket, func.sum(LatencySketch.count))\
+        .filter(LatencySketch.day >= since, LatencySketch.day <= until)
+    if test_type:
+        query = query.filter(dimension_filter("test_type", test_type, LatencySketch))
+    if environment:
+        query = query.filter(dimension_filter("environment", environment, LatencySketch))
+    if categoria:
+        query = query.filter(dimension_filter("categoria", categoria, LatencySketch))
+    query = query.group_by(*columns, LatencySketch.bucket)
+    
+    # Se agrupó por ids: traducir a nombres ('' si no hay) para ordenar igual que el camino exacto
+    histograms = {}
+    for row in query.all():
+        values = list(row)
+        key = tuple(
+            value if dimension == "day" else decode(dimension, value) or ""
+            for dimension, value in zip(group_by, values)
+        )
+        histograms.setdefault(key, {})[values[-2]] = int(values[-1])
+    
+    response = []
+    for key in sorted(histograms):
+        point = {dimension: _latency_group_label(dimension, value) for dimension, value in zip(group_by, key)}
+        point["count"] = sum(histograms[key].values())
+        point.update(zip(LATENCY_PERCENTILES, sketch_quantiles(histograms[key], list(LATENCY_PERCENTILES.values()))))
+        response.append(point)
+    return response
+
+@cached_query
+def get_flaky_questions(
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None,
+    min_runs: int = 5,
+    sort: str = "flakiness",
+    limit: int = 50
+) -> List[Dict[str, Any]]:
+    """
+    Preguntas ordenadas por flakiness (cambios PASS/FAIL en las últimas ejecuciones) o por
+    fail_rate (las que fallan siempre). Lee solo question_history.
+    """
+    return run_query(_get_flaky_questions, test_type, environment, min_runs, sort, limit)
 
+def _get_flaky_questions(
+    db: Session,
+    test_type: Optional[str],
+    environment: Optional[str],
+    min_runs: int,
+    sort: str,
+    limit: int
+) -> List[Dict[str, Any]]:
+    query = db.query(QuestionHistory).filter(QuestionHistory.run_count >= min_runs)
+    if test_type:
+        query = query.filter(dimension_filter("test_type", test_type, QuestionHistory))
+    if environment:
+        query = query.filter(dimension_filter("environment", environment, QuestionHistory))
+    
+    if sort == "fail_rate":
+        fail_rate = cast(QuestionHistory.fail_count, Float) / QuestionHistory.run_count
+        query = query.order_by(fail_rate.desc(), QuestionHistory.run_count.desc())
+    else:
+        query = query.order_by(QuestionHistory.flakiness.desc(), QuestionHistory.flip_count.desc())
+    
+    return [
+        {
+            "pregunta_hash": history.pregunta_hash,
+            "pregunta": history.pregunta or "",
+            "categoria": decode("categoria", history.categoria_id) or "",
+            "test_type": decode("test_type", history.test_type_id) or "unknown",
+            "environment": decode("environment", history.environment_id) or "all",
+            "runs": history.run_count,
+            "fails": history.fail_count,
+            "flips": history.flip_count,
+            "fail_rate": round(history.fail_count / history.run_count, 4) if history.run_count else 0.0,
+            "flakiness": history.flakiness,
+            "last_outcomes": outcomes_string(history.last_outcomes, history.run_count),
+            "last_result": history.last_result,
+            "last_test_id": history.last_test_id,
+            "last_timestamp": history.last_timestamp,
+            "latency_ewma": round(history.latency_ewma, 2) if history.latency_ewma is not None else None
+        }
+        for history in query.limit(limit)
+    ]
+
+@cached_query
 def get_summary(
     test_type: Optional[str] = None,
     environment: Optional[str] = None
 ) -> Dict[str, Any]:
-    """Obtener resumen general"""
-    db = SessionLocal()
-    try:
-        query = db.query(TestResult)
-        
-        # Aplicar filtros
-        if test_type:
-            query = query.filter(TestResult.test_type == test_type)
-        if environment:
-            query = query.filter(TestResult.environment == environment)
-        
-        total = query.count()
-        passed = query.filter(TestResult.resultado_final == "PASS").count()
-        failed = total - passed
-        
-        success_rate = round((passed / total * 100) if total > 0 else 0, 2)
-        
-        return {
-            "total": total,
-            "passed": passed,
-            "failed": failed,
-            "success_rate": success_rate
-        }
-    finally:
-        db.close()
+    """Obtener resumen general desde el rollup"""
+    return run_query(_get_summary, test_type, environment)
+
+def _get_summary(db: Session, test_type: Optional[str], environment: Optional[str]) -> Dict[str, Any]:
+    query = db.query(
+        func.sum(ResultRollup.count),
+        func.sum(case((ResultRollup.passed == true(), ResultRollup.count), else_=0))
+    )
+    
+    # Aplicar filtros
+    if test_type:
+        query = query.filter(dimension_filter("test_type", test_type, ResultRollup))
+    if environment:
+        query = query.filter(dimension_filter("environment", environment, ResultRollup))
+    
+    total, passed = query.one()
+    total = int(total or 0)
+    passed = int(passed or 0)
+    failed = total - passed
+    
+    success_rate = round((passed / total * 100) if total > 0 else 0, 2)
+    
+    return {
+        "total": total,
+        "passed": passed,
+        "failed": failed,
+        "success_rate": success_rate
+    }
 
@@ -0,0 +1,180 @@
+"""
+Configuración e instrumentación del pool de conexiones.
+
+El pool se dimensiona con variables de entorno (DB_POOL_SIZE, DB_MAX_OVERFLOW,
+DB_POOL_TIMEOUT, DB_POOL_RECYCLE). Por defecto no hay pre-ping: en lugar de un SELECT 1
+en cada checkout (un viaje más hasta Railway por consulta), las conexiones se reciclan
+antes de que el proxy corte las inactivas y, si igual llega una cerrada, SQLAlchemy
+invalida el pool al ver el error de desconexión y run_query reintenta la lectura una vez
+con una conexión nueva. DB_POOL_PRE_PING=true vuelve al ping por checkout.
+
+PoolMonitor escucha los eventos del pool (conexiones nuevas, checkouts, checkins,
+invalidaciones, desconexiones) y, con los pools Timed*, el tiempo que cada checkout
+esperó una conexión libre y los que vencieron por DB_POOL_TIMEOUT. /api/db/pool expone
+las métricas para dimensionar el pool con datos.
+"""
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# El proxy de Railway corta conexiones inactivas: reciclarlas antes evita la mayoría de
+# los errores de desconexión sin pagar un ping por checkout
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+
+_WAIT_SAMPLES = 2000
+
+
+def pool_options() -> Dict[str, Any]:
+    """Argumentos de create_engine/create_async_engine para el pool"""
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def _percentile(samples, pct: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+class _TimedCheckout:
+    """Mide la espera de _do_get, donde QueuePool bloquea si no hay conexiones libres"""
+    _monitor: Optional["PoolMonitor"] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self._monitor is not None:
+                self._monitor.record_timeout()
+            raise
+        finally:
+            if self._monitor is not None:
+                self._monitor.record_wait((time.perf_counter() - start) * 1000)
+
+    def recreate(self):
+        # engine.dispose() reemplaza el pool por uno nuevo de la misma clase
+        pool = super().recreate()
+        pool._monitor = self._monitor
+        return pool
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+class PoolMonitor:
+    """Contadores y tiempos de espera del pool de un engine"""
+
+    def __init__(self, engine, name: str):
+        self.engine = engine
+        self.name = name
+        self._lock = threading.Lock()
+        self._wait_ms = deque(maxlen=_WAIT_SAMPLES)
+        self._counters = {
+            "connects": 0, "checkouts": 0, "checkins": 0, "timeouts": 0,
+            "invalidations": 0, "disconnects": 0,
+        }
+        self._peak_in_use = 0
+        self._peak_overflow = 0
+        self._last_disconnect_at: Optional[datetime] = None
+        self._last_disconnect_error: Optional[str] = None
+
+        engine.pool._monitor = self
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        event.listen(engine, "handle_error", self._on_error)
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def record_wait(self, milliseconds: float):
+        with self._lock:
+            self._wait_ms.append(milliseconds)
+
+    def record_timeout(self):
+        self._count("timeouts")
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self._count("connects")
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        pool = self.engine.pool
+        with self._lock:
+            self._counters["checkouts"] += 1
+            if isinstance(pool, QueuePool):
+                self._peak_in_use = max(self._peak_in_use, pool.checkedout())
+                self._peak_overflow = max(self._peak_overflow, pool.overflow())
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        self._count("checkins")
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self._count("invalidations")
+
+    def _on_error(self, context):
+        if context.is_disconnect:
+            with self._lock:
+                self._counters["disconnects"] += 1
+                self._last_disconnect_at = datetime.utcnow()
+                self._last_disconnect_error = " ".join(str(context.original_exception).split())[:200]
+
+    def stats(self) -> Dict[str, Any]:
+        pool = self.engine.pool
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            wait_ms = list(self._wait_ms)
+            peak_in_use, peak_overflow = self._peak_in_use, self._peak_overflow
+            last_disconnect_at, last_disconnect_error = self._last_disconnect_at, self._last_disconnect_error
+
+        stats.update({
+            "engine": self.name,
+            "driver": self.engine.url.drivername,
+            "pool_class": type(pool).__name__,
+            "in_use": pool.checkedout() if isinstance(pool, QueuePool) else None,
+            "idle": pool.checkedin() if isinstance(pool, QueuePool) else None,
+            # overflow() es negativo mientras el pool no llegó a pool_size
+            "overflow": max(pool.overflow(), 0) if isinstance(pool, QueuePool) else None,
+            "peak_in_use": peak_in_use,
+            "peak_overflow": peak_overflow,
+            "checkout_wait_ms": {
+                "samples": len(wait_ms),
+                "p50": _percentile(wait_ms, 50),
+                "p99": _percentile(wait_ms, 99),
+                "max": round(max(wait_ms), 3) if wait_ms else None,
+            },
+            "last_disconnect_at": last_disconnect_at.isoformat() if last_disconnect_at else None,
+            "last_disconnect_error": last_disconnect_error,
+            "settings": {
+                "pool_size": pool.size() if isinstance(pool, QueuePool) else None,
+                "max_overflow": DB_MAX_OVERFLOW,
+                "pool_timeout": DB_POOL_TIMEOUT,
+                "pool_recycle": DB_POOL_RECYCLE,
+                "pool_pre_ping": DB_POOL_PRE_PING,
+            },
+        })
+        return stats
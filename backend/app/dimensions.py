@@ -0,0 +1,291 @@
+"""
+Dimensiones de test_results guardadas como enteros.
+
+test_type, environment, categoria y sheet_name tienen pocos valores distintos que se
+repetían en cada fila: cada valor se guarda una vez en su tabla dim_* y test_results
+guarda el id (test_type_id, ...). resultado_final se guarda como passed (si era 'PASS')
+y, para los fallos, fail_reason_id con el texto exacto ('FAIL', 'FAIL (JSON)', ...).
+
+Las consultas filtran y agrupan por esos enteros; los nombres se traducen en Python al
+armar la respuesta, con una copia en memoria de las tablas dim_* que se recarga cuando
+aparece un id o un nombre desconocido. La recarga lee con la sesión de la consulta en
+curso si la hay (read_with_session, que usa db_async: en el camino async no se abre una
+conexión sync), y un valor que sigue sin existir después de recargar no vuelve a
+provocar otra recarga durante DIMENSION_MISS_TTL segundos (por ejemplo ?test_type=bogus).
+Los ids no cambian ni se reutilizan: las tablas dim_* solo crecen (ni la limpieza de la
+base ni la retención las borran).
+"""
+import contextvars
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, List
+
+from sqlalchemy import select, update, literal, case, true, false, func
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.database import SessionLocal
+from app.log_config import get_logger
+from app.models import TestResult, DimTestType, DimEnvironment, DimCategoria, DimSheetName, DimFailReason
+
+logger = get_logger(__name__)
+
+# Dimensión -> tabla; la columna de test_results es <dimensión>_id
+DIMENSIONS = {
+    "test_type": DimTestType,
+    "environment": DimEnvironment,
+    "categoria": DimCategoria,
+    "sheet_name": DimSheetName,
+    "fail_reason": DimFailReason,
+}
+
+# Campo de la API -> dimensión de la que sale su valor
+RESULT_DIMENSIONS = {
+    "categoria": "categoria",
+    "resultado_final": "fail_reason",
+    "test_type": "test_type",
+    "environment": "environment",
+    "sheet_name": "sheet_name",
+}
+
+# Código de resultado_final para PASS (los ids de dim_fail_reason empiezan en 1)
+PASS_CODE = 0
+
+# Filas por transacción al migrar los valores existentes
+BACKFILL_CHUNK_ROWS = 20000
+
+# Segundos durante los que un id o nombre inexistente no vuelve a recargar su tabla
+DIMENSION_MISS_TTL = float(os.getenv("DIMENSION_MISS_TTL", "10"))
+# Tope de valores inexistentes recordados por dimensión
+_MAX_MISSES = 1000
+
+# Copia en memoria de las tablas dim_*: {dimensión: {id: nombre}} y {dimensión: {nombre: id}}.
+# Solo se cargan valores confirmados, así un id de una transacción que después hizo
+# rollback nunca queda en la copia
+_names: Dict[str, Dict[int, str]] = {dimension: {} for dimension in DIMENSIONS}
+_ids: Dict[str, Dict[str, int]] = {dimension: {} for dimension in DIMENSIONS}
+# Ids y nombres que no estaban ni después de recargar: {dimensión: {valor: instante}}
+_misses: Dict[str, Dict[Any, float]] = {dimension: {} for dimension in DIMENSIONS}
+_lock = threading.Lock()
+
+# Sesión de la consulta en curso, con la que lee una recarga (ver read_with_session)
+_session: contextvars.ContextVar = contextvars.ContextVar("dimensions_session", default=None)
+
+
+def id_column(dimension: str, model=TestResult):
+    """Columna <dimensión>_id de test_results (o de un alias)"""
+    return getattr(model, f"{dimension}_id")
+
+
+def result_column(field: str, model=TestResult, name: Optional[str] = None):
+    """Código entero con el que se lee un campo de dimensión; decode() lo traduce al nombre"""
+    if field == "resultado_final":
+        code = case((model.passed == true(), literal(PASS_CODE)), else_=model.fail_reason_id)
+    else:
+        code = id_column(RESULT_DIMENSIONS[field], model)
+    return code.label(name or field)
+
+
+def split_resultado(resultado_final: Optional[str]) -> tuple:
+    """(passed, fail_reason) de un resultado_final"""
+    if resultado_final is None:
+        return None, None
+    if resultado_final == "PASS":
+        return True, None
+    return False, resultado_final
+
+
+def read_with_session(db: Session, query, *args):
+    """Correr query(db, *args) haciendo que las recargas de dim_* lean con `db`"""
+    token = _session.set(db)
+    try:
+        return query(db, *args)
+    finally:
+        _session.reset(token)
+
+
+def _reload(dimension: str):
+    """Volver a leer una tabla dim_* completa (son chicas), con la sesión en curso o una propia"""
+    model = DIMENSIONS[dimension]
+    db = _session.get()
+    if db is not None:
+        rows = db.query(model.id, model.name).all()
+    else:
+        db = SessionLocal()
+        try:
+            rows = db.query(model.id, model.name).all()
+        finally:
+            db.close()
+    with _lock:
+        _names[dimension] = {row_id: name for row_id, name in rows}
+        _ids[dimension] = {name: row_id for row_id, name in rows}
+
+
+def _lookup(dimension: str, cache: Dict[str, Dict[Any, Any]], value: Any) -> Any:
+    """Buscar en la copia en memoria; recargar solo si el valor no falló hace poco"""
+    found = cache[dimension].get(value)
+    if found is not None:
+        return found
+    missed_at = _misses[dimension].get(value)
+    if missed_at is not None and time.monotonic() - missed_at < DIMENSION_MISS_TTL:
+        return None
+    _reload(dimension)
+    found = cache[dimension].get(value)
+    if found is None:
+        with _lock:
+            misses = _misses[dimension]
+            if len(misses) >= _MAX_MISSES:
+                misses.clear()
+            misses[value] = time.monotonic()
+    return found
+
+
+def load_dimensions():
+    """Cargar todas las tablas dim_* (al arrancar la API)"""
+    for dimension in DIMENSIONS:
+        _reload(dimension)
+
+
+def decode(field: str, code: Optional[int]) -> Optional[str]:
+    """Nombre que corresponde al código leído con result_column (o a un id de las tablas agregadas)"""
+    if field == "resultado_final" and code == PASS_CODE:
+        return "PASS"
+    if not code:
+        # NULL, o 0: la dimensión vacía en el rollup, el sketch y question_history
+        return None
+    return _lookup(RESULT_DIMENSIONS[field], _names, code)
+
+
+def decode_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Traducir en el lugar los campos de dimensión de un resultado"""
+    for field in RESULT_DIMENSIONS:
+        if field in result:
+            result[field] = decode(field, result[field])
+    return result
+
+
+def dimension_id(dimension: str, name: str) -> Optional[int]:
+    """Id de un valor ya guardado, o None si no existe"""
+    return _lookup(dimension, _ids, name)
+
+
+def dimension_filter(dimension: str, name: str, model=TestResult):
+    """Condición <dimensión>_id = id del valor (falsa si el valor nunca se guardó)"""
+    row_id = dimension_id(dimension, name)
+    if row_id is None:
+        return false()
+    return id_column(dimension, model) == row_id
+
+
+def _missing_names(rows: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    missing: Dict[str, set] = {}
+    for row in rows:
+        for dimension in DIMENSIONS:
+            name = row[dimension]
+            if name is not None and name not in _ids[dimension]:
+                missing.setdefault(dimension, set()).add(name)
+    return {dimension: sorted(names) for dimension, names in missing.items()}
+
+
+def resolve_dimensions(db: Session, rows: List[Dict[str, Any]]):
+    """
+    Completar los <dimensión>_id de filas a insertar a partir de sus nombres, guardando
+    los valores nuevos (sin commit: usa la transacción de la ingesta)
+    """
+    missing = _missing_names(rows)
+    for dimension in missing:
+        _reload(dimension)
+    missing = _missing_names(rows)
+
+    # Valores que no existían: se insertan en la transacción de la ingesta y sus ids no
+    # pasan a la copia en memoria hasta confirmarse
+    new_ids = {}
+    dialect_insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    for dimension, names in missing.items():
+        model = DIMENSIONS[dimension]
+        # Nombres ordenados: dos lotes concurrentes con valores nuevos en común se bloquean en el mismo orden
+        db.execute(
+            dialect_insert(model).on_conflict_do_nothing(index_elements=["name"]),
+            [{"name": name} for name in names]
+        )
+        for row_id, name in db.query(model.id, model.name).filter(model.name.in_(names)):
+            new_ids[(dimension, name)] = row_id
+        # Que un filtro por el valor nuevo recargue la tabla en vez de esperar DIMENSION_MISS_TTL
+        with _lock:
+            for name in names:
+                _misses[dimension].pop(name, None)
+
+    for row in rows:
+        for dimension in DIMENSIONS:
+            name = row[dimension]
+            row[f"{dimension}_id"] = None if name is None else (
+                _ids[dimension].get(name) or new_ids[(dimension, name)]
+            )
+
+
+def backfill_dimensions() -> int:
+    """Pasar los valores de las columnas viejas a las tablas dim_*, por rangos de id; retorna las filas migradas"""
+    legacy = {
+        "test_type": TestResult.test_type,
+        "environment": TestResult.environment,
+        "categoria": TestResult.categoria,
+        "sheet_name": TestResult.sheet_name,
+        "fail_reason": TestResult.resultado_final,
+    }
+    db = SessionLocal()
+    try:
+        min_id, max_id = db.query(func.min(TestResult.id), func.max(TestResult.id)).one()
+        dialect_insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    finally:
+        db.close()
+    if min_id is None:
+        return 0
+
+    migrated = 0
+    for start in range(min_id, max_id + 1, BACKFILL_CHUNK_ROWS):
+        in_chunk = TestResult.id.between(start, start + BACKFILL_CHUNK_ROWS - 1)
+        db = SessionLocal()
+        try:
+            for dimension, column in legacy.items():
+                condition = column.isnot(None)
+                if dimension == "fail_reason":
+                    condition = condition & (column != "PASS")
+                db.execute(
+                    dialect_insert(DIMENSIONS[dimension])
+                    .from_select(["name"], select(column).distinct().where(in_chunk, condition))
+                    .on_conflict_do_nothing(index_elements=["name"])
+                )
+            values = {
+                f"{dimension}_id": select(DIMENSIONS[dimension].id)
+                .where(DIMENSIONS[dimension].name == column)
+                .scalar_subquery()
+                for dimension, column in legacy.items()
+            }
+            values["passed"] = case(
+                (TestResult.resultado_final.is_(None), None),
+                else_=TestResult.resultado_final == "PASS"
+            )
+            values.update({column.key: None for column in legacy.values()})
+            has_legacy_value = legacy["test_type"].isnot(None)
+            for column in list(legacy.values())[1:]:
+                has_legacy_value = has_legacy_value | column.isnot(None)
+            # Todas las expresiones del SET leen los valores previos: las columnas viejas se vacían en el mismo UPDATE
+            result = db.execute(
+                update(TestResult)
+                .where(in_chunk, has_legacy_value)
+                .values(values)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        except Exception as e:
+            logger.error(f"Error migrando dimensiones: {str(e)}")
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        migrated += result.rowcount
+        logger.info(f"{migrated} resultados con dimensiones migradas")
+    return migrated
+
@@ -0,0 +1,103 @@
+"""
+Exportación de resultados en streaming (NDJSON o CSV).
+
+export_chunks recorre los resultados con iter_test_results (cursor del lado del
+servidor) y produce el archivo en bloques de bytes, de modo que la memoria del
+proceso no depende de cuántas filas se exporten. Con include_archive, después de las
+filas de la base siguen las archivadas en Parquet (ver app/retention.py).
+"""
+import csv
+import io
+import itertools
+import json
+from datetime import datetime
+from typing import Iterator, Optional, List, Dict, Any
+
+from app.db_models import iter_test_results, iter_run_diff, RESULT_FIELDS
+from app.retention import iter_archived_results
+from app.serialization import dumps
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Filas que se acumulan antes de emitir un bloque de bytes
+EXPORT_CHUNK_ROWS = 1000
+
+
+def _ndjson_chunks(rows: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    buffer = []
+    for row in rows:
+        buffer.append(dumps(row))
+        if len(buffer) >= EXPORT_CHUNK_ROWS:
+            yield b"\n".join(buffer) + b"\n"
+            buffer = []
+    if buffer:
+        yield b"\n".join(buffer) + b"\n"
+
+
+def _csv_chunks(rows: Iterator[Dict[str, Any]], fields: List[str]) -> Iterator[bytes]:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(fields)
+    pending = 1
+    for row in rows:
+        writer.writerow([
+            row[field].isoformat() if isinstance(row[field], datetime) else row[field]
+            for field in fields
+        ])
+        pending += 1
+        if pending >= EXPORT_CHUNK_ROWS:
+            yield output.getvalue().encode("utf-8")
+            output.seek(0)
+            output.truncate(0)
+            pending = 0
+    if pending:
+        yield output.getvalue().encode("utf-8")
+
+
+def export_chunks(
+    format: str,
+    fields: Optional[List[str]] = None,
+    include_archive: bool = False,
+    **filters
+) -> Iterator[bytes]:
+    """Generar el archivo de exportación en bloques (format: 'ndjson' o 'csv')"""
+    fields = fields or list(RESULT_FIELDS)
+    rows = iter_test_results(fields=fields, **filters)
+    if include_archive:
+        # Lo archivado es más viejo que lo que queda en la base: se mantiene el orden por timestamp desc
+        rows = itertools.chain(rows, iter_archived_results(fields=fields, **filters))
+    if format == "csv":
+        return _csv_chunks(rows, fields)
+    return _ndjson_chunks(rows)
+
+
+def run_diff_chunks(run_a: str, run_b: str, statuses: Optional[List[str]] = None) -> Iterator[bytes]:
+    """
+    Diff entre dos ejecuciones como un documento JSON generado en bloques:
+    {"run_a", "run_b", "questions": [...], "summary": {estado: cantidad, ...}}.
+    El resumen va al final porque se cuenta mientras se recorren las preguntas.
+    """
+    summary: Dict[str, int] = {}
+    # Solo la suma y la cantidad: el promedio no necesita guardar un delta por pregunta
+    delta_sum = 0.0
+    delta_count = 0
+    head = json.dumps({"run_a": run_a, "run_b": run_b}, ensure_ascii=False)
+    yield (head[:-1] + ', "questions": [').encode("utf-8")
+    buffer = []
+    first = True
+    for diff in iter_run_diff(run_a, run_b, statuses):
+        summary[diff["status"]] = summary.get(diff["status"], 0) + 1
+        if diff["latency_delta"] is not None:
+            delta_sum += diff["latency_delta"]
+            delta_count += 1
+        buffer.append((b"" if first else b",") + dumps(diff))
+        first = False
+        if len(buffer) >= EXPORT_CHUNK_ROWS:
+            yield b"".join(buffer)
+            buffer = []
+    summary["avg_latency_delta"] = round(delta_sum / delta_count, 3) if delta_count else None
+    buffer.append(b"], \"summary\": " + dumps(summary) + b"}")
+    yield b"".join(buffer)
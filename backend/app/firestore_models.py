@@ -4,6 +4,7 @@ Modelos y funciones para trabajar con Firestore
 from typing import Optional, Dict, Any
 from datetime import datetime
 from app.firebase_db import get_collection
+from app.cursors import encode_cursor, decode_cursor
 
 def create_test_result(data: Dict[str, Any]) -> Dict[str, Any]:
     """Crear un nuevo resultado de test en Firestore"""
@@ -43,9 +44,10 @@ def get_test_results(
     environment: Optional[str] = None,
     resultado_final: Optional[str] = None,
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None
 ) -> list:
-    """Obtener resultados con filtros"""
+    """Obtener resultados con filtros (con `cursor`, la página sigue desde el último documento visto)"""
     collection = get_collection()
     query = collection
     
@@ -61,16 +63,26 @@ def get_test_results(
             # En Firestore no podemos hacer != directamente, así que filtramos después
             pass
     
-    # Ordenar por timestamp descendente
+    # Ordenar por timestamp descendente (id del documento como desempate para el cursor)
     from firebase_admin import firestore
     query = query.order_by("timestamp", direction=firestore.Query.DESCENDING)
-    
-    # Firestore no soporta offset directamente, así que obtenemos más y hacemos offset manual
-    # Obtenemos limit + offset para poder hacer el offset manualmente
-    all_docs = list(query.limit(limit + offset).stream())
-    
-    # Aplicar offset manualmente
-    docs = all_docs[offset:offset + limit]
+    query = query.order_by(firestore.FieldPath.document_id(), direction=firestore.Query.DESCENDING)
+    
+    if cursor:
+        # Continuar después del último documento de la página anterior sin leer las previas
+        cursor_timestamp, cursor_doc_id = decode_cursor(cursor, 2)
+        query = query.start_after({
+            "timestamp": cursor_timestamp,
+            "__name__": collection.document(cursor_doc_id)
+        })
+        docs = list(query.limit(limit).stream())
+    else:
+        # Firestore no soporta offset directamente, así que obtenemos más y hacemos offset manual
+        # Obtenemos limit + offset para poder hacer el offset manualmente
+        all_docs = list(query.limit(limit + offset).stream())
+        
+        # Aplicar offset manualmente
+        docs = all_docs[offset:offset + limit]
     
     # Convertir a lista de diccionarios
     result_list = []
@@ -86,6 +98,10 @@ def get_test_results(
     
     return result_list
 
+def result_cursor(result: Dict[str, Any]) -> str:
+    """Cursor que apunta inmediatamente después de este documento"""
+    return encode_cursor(result["timestamp"], result["id"])
+
 def get_recent_results(hours: int = 24) -> list:
     """Obtener resultados recientes"""
     from datetime import timedelta
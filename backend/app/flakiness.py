@@ -0,0 +1,209 @@
+"""
+Historial por pregunta (question_history) para medir qué preguntas alternan PASS/FAIL.
+
+Una fila por (pregunta_hash, test_type_id, environment_id) con la cantidad de ejecuciones,
+de FAIL y de cambios de resultado, las últimas HISTORY_BITS ejecuciones como bits
+(bit 0 = la más reciente, 1 = FAIL), un promedio exponencial (EWMA) del tiempo de
+respuesta y `flakiness`: la fracción de cambios entre ejecuciones consecutivas dentro
+de esa ventana. La ingesta lo actualiza en su misma transacción (update_question_history),
+así el ranking nunca recorre test_results.
+
+Los resultados llegan en orden de ejecución; uno más viejo que el último registrado
+(un backfill) suma a las cantidades pero no a la secuencia de cambios ni al EWMA.
+
+Uso (desde backend/):
+    python -m app.flakiness rebuild
+"""
+import argparse
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, Iterable, Optional
+
+from sqlalchemy import tuple_, update, text
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.database import SessionLocal
+from app.log_config import get_logger
+from app.models import TestResult, QuestionHistory
+from app.rollup import NO_DIMENSION
+from app.query_cache import bump_generation
+
+logger = get_logger(__name__)
+
+# Ejecuciones recientes que se guardan en last_outcomes y sobre las que se calcula flakiness
+HISTORY_BITS = 32
+HISTORY_MASK = (1 << HISTORY_BITS) - 1
+
+# Peso de la última ejecución en el EWMA de latencia
+LATENCY_EWMA_ALPHA = 0.2
+
+HISTORY_KEY_COLUMNS = ["pregunta_hash", "test_type_id", "environment_id"]
+HISTORY_STATE_COLUMNS = [
+    "pregunta", "categoria_id", "run_count", "fail_count", "flip_count", "last_outcomes",
+    "last_result", "last_test_id", "last_timestamp", "latency_ewma", "flakiness"
+]
+
+
+def question_hash(pregunta: Optional[str]) -> str:
+    """Hash estable de una pregunta (espacios normalizados): identifica la pregunta entre ejecuciones"""
+    normalized = " ".join((pregunta or "").split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def history_key(row: Dict[str, Any]) -> tuple:
+    """Clave del historial para una fila de test_results con sus ids (NULL se guarda como NO_DIMENSION)"""
+    return (row["pregunta_hash"], row["test_type_id"] or NO_DIMENSION, row["environment_id"] or NO_DIMENSION)
+
+
+def flip_rate(last_outcomes: int, runs: int) -> float:
+    """Fracción de ejecuciones consecutivas con distinto resultado dentro de la ventana"""
+    window = min(runs, HISTORY_BITS)
+    if window < 2:
+        return 0.0
+    pairs_mask = (1 << (window - 1)) - 1
+    flips = bin((last_outcomes ^ (last_outcomes >> 1)) & pairs_mask).count("1")
+    return round(flips / (window - 1), 4)
+
+
+def _empty_state(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "pregunta": row["pregunta"],
+        "categoria_id": row["categoria_id"],
+        "run_count": 0,
+        "fail_count": 0,
+        "flip_count": 0,
+        "last_outcomes": 0,
+        "last_result": None,
+        "last_test_id": None,
+        "last_timestamp": None,
+        "latency_ewma": None,
+        "flakiness": 0.0,
+    }
+
+
+def _apply(state: Dict[str, Any], row: Dict[str, Any]):
+    """Sumar un resultado al estado de su pregunta (filas en orden de timestamp)"""
+    failed = not row["passed"]
+    state["run_count"] += 1
+    state["fail_count"] += int(failed)
+    if state["last_timestamp"] is not None and row["timestamp"] < state["last_timestamp"]:
+        return
+
+    result = "FAIL" if failed else "PASS"
+    if state["last_result"] is not None and state["last_result"] != result:
+        state["flip_count"] += 1
+    state["last_outcomes"] = ((state["last_outcomes"] << 1) | int(failed)) & HISTORY_MASK
+    state["last_result"] = result
+    state["last_test_id"] = row["test_id"]
+    state["last_timestamp"] = row["timestamp"]
+    state["pregunta"] = row["pregunta"]
+    state["categoria_id"] = row["categoria_id"]
+    if row["tiempo_segundos"] is not None:
+        tiempo = float(row["tiempo_segundos"])
+        previous = state["latency_ewma"]
+        state["latency_ewma"] = tiempo if previous is None else (
+            LATENCY_EWMA_ALPHA * tiempo + (1 - LATENCY_EWMA_ALPHA) * previous
+        )
+    state["flakiness"] = flip_rate(state["last_outcomes"], state["run_count"])
+
+
+def _ordered(rows: Iterable[Dict[str, Any]]):
+    return sorted(rows, key=lambda row: row["timestamp"] or datetime.min)
+
+
+def update_question_history(db: Session, rows: Iterable[Dict[str, Any]]):
+    """Sumar filas recién insertadas al historial (sin commit: usa la transacción de la ingesta)"""
+    rows = [row for row in _ordered(rows) if row["pregunta_hash"] and row["timestamp"] is not None]
+    if not rows:
+        return
+    keys = sorted({history_key(row) for row in rows})
+
+    # Crear las preguntas nuevas vacías y bloquear todas las filas del lote, siempre en el
+    # mismo orden: dos ingestas concurrentes de la misma pregunta se suman en serie
+    dialect = db.get_bind().dialect.name
+    dialect_insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+    first_rows = {}
+    for row in rows:
+        first_rows.setdefault(history_key(row), row)
+    db.execute(
+        dialect_insert(QuestionHistory).on_conflict_do_nothing(index_elements=HISTORY_KEY_COLUMNS),
+        [{**dict(zip(HISTORY_KEY_COLUMNS, key)), **_empty_state(first_rows[key])} for key in keys]
+    )
+    key_columns = [getattr(QuestionHistory, column) for column in HISTORY_KEY_COLUMNS]
+    query = db.query(*key_columns, *[getattr(QuestionHistory, column) for column in HISTORY_STATE_COLUMNS])\
+        .filter(tuple_(*key_columns).in_(keys))\
+        .order_by(*key_columns)
+    if dialect == "postgresql":
+        query = query.with_for_update()
+    states = {
+        tuple(row[:len(HISTORY_KEY_COLUMNS)]): dict(zip(HISTORY_STATE_COLUMNS, row[len(HISTORY_KEY_COLUMNS):]))
+        for row in query
+    }
+
+    for row in rows:
+        _apply(states[history_key(row)], row)
+
+    db.execute(update(QuestionHistory), [
+        {**dict(zip(HISTORY_KEY_COLUMNS, key)), **states[key]} for key in keys
+    ])
+
+
+def rebuild_question_history() -> int:
+    """Recalcular el historial completo recorriendo test_results en orden; retorna la cantidad de preguntas"""
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            # Las ingestas concurrentes esperan al rebuild en vez de sumar sobre un historial a medio armar
+            db.execute(text("LOCK TABLE question_history IN EXCLUSIVE MODE"))
+        db.query(QuestionHistory).delete()
+
+        columns = [getattr(TestResult, column) for column in [
+            "test_id", "pregunta_hash", "pregunta", "tiempo_segundos", "timestamp",
+            "passed", "categoria_id", "test_type_id", "environment_id"
+        ]]
+        states: Dict[tuple, Dict[str, Any]] = {}
+        rows = db.query(*columns)\
+            .filter(TestResult.timestamp.isnot(None))\
+            .order_by(TestResult.timestamp, TestResult.id)\
+            .yield_per(10000)
+        for row in rows:
+            row = dict(row._mapping)
+            # Filas todavía sin hash (la migración 0012 los completa): se calcula acá
+            row["pregunta_hash"] = row["pregunta_hash"] or question_hash(row["pregunta"])
+            key = history_key(row)
+            state = states.get(key)
+            if state is None:
+                state = states[key] = _empty_state(row)
+            _apply(state, row)
+
+        items = sorted(states.items())
+        for offset in range(0, len(items), 5000):
+            db.execute(QuestionHistory.__table__.insert(), [
+                {**dict(zip(HISTORY_KEY_COLUMNS, key)), **state} for key, state in items[offset:offset + 5000]
+            ])
+        db.commit()
+        bump_generation()
+        logger.info(f"Historial de preguntas reconstruido - {len(items)} preguntas")
+        return len(items)
+    except Exception as e:
+        logger.error(f"Error reconstruyendo el historial de preguntas: {str(e)}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def outcomes_string(last_outcomes: int, runs: int) -> str:
+    """Últimos resultados como texto, el más reciente primero (P = PASS, F = FAIL)"""
+    return "".join("F" if last_outcomes >> bit & 1 else "P" for bit in range(min(runs, HISTORY_BITS)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de question_history")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: recalcular desde test_results")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        rebuild_question_history()
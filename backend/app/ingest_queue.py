@@ -0,0 +1,417 @@
+"""
+Cola de ingesta con escritura diferida (write-behind) y group commit.
+
+Con INGEST_MODE=queue, POST /api/results responde apenas el resultado queda encolado
+(y escrito en el spool local si INGEST_SPOOL_PATH está configurado). Un thread escritor
+vacía la cola en lotes de INGEST_FLUSH_ROWS filas o cada INGEST_FLUSH_MS milisegundos,
+usando create_test_results_batch (una transacción por lote).
+
+El spool es un archivo append-only de JSON por línea. El offset hasta el cual los datos
+ya están en la base se guarda en "<spool>.offset"; al iniciar, el thread escritor guarda
+lo pendiente antes de tomar filas nuevas de la cola. Si el proceso muere entre el commit
+y la escritura del offset, esas filas se re-envían y la clave de idempotencia (run_id,
+test_type, environment, test_id, pregunta) evita que se dupliquen: POST /api/results
+asigna el run_id antes de encolar.
+
+Cada proceso (por ejemplo, cada worker de uvicorn) usa su propio spool,
+"<INGEST_SPOOL_PATH>.<n>": toma el primer n cuyo archivo no tenga el lock (flock) de otro
+proceso vivo, así al reiniciar un worker retoma el spool de uno que murió.
+
+Las filas que la base rechaza (error por fila, no una caída de la base) no se pierden:
+se agregan, con el error, a "<spool>.dead" (o a INGEST_DEAD_LETTER_PATH) para revisarlas
+y reenviarlas a mano.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: un solo proceso por spool
+    fcntl = None
+
+from app.db_models import create_test_results_batch
+from app.log_config import get_logger
+
+logger = get_logger(__name__)
+
+INGEST_MODE = os.getenv("INGEST_MODE", "sync").lower()  # 'sync' o 'queue'
+INGEST_QUEUE_MAX = int(os.getenv("INGEST_QUEUE_MAX", "10000"))
+INGEST_FLUSH_ROWS = int(os.getenv("INGEST_FLUSH_ROWS", "200"))
+INGEST_FLUSH_MS = int(os.getenv("INGEST_FLUSH_MS", "250"))
+INGEST_ENQUEUE_TIMEOUT = float(os.getenv("INGEST_ENQUEUE_TIMEOUT", "5"))
+INGEST_SPOOL_PATH = os.getenv("INGEST_SPOOL_PATH", "")
+INGEST_DEAD_LETTER_PATH = os.getenv("INGEST_DEAD_LETTER_PATH", "")
+# Procesos que pueden compartir el mismo INGEST_SPOOL_PATH (cada uno toma un spool propio)
+INGEST_SPOOL_SLOTS = int(os.getenv("INGEST_SPOOL_SLOTS", "64"))
+INGEST_SPOOL_FSYNC = os.getenv("INGEST_SPOOL_FSYNC", "1") == "1"
+
+# Cantidad de muestras que se guardan para calcular percentiles y throughput
+_LATENCY_SAMPLES = 1024
+_THROUGHPUT_WINDOW_SECONDS = 60
+
+
+class IngestQueueFull(Exception):
+    """La cola está llena y no se pudo encolar dentro del timeout"""
+
+
+def _percentile(samples, pct: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+class IngestQueue:
+    def __init__(
+        self,
+        maxsize: int = INGEST_QUEUE_MAX,
+        flush_rows: int = INGEST_FLUSH_ROWS,
+        flush_ms: int = INGEST_FLUSH_MS,
+        spool_path: str = INGEST_SPOOL_PATH,
+        spool_fsync: bool = INGEST_SPOOL_FSYNC,
+        dead_letter_path: str = INGEST_DEAD_LETTER_PATH,
+    ):
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_ms / 1000
+        self.maxsize = maxsize
+        self.spool_base_path = spool_path or None
+        self.spool_path: Optional[str] = None  # El spool de este proceso, elegido en start()
+        self.spool_fsync = spool_fsync
+        self.dead_letter_path = dead_letter_path or None
+
+        # Cada item es (fila, offset del spool al final de su línea o None). El lugar en la
+        # cola se reserva con _capacity antes de escribir el spool, así nunca hay que deshacer
+        # una línea ya escrita por falta de lugar
+        self._queue: "queue.Queue" = queue.Queue()
+        self._capacity = threading.BoundedSemaphore(maxsize)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._spool = None
+        self._replay_range: Optional[tuple] = None
+        self._in_flight = 0
+        # Un lote abandonado al apagar queda en el spool: desde ahí no se avanza el offset
+        self._spool_held = False
+
+        self._enqueued_total = 0
+        self._flushed_rows_total = 0
+        self._failed_rows_total = 0
+        self._flush_count = 0
+        self._flush_errors = 0
+        self._last_flush_at: Optional[datetime] = None
+        self._enqueue_latencies_ms = deque(maxlen=_LATENCY_SAMPLES)
+        self._flush_latencies_ms = deque(maxlen=_LATENCY_SAMPLES)
+        self._flushed_window = deque()  # (instante, filas) de los últimos segundos
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+    def start(self):
+        """Abrir el spool de este proceso y arrancar el thread escritor (que primero guarda lo pendiente)"""
+        if self._thread and self._thread.is_alive():
+            return
+        if self.spool_base_path:
+            self._open_spool()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._writer_loop, name="ingest-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Cola de ingesta iniciada (lote={self.flush_rows} filas, "
+                    f"intervalo={int(self.flush_seconds * 1000)}ms, spool={self.spool_path or 'deshabilitado'})")
+
+    def stop(self, timeout: float = 30.0):
+        """Vaciar la cola a la base y detener el thread escritor (hook de shutdown)"""
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"La cola de ingesta no terminó de vaciarse en {timeout}s "
+                           f"({self._queue.qsize()} filas pendientes)")
+        else:
+            logger.info(f"Cola de ingesta detenida - {self._flushed_rows_total} filas guardadas")
+        self._thread = None
+        if self._spool:
+            self._spool.close()  # Libera también el flock del spool
+            self._spool = None
+
+    # ------------------------------------------------------------------
+    # Encolado
+    # ------------------------------------------------------------------
+    def enqueue(self, row: Dict[str, Any]):
+        """Encolar una fila; si hay spool, queda escrita en disco antes de retornar"""
+        start = time.perf_counter()
+        # Esperar lugar sin tomar el lock: los demás requests siguen encolando mientras tanto
+        if not self._capacity.acquire(timeout=INGEST_ENQUEUE_TIMEOUT):
+            raise IngestQueueFull(f"Cola de ingesta llena ({self.maxsize} filas)")
+        try:
+            line = json.dumps(row, default=_json_default, ensure_ascii=False) + "\n" if self._spool else None
+            # Bajo el lock solo el append al spool y el put (que ya tiene lugar): las filas
+            # quedan en la cola en el mismo orden que en el spool
+            with self._lock:
+                end_offset = None
+                if self._spool:
+                    self._spool.write(line)
+                    self._spool.flush()
+                    end_offset = self._spool.tell()
+                self._queue.put_nowait((row, end_offset))
+                self._enqueued_total += 1
+        except BaseException:
+            # La fila no entró a la cola (disco lleno, EIO...): devolver el lugar
+            self._capacity.release()
+            raise
+        if self._spool and self.spool_fsync:
+            # Fuera del lock: varios fsync concurrentes se resuelven en un solo flush del disco
+            os.fsync(self._spool.fileno())
+        self._enqueue_latencies_ms.append((time.perf_counter() - start) * 1000)
+
+    # ------------------------------------------------------------------
+    # Escritor
+    # ------------------------------------------------------------------
+    def _writer_loop(self):
+        if self._replay_range:
+            self._replay_spool()
+        while True:
+            batch = self._collect_batch()
+            if batch:
+                self._flush(batch)
+            elif self._stop.is_set():
+                break
+            self._compact_spool()
+
+    def _collect_batch(self) -> List[tuple]:
+        """Juntar hasta flush_rows filas o lo que llegue en flush_seconds desde la primera"""
+        try:
+            first = self._queue.get(timeout=self.flush_seconds)
+        except queue.Empty:
+            return []
+        self._capacity.release()
+        batch = [first]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.flush_rows:
+            try:
+                if self._stop.is_set():
+                    # Al apagar no se espera: se toma lo que ya está en la cola
+                    batch.append(self._queue.get_nowait())
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=remaining))
+                self._capacity.release()
+            except queue.Empty:
+                break
+        self._in_flight = len(batch)
+        return batch
+
+    def _flush(self, batch: List[tuple]):
+        rows = [row for row, _ in batch]
+        backoff = 0.5
+        while True:
+            start = time.perf_counter()
+            try:
+                statuses = create_test_results_batch(rows)
+                break
+            except Exception as e:
+                # La base no está disponible: se reintenta el mismo lote (las filas siguen en el spool)
+                self._flush_errors += 1
+                logger.error(f"Error vaciando cola de ingesta ({len(rows)} filas): {str(e)}")
+                if self._stop.is_set() and backoff > 8:
+                    logger.warning("Abandonando lote al apagar; queda pendiente en el spool")
+                    self._spool_held = True
+                    self._in_flight = 0
+                    return
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        failed = [(row, status) for row, status in zip(rows, statuses) if status["status"] == "error"]
+        if failed:
+            try:
+                self._write_dead_letters(failed)
+            except OSError as e:
+                # Sin archivo de descartes las filas quedan en el spool (se reintentan al reiniciar)
+                logger.error(f"No se pudo escribir el archivo de descartes: {str(e)}")
+                self._spool_held = True
+
+        now = time.monotonic()
+        self._flush_latencies_ms.append(elapsed_ms)
+        self._flushed_window.append((now, len(rows) - len(failed)))
+        self._flushed_rows_total += len(rows) - len(failed)
+        self._failed_rows_total += len(failed)
+        self._flush_count += 1
+        self._last_flush_at = datetime.utcnow()
+        self._in_flight = 0
+
+        last_offset = batch[-1][1]
+        if last_offset is not None and not self._spool_held:
+            self._write_committed_offset(last_offset)
+
+    # ------------------------------------------------------------------
+    # Spool
+    # ------------------------------------------------------------------
+    def _offset_path(self) -> str:
+        return f"{self.spool_path}.offset"
+
+    def _read_committed_offset(self) -> int:
+        try:
+            with open(self._offset_path()) as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_committed_offset(self, offset: int):
+        tmp_path = f"{self._offset_path()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._offset_path())
+
+    def _claim_spool(self):
+        """Abrir en modo append el primer spool libre ("<base>.<n>") y tomar su lock"""
+        for slot in range(INGEST_SPOOL_SLOTS):
+            path = f"{self.spool_base_path}.{slot}"
+            spool = open(path, "a+", encoding="utf-8", newline="")
+            if fcntl is None:
+                return path, spool
+            try:
+                fcntl.flock(spool.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return path, spool
+            except OSError:
+                spool.close()  # Lo usa otro proceso vivo
+        raise RuntimeError(f"Los {INGEST_SPOOL_SLOTS} spools de {self.spool_base_path} están en uso (INGEST_SPOOL_SLOTS)")
+
+    def _open_spool(self):
+        """Abrir el spool de este proceso; lo que no llegó a la base lo guarda el escritor al arrancar"""
+        self.spool_path, self._spool = self._claim_spool()
+        self._spool.seek(0, os.SEEK_END)
+        end = self._spool.tell()
+        committed = self._read_committed_offset()
+        if end < committed:
+            committed = 0
+        self._replay_range = (committed, end) if end > committed else None
+
+    def _replay_spool(self):
+        """Guardar, directo en lotes y antes que cualquier fila nueva, lo pendiente del spool"""
+        committed, end = self._replay_range
+        pending = 0
+        batch = []
+        offset = committed
+        with open(self.spool_path, "r", encoding="utf-8", newline="") as spool:
+            spool.seek(committed)
+            while offset < end:
+                line = spool.readline()
+                if not line:
+                    break
+                offset += len(line.encode("utf-8"))
+                if not line.endswith("\n"):
+                    break  # Línea incompleta de un corte abrupto
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                row["timestamp"] = datetime.fromisoformat(row["timestamp"]) if row.get("timestamp") else None
+                batch.append((row, offset))
+                pending += 1
+                if len(batch) >= self.flush_rows:
+                    self._flush(batch)
+                    batch = []
+        if batch:
+            self._flush(batch)
+        self._replay_range = None
+        if pending:
+            logger.info(f"Guardadas {pending} filas pendientes del spool {self.spool_path}")
+
+    def _write_dead_letters(self, failed: List[tuple]):
+        """Agregar al archivo de descartes las filas que la base rechazó, con su error"""
+        path = self.dead_letter_path or (f"{self.spool_path}.dead" if self.spool_path else None)
+        for _, status in failed:
+            logger.warning(f"Fila rechazada por la base: {status.get('error')}",
+                           extra={"dead_letter_path": path})
+        if not path:
+            return
+        with open(path, "a", encoding="utf-8") as dead_letters:
+            for row, status in failed:
+                dead_letters.write(json.dumps(
+                    {"error": status.get("error"), "failed_at": datetime.utcnow(), "row": row},
+                    default=_json_default, ensure_ascii=False
+                ) + "\n")
+            dead_letters.flush()
+            os.fsync(dead_letters.fileno())
+
+    def _compact_spool(self):
+        """Truncar el spool cuando todo lo escrito ya está en la base"""
+        if not self._spool or not self._queue.empty():
+            return
+        with self._lock:
+            if self._queue.empty() and self._in_flight == 0 and self._spool.tell() > 0 \
+                    and self._read_committed_offset() == self._spool.tell():
+                self._spool.truncate(0)
+                self._spool.seek(0)
+                self._write_committed_offset(0)
+
+    # ------------------------------------------------------------------
+    # Estadísticas
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        while self._flushed_window and now - self._flushed_window[0][0] > _THROUGHPUT_WINDOW_SECONDS:
+            self._flushed_window.popleft()
+        window_rows = sum(rows for _, rows in self._flushed_window)
+        flush_latencies = list(self._flush_latencies_ms)
+        enqueue_latencies = list(self._enqueue_latencies_ms)
+
+        return {
+            "mode": "queue",
+            "running": bool(self._thread and self._thread.is_alive()),
+            "queue_depth": self._queue.qsize() + self._in_flight,
+            "queue_capacity": self.maxsize,
+            "flush_rows": self.flush_rows,
+            "flush_ms": int(self.flush_seconds * 1000),
+            "enqueued_total": self._enqueued_total,
+            "flushed_rows_total": self._flushed_rows_total,
+            "failed_rows_total": self._failed_rows_total,
+            "flush_count": self._flush_count,
+            "flush_errors": self._flush_errors,
+            "last_flush_at": self._last_flush_at.isoformat() if self._last_flush_at else None,
+            "flush_latency_ms": {
+                "last": round(flush_latencies[-1], 3) if flush_latencies else None,
+                "p50": _percentile(flush_latencies, 50),
+                "p99": _percentile(flush_latencies, 99),
+            },
+            "enqueue_latency_ms": {
+                "p50": _percentile(enqueue_latencies, 50),
+                "p99": _percentile(enqueue_latencies, 99),
+            },
+            "rows_per_sec": round(window_rows / _THROUGHPUT_WINDOW_SECONDS, 2),
+            "spool_path": self.spool_path,
+            "dead_letter_path": self.dead_letter_path or (f"{self.spool_path}.dead" if self.spool_path else None),
+            "spool_pending_bytes": (self._spool.tell() - self._read_committed_offset()) if self._spool else 0,
+        }
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+# Instancia única del proceso (solo se crea en modo queue)
+_ingest_queue: Optional[IngestQueue] = None
+
+
+def get_ingest_queue() -> Optional[IngestQueue]:
+    """Obtener la cola de ingesta del proceso, o None si INGEST_MODE no es 'queue'"""
+    global _ingest_queue
+    if INGEST_MODE != "queue":
+        return None
+    if _ingest_queue is None:
+        _ingest_queue = IngestQueue()
+    return _ingest_queue
@@ -0,0 +1,216 @@
+"""
+Logs estructurados de la API, escritos fuera del hilo del request.
+
+main, db_models, test_executor e ingest_queue hacían print(..., flush=True) por request,
+por fila guardada y por línea de salida de Playwright: con carga los hilos se
+serializaban en el lock de stdout y los logs de Railway llegaban atrasados. Ahora usan
+logging con get_logger(__name__):
+- En el hilo que loguea solo se arma el mensaje y se encola (QueueHandler); un
+  QueueListener (hilo "log-writer") formatea y escribe en stdout. Si la cola está llena
+  (LOG_QUEUE_SIZE) el registro se descarta y se cuenta en vez de frenar al request.
+- LOG_FORMAT=json (default) escribe un objeto por línea con ts, level, logger, msg,
+  los campos pasados con extra={...} y exc si hubo excepción. LOG_FORMAT=text mantiene
+  el formato "[INFO] mensaje".
+- LOG_LEVEL es el nivel de todo "app"; LOG_LEVELS lo ajusta por módulo, por ejemplo
+  "app.db_models=DEBUG,app.test_executor.output=WARNING".
+- LOG_SAMPLING deja pasar 1 de cada N registros de un logger (y sus hijos), por
+  ejemplo "app.test_executor.output=20". WARNING y superiores no se muestrean.
+
+Solo se configura el logger "app" (sin propagar a root): uvicorn mantiene sus logs.
+"""
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    """"a=1,b=2" -> {"a": "1", "b": "2"}"""
+    pairs = {}
+    for item in value.split(","):
+        name, _, setting = item.partition("=")
+        if name.strip() and setting.strip():
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+LOG_LEVELS = {name: level.upper() for name, level in _parse_pairs(os.getenv("LOG_LEVELS", "")).items()}
+LOG_SAMPLING = {name: int(rate) for name, rate in _parse_pairs(os.getenv("LOG_SAMPLING", "")).items()}
+
+# Atributos propios de LogRecord: el resto son los campos pasados con extra=
+_RECORD_ATTRIBUTES = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "taskName"}
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict[str, object]:
+    return {key: value for key, value in record.__dict__.items() if key not in _RECORD_ATTRIBUTES}
+
+
+class JSONFormatter(logging.Formatter):
+    """Un objeto JSON por registro"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if orjson is not None:
+            return orjson.dumps(entry, default=str).decode("utf-8")
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """"[NIVEL] mensaje campo=valor", como los prints anteriores"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"[{record.levelname}] {record.getMessage()}"
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar 1 de cada N registros por logger según LOG_SAMPLING (los WARNING o más, siempre)"""
+
+    def __init__(self, rates: Dict[str, int]):
+        super().__init__()
+        self.rates = rates
+        self.sampled_out = 0
+        self._counters: Dict[str, "itertools.count"] = {}
+        self._rate_cache: Dict[str, int] = {}
+
+    def _rate(self, name: str) -> int:
+        rate = self._rate_cache.get(name)
+        if rate is None:
+            # La regla más específica: "app.test_executor" también cubre "app.test_executor.output"
+            rate, prefix = 1, name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._rate_cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate <= 1:
+            return True
+        counter = self._counters.get(record.name)
+        if counter is None:
+            counter = self._counters.setdefault(record.name, itertools.count())
+        if next(counter) % rate:
+            self.sampled_out += 1
+            return False
+        record.sampled = rate
+        return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Encola sin esperar; con la cola llena descarta el registro"""
+
+    def __init__(self, log_queue: "queue.Queue"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Fijar el mensaje y la traza acá (los args o la excepción pueden cambiar después),
+        # pero dejar el formato (JSON) para el hilo que escribe
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.stack_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Con la cola llena put_nowait fallaría y stop() no terminaría de vaciarla
+        self.queue.put(self._sentinel)
+
+
+_setup_lock = threading.Lock()
+_handler: Optional[_NonBlockingQueueHandler] = None
+_sampler: Optional[SamplingFilter] = None
+_listener: Optional[_Listener] = None
+
+
+def setup_logging():
+    """Configurar el logger "app" (una sola vez por proceso)"""
+    global _handler, _sampler, _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JSONFormatter())
+
+        log_queue: "queue.Queue" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _sampler = SamplingFilter(LOG_SAMPLING)
+        _handler = _NonBlockingQueueHandler(log_queue)
+        _handler.addFilter(_sampler)
+
+        app_logger = logging.getLogger("app")
+        app_logger.setLevel(LOG_LEVEL)
+        app_logger.propagate = False
+        app_logger.addHandler(_handler)
+        for name, level in LOG_LEVELS.items():
+            logging.getLogger(name).setLevel(level)
+
+        _listener = _Listener(log_queue, stream, respect_handler_level=False)
+        _listener.start()
+        _listener._thread.name = "log-writer"
+        # Escribir lo que quede en la cola antes de terminar el proceso
+        atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """logging.getLogger(name) con el logger "app" ya configurado"""
+    if _listener is None:
+        setup_logging()
+    if name == "__main__":
+        # python -m app.rollup: el módulo se llama "__main__" y quedaría fuera del logger "app"
+        spec = getattr(sys.modules["__main__"], "__spec__", None)
+        name = spec.name if spec is not None else name
+    return logging.getLogger(name)
+
+
+def log_stats() -> Dict[str, int]:
+    """Registros descartados por cola llena y filtrados por muestreo desde que arrancó el proceso"""
+    return {
+        "queue_depth": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+        "sampled_out": _sampler.sampled_out if _sampler else 0,
+    }
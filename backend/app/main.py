@@ -1,50 +1,82 @@
 """
 FastAPI Backend con PostgreSQL
 """
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Body, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import Optional, List
-from datetime import datetime
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional, List, Dict, Any
+from datetime import datetime, date
+import hashlib
 import os
-import traceback
+import zlib
 
-from app.database import engine, SessionLocal
+from app.database import engine, SessionLocal, pool_monitor, async_pool_monitor, sqlite_writer
 from app.models import Base, TestExecution
+from app.migrations import run_migrations
 from app.db_models import (
     create_test_result,
+    create_test_results_batch,
+    new_run_id,
+    parse_fields,
+    InvalidFields,
+    result_cursor,
+    TREND_BUCKETS,
+    InvalidSearch,
+    InvalidLatencyQuery,
+    RUN_DIFF_STATUSES
+)
+from app.db_async import (
     get_test_result,
     get_test_results,
     get_recent_results,
     get_statistics,
-    get_summary
+    get_summary,
+    get_trends,
+    data_version,
+    search_test_results,
+    get_latency,
+    get_flaky_questions,
+    run_exists,
+    get_test_status,
+    get_running_tests
 )
+from app.dimensions import load_dimensions
 from app.schemas import (
-    TestResultCreate, TestResultResponse, 
-    StatisticsResponse, SummaryResponse
+    TestResultCreate, TestResultResponse, TestResultProjection, ResultsPage,
+    StatisticsResponse, SummaryResponse, TrendPoint, LatencyStats, FlakyQuestion,
+    BatchResultResponse, StreamIngestResponse,
 )
+from app.serialization import ResultsResponse
+from app.metrics import METRICS_ENABLED, MetricsMiddleware, request_metrics, render_gauges
+from app.log_config import get_logger, log_stats
+from app.cursors import InvalidCursor
+from app.export import EXPORT_FORMATS, export_chunks, run_diff_chunks
+from app.retention import ArchiveUnavailable, get_archived_trends, merge_trends, require_pyarrow
+from app.stream_ingest import StreamIngestError, ingest_ndjson
+from app.ingest_queue import INGEST_MODE, IngestQueueFull, get_ingest_queue
+from app.query_cache import get_query_cache, data_version_scope
 from app.test_executor import (
     get_test_bases, 
     start_test_execution, 
-    get_test_status,
-    get_running_tests,
     cancel_test_execution
 )
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+
+logger = get_logger(__name__)
 
 # Crear tablas en la base de datos
 db_connected = False
 try:
-    print("[INFO] Attempting to connect to database...")
+    logger.info("Attempting to connect to database...")
     Base.metadata.create_all(bind=engine)
-    print("[OK] Database tables created successfully")
+    logger.info("Database tables created successfully")
+    run_migrations()
+    load_dimensions()
     db_connected = True
 except Exception as e:
-    print(f"[WARNING] Could not create database tables: {e}")
-    print(f"[WARNING] Error type: {type(e).__name__}")
-    import traceback
-    print(f"[WARNING] Traceback: {traceback.format_exc()}")
-    print("[WARNING] The server will start but database operations may fail")
+    logger.warning(f"Could not create database tables ({type(e).__name__}): {e}", exc_info=True)
+    logger.warning("The server will start but database operations may fail")
     db_connected = False
 
 app = FastAPI(
@@ -69,8 +101,8 @@ else:
     ALLOWED_ORIGINS = [origin.strip() for origin in ALLOWED_ORIGINS_STR.split(",") if origin.strip()]
     ALLOW_CREDENTIALS = True
 
-print(f"[INFO] CORS configured with origins: {ALLOWED_ORIGINS}")
-print(f"[INFO] CORS allow_credentials: {ALLOW_CREDENTIALS}")
+logger.info(f"CORS configured with origins: {ALLOWED_ORIGINS}")
+logger.info(f"CORS allow_credentials: {ALLOW_CREDENTIALS}")
 
 app.add_middleware(
     CORSMiddleware,
@@ -78,33 +110,43 @@ app.add_middleware(
     allow_credentials=ALLOW_CREDENTIALS,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+@app.on_event("startup")
+def start_ingest_queue():
+    """Arrancar el escritor de la cola de ingesta (solo con INGEST_MODE=queue)"""
+    ingest_queue = get_ingest_queue()
+    if ingest_queue:
+        ingest_queue.start()
+
+@app.on_event("shutdown")
+def flush_ingest_queue():
+    """Vaciar la cola de ingesta a la base antes de terminar el proceso"""
+    ingest_queue = get_ingest_queue()
+    if ingest_queue:
+        ingest_queue.stop()
+
 # Middleware para capturar errores
 @app.middleware("http")
 async def catch_exceptions_middleware(request, call_next):
     try:
-        print(f"[REQUEST] {request.method} {request.url.path}", flush=True)
-        response = await call_next(request)
-        print(f"[OK] {request.method} {request.url.path} - Status: {response.status_code}", flush=True)
-        return response
+        return await call_next(request)
     except Exception as e:
-        error_trace = traceback.format_exc()
-        print(f"[ERROR] Error en {request.method} {request.url.path}: {str(e)}", flush=True)
-        print(f"[TRACEBACK]\n{error_trace}", flush=True)
-        import sys
-        sys.stdout.flush()
-        sys.stderr.flush()
+        logger.exception(f"Error en {request.method} {request.url.path}: {str(e)}")
         return JSONResponse(
             status_code=500,
             content={"detail": f"Internal server error: {str(e)}"}
         )
 
+# Métricas por ruta en /metrics; se agrega después del middleware de errores para
+# quedar por fuera y contar también sus respuestas 500
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 @app.get("/")
 def read_root():
     try:
-        print("[REQUEST] Request recibida en /", flush=True)
-        
         response = {
             "message": "Test Results API",
             "version": "1.0.0",
@@ -114,89 +156,322 @@ def read_root():
             "endpoints": {
                 "POST /api/results": "Guardar un resultado de test",
                 "POST /api/results/batch": "Guardar múltiples resultados",
+                "POST /api/results/stream": "Guardar resultados en streaming (NDJSON, opcionalmente gzip)",
+                "GET /api/ingest/stats": "Estado de la cola de ingesta",
+                "GET /api/cache/stats": "Estado de la caché de consultas",
+                "GET /api/db/pool": "Estado del pool de conexiones a la base",
+                "GET /metrics": "Métricas por ruta en formato Prometheus",
                 "GET /api/results": "Obtener resultados con filtros",
+                "GET /api/results/export": "Exportar resultados (NDJSON o CSV) en streaming",
+                "GET /api/results/search": "Búsqueda de texto completo en preguntas y respuestas",
                 "GET /api/statistics": "Obtener estadísticas",
+                "GET /api/latency": "Percentiles de tiempo de respuesta (p50/p90/p95/p99)",
+                "GET /api/questions/flaky": "Preguntas que alternan PASS/FAIL entre ejecuciones",
+                "GET /api/runs/{a}/diff/{b}": "Preguntas que cambiaron de resultado entre dos ejecuciones",
                 "GET /api/summary": "Resumen general",
                 "GET /api/results/{id}": "Obtener resultado por ID",
-                "GET /api/results/recent/{hours}": "Obtener resultados recientes"
+                "GET /api/results/recent/{hours}": "Obtener resultados recientes",
+                "GET /api/trends": "Tendencia agregada por bucket de tiempo"
             }
         }
-        print("[OK] Response enviada desde /", flush=True)
         return response
     except Exception as e:
         error_msg = str(e)
-        error_trace = traceback.format_exc()
-        print(f"[ERROR] Error en /: {error_msg}", flush=True)
-        print(f"[TRACEBACK] {error_trace}", flush=True)
+        logger.exception(f"Error en /: {error_msg}")
         raise HTTPException(status_code=500, detail=f"Error: {error_msg}")
 
 @app.post("/api/results", response_model=TestResultResponse)
-def create_result(result: TestResultCreate):
+def create_result(
+    result: TestResultCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=100, description="run_id para un resultado que llega sin uno: los reintentos con la misma clave no se duplican")
+):
     """Guardar un resultado de test"""
     try:
-        print(f"[REQUEST] Recibiendo resultado: {result.test_id}", flush=True)
+        logger.debug(f"Recibiendo resultado: {result.test_id}")
         
         # Convertir a diccionario
         data = result.dict()
         data["timestamp"] = datetime.utcnow()
+        data["run_id"] = data["run_id"] or idempotency_key or new_run_id()
+        
+        # Modo cola: responder apenas queda encolado; el escritor lo guarda en lote
+        ingest_queue = get_ingest_queue()
+        if ingest_queue:
+            ingest_queue.enqueue(data)
+            return JSONResponse(status_code=202, content={
+                "status": "queued",
+                "test_id": data["test_id"],
+                "timestamp": data["timestamp"].isoformat()
+            })
         
         # Crear en PostgreSQL
         created = create_test_result(data)
         
-        print(f"[OK] Resultado guardado: ID {created['id']}", flush=True)
+        logger.debug(f"Resultado guardado: ID {created['id']}")
         
         # Convertir a TestResultResponse
         return TestResultResponse(**created)
+    except IngestQueueFull as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        print(f"[ERROR] Error guardando resultado: {str(e)}", flush=True)
-        print(f"[TRACEBACK] {traceback.format_exc()}", flush=True)
+        logger.exception(f"Error guardando resultado: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error guardando resultado: {str(e)}")
 
-@app.post("/api/results/batch", response_model=List[TestResultResponse])
-def create_results_batch(results: List[TestResultCreate]):
-    """Guardar múltiples resultados de test"""
+@app.post("/api/results/batch", response_model=BatchResultResponse)
+def create_results_batch(
+    results: List[Dict[str, Any]] = Body(...),
+    idempotency_key: Optional[str] = Header(None, max_length=100, description="run_id de los items que llegan sin uno: reintentar el lote con la misma clave no duplica filas")
+):
+    """Guardar múltiples resultados de test en una sola transacción, con estado por item"""
     try:
-        created_results = []
-        for result in results:
-            data = result.dict()
+        item_results = [None] * len(results)
+        valid_rows = []
+        valid_indexes = []
+        
+        # Validar cada item por separado para que uno inválido no rechace todo el lote
+        for index, item in enumerate(results):
+            try:
+                data = TestResultCreate(**item).dict()
+            except ValidationError as e:
+                detail = "; ".join(f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors())
+                item_results[index] = {"index": index, "status": "error", "error": detail}
+                continue
             data["timestamp"] = datetime.utcnow()
-            created = create_test_result(data)
-            created_results.append(TestResultResponse(**created))
+            valid_rows.append(data)
+            valid_indexes.append(index)
+        
+        statuses = create_test_results_batch(valid_rows, run_id=idempotency_key)
+        for index, status in zip(valid_indexes, statuses):
+            item_results[index] = {"index": index, **status}
         
-        print(f"[OK] Guardados {len(created_results)} resultados", flush=True)
-        return created_results
+        created = sum(1 for r in item_results if r["status"] == "created")
+        duplicates = sum(1 for r in item_results if r["status"] == "duplicate")
+        logger.info(f"Guardados {created}/{len(results)} resultados ({duplicates} duplicados)")
+        return BatchResultResponse(
+            total=len(results),
+            created=created,
+            duplicates=duplicates,
+            failed=len(results) - created - duplicates,
+            results=item_results
+        )
     except Exception as e:
-        print(f"[ERROR] Error guardando lote: {str(e)}", flush=True)
+        logger.error(f"Error guardando lote: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error guardando lote: {str(e)}")
 
-@app.get("/api/results", response_model=List[TestResultResponse])
-def get_results(
+@app.post("/api/results/stream", response_model=StreamIngestResponse)
+async def create_results_stream(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=100, description="run_id de las líneas que llegan sin uno: reenviar el stream con la misma clave no duplica filas")
+):
+    """Guardar resultados enviados como NDJSON (un resultado por línea), procesando el cuerpo a medida que llega"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in ("application/x-ndjson", "application/jsonl"):
+        raise HTTPException(status_code=415, detail="Content-Type debe ser application/x-ndjson")
+    gzipped = request.headers.get("content-encoding", "").lower() == "gzip"
+    
+    try:
+        summary = await ingest_ndjson(request.stream(), gzipped=gzipped, run_id=idempotency_key)
+        logger.info(f"Stream NDJSON: {summary['created']}/{summary['lines']} líneas guardadas")
+        return StreamIngestResponse(**summary)
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Cuerpo gzip inválido: {str(e)}")
+    except StreamIngestError as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=500, detail={"error": str(e), "summary": e.summary})
+
+@app.get("/api/ingest/stats")
+def get_ingest_stats_endpoint():
+    """Profundidad de la cola, latencia de flush y filas/segundo de la ingesta diferida"""
+    ingest_queue = get_ingest_queue()
+    if not ingest_queue:
+        return {"mode": INGEST_MODE, "running": False}
+    return ingest_queue.stats()
+
+@app.get("/api/cache/stats")
+def get_cache_stats_endpoint():
+    """Aciertos, fallos, desalojos y generación de la caché de consultas"""
+    return get_query_cache().stats()
+
+@app.get("/api/db/pool")
+def get_db_pool_endpoint():
+    """Conexiones en uso, overflow, espera por checkout y desconexiones de cada pool (y el escritor SQLite)"""
+    return {
+        "sync": pool_monitor.stats(),
+        "async": async_pool_monitor.stats() if async_pool_monitor else None,
+        "sqlite_writer": sqlite_writer.stats() if sqlite_writer else None,
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics_endpoint():
+    """Requests, latencia y tiempo en la base por ruta, y estado de los pools (formato de texto de Prometheus)"""
+    monitors = [monitor for monitor in (pool_monitor, async_pool_monitor) if monitor]
+    pools = {monitor.name: monitor.stats() for monitor in monitors}
+    body = request_metrics.render()
+    body += render_gauges("db_pool_connections_in_use", "Conexiones prestadas por pool",
+                          {name: stats["in_use"] or 0 for name, stats in pools.items()}, "engine")
+    body += render_gauges("db_pool_overflow", "Conexiones abiertas por encima de pool_size",
+                          {name: stats["overflow"] or 0 for name, stats in pools.items()}, "engine")
+    body += render_gauges("db_pool_checkout_timeouts", "Checkouts que vencieron por pool_timeout desde el arranque",
+                          {name: stats["timeouts"] for name, stats in pools.items()}, "engine")
+    logs = log_stats()
+    body += render_gauges("log_records_lost", "Registros de log descartados (cola llena) o filtrados por muestreo",
+                          {"dropped": logs["dropped"], "sampled_out": logs["sampled_out"]}, "reason")
+    return Response(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _etag(request: Request, version: str, window: str = "") -> str:
+    """ETag de una lectura: versión de los datos, ruta, parámetros y ventana de tiempo si es relativa a ahora"""
+    raw = "|".join([version, request.url.path, str(sorted(request.query_params.multi_items())), window])
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20] + '"'
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Respuesta 304 si el cliente ya tiene esta versión (If-None-Match), si no None"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = [tag.strip() for tag in header.split(",")]
+    if "*" in tags or etag in tags or f"W/{etag}" in tags:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+def _current_minute() -> str:
+    """Ventana para lecturas relativas a ahora: su ETag cambia a lo sumo una vez por minuto"""
+    return datetime.utcnow().strftime("%Y%m%d%H%M")
+
+@app.get("/api/results", response_model=ResultsPage)
+async def get_results(
+    request: Request,
     test_type: Optional[str] = Query(None, description="Tipo de test: automotor, inmobiliario, embarcaciones"),
     environment: Optional[str] = Query(None, description="Entorno: test, preprod, localhost"),
     resultado_final: Optional[str] = Query(None, description="Resultado: PASS, FAIL"),
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior"),
+    fields: Optional[str] = Query(None, description="Columnas a devolver separadas por coma (id y timestamp siempre)")
 ):
-    """Obtener resultados con filtros"""
+    """Obtener resultados con filtros. Si hay más páginas, next_cursor (y el header X-Next-Cursor) trae el cursor siguiente"""
     if not db_connected:
-        return []
+        return {"results": [], "next_cursor": None}
     try:
-        results = get_test_results(
-            test_type=test_type,
-            environment=environment,
-            resultado_final=resultado_final,
-            limit=limit,
-            offset=offset
-        )
+        selected_fields = parse_fields(fields)
+        version = await data_version()
+        etag = _etag(request, version)
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
         
-        # Convertir a TestResultResponse
-        return [TestResultResponse(**r) for r in results]
+        with data_version_scope(version):
+            results = await get_test_results(
+                test_type=test_type,
+                environment=environment,
+                resultado_final=resultado_final,
+                limit=limit,
+                offset=offset,
+                cursor=cursor,
+                fields=selected_fields
+            )
+        
+        headers = {"ETag": etag}
+        next_cursor = result_cursor(results[-1]) if len(results) == limit else None
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        
+        # Ya tienen la forma de TestResultResponse (o solo los campos pedidos): sin revalidar
+        return ResultsResponse({"results": results, "next_cursor": next_cursor}, headers=headers)
+    except (InvalidCursor, InvalidFields) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"[ERROR] Error obteniendo resultados: {str(e)}", flush=True)
+        logger.error(f"Error obteniendo resultados: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error obteniendo resultados: {str(e)}")
 
+@app.get("/api/results/search", response_model=List[TestResultProjection])
+async def search_results(
+    request: Request,
+    q: str = Query(..., min_length=1, description="Texto a buscar en pregunta y respuesta_bot"),
+    test_type: Optional[str] = Query(None, description="Tipo de test: automotor, inmobiliario, embarcaciones"),
+    environment: Optional[str] = Query(None, description="Entorno: test, preprod, localhost"),
+    resultado_final: Optional[str] = Query(None, description="Resultado: PASS, FAIL"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Cursor de X-Next-Cursor de la página anterior"),
+    fields: Optional[str] = Query(None, description="Columnas a devolver separadas por coma (id y timestamp siempre)")
+):
+    """Búsqueda de texto completo, ordenada por relevancia. Si hay más páginas, el header X-Next-Cursor trae el cursor siguiente"""
+    if not db_connected:
+        return []
+    try:
+        selected_fields = parse_fields(fields)
+        version = await data_version()
+        etag = _etag(request, version)
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        
+        with data_version_scope(version):
+            results, next_cursor = await search_test_results(
+                q,
+                test_type=test_type,
+                environment=environment,
+                resultado_final=resultado_final,
+                limit=limit,
+                cursor=cursor,
+                fields=selected_fields
+            )
+        
+        headers = {"ETag": etag}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        
+        return ResultsResponse(results, headers=headers)
+    except (InvalidSearch, InvalidCursor, InvalidFields) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error buscando resultados: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error buscando resultados: {str(e)}")
+
+@app.get("/api/results/export")
+def export_results(
+    format: str = Query("ndjson", description="Formato: ndjson o csv"),
+    test_type: Optional[str] = Query(None, description="Tipo de test: automotor, inmobiliario, embarcaciones"),
+    environment: Optional[str] = Query(None, description="Entorno: test, preprod, localhost"),
+    resultado_final: Optional[str] = Query(None, description="Resultado: PASS, FAIL"),
+    since: Optional[datetime] = Query(None, description="Desde (inclusive), ISO 8601 UTC"),
+    until: Optional[datetime] = Query(None, description="Hasta (exclusivo), ISO 8601 UTC"),
+    fields: Optional[str] = Query(None, description="Columnas a exportar separadas por coma"),
+    include_archive: bool = Query(False, description="Incluir los resultados archivados en Parquet")
+):
+    """Exportar todos los resultados que cumplan los filtros, en streaming y sin límite de filas"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format debe ser uno de: {list(EXPORT_FORMATS)}")
+    try:
+        selected_fields = parse_fields(fields)
+        if include_archive:
+            require_pyarrow()
+    except InvalidFields as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ArchiveUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    chunks = export_chunks(
+        format,
+        fields=selected_fields,
+        test_type=test_type,
+        environment=environment,
+        resultado_final=resultado_final,
+        since=since,
+        until=until,
+        include_archive=include_archive
+    )
+    filename = f"test_results_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{format}"
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @app.get("/api/statistics", response_model=List[StatisticsResponse])
-def get_statistics_endpoint(
+async def get_statistics_endpoint(
+    request: Request,
+    response: Response,
     test_type: Optional[str] = None,
     environment: Optional[str] = None
 ):
@@ -204,14 +479,127 @@ def get_statistics_endpoint(
     if not db_connected:
         return []
     try:
-        stats = get_statistics(test_type=test_type, environment=environment)
+        version = await data_version()
+        etag = _etag(request, version)
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        
+        response.headers["ETag"] = etag
+        with data_version_scope(version):
+            stats = await get_statistics(test_type=test_type, environment=environment)
         return [StatisticsResponse(**s) for s in stats]
     except Exception as e:
-        print(f"[ERROR] Error obteniendo estadísticas: {str(e)}", flush=True)
+        logger.error(f"Error obteniendo estadísticas: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error obteniendo estadísticas: {str(e)}")
 
+@app.get("/api/latency", response_model=List[LatencyStats], response_model_exclude_none=True)
+async def get_latency_endpoint(
+    request: Request,
+    response: Response,
+    since: Optional[date] = Query(None, description="Primer día (inclusive); por defecto 6 días antes de until"),
+    until: Optional[date] = Query(None, description="Último día (inclusive); por defecto hoy (UTC)"),
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None,
+    categoria: Optional[str] = None,
+    group_by: str = Query("test_type,environment", description="Dimensiones separadas por coma: test_type, environment, categoria, day"),
+    exact: bool = Query(False, description="Percentiles exactos con percentile_cont (solo PostgreSQL)")
+):
+    """Percentiles de tiempo de respuesta del bot por tipo, entorno, categoría y día"""
+    if not db_connected:
+        return []
+    try:
+        version = await data_version()
+        etag = _etag(request, version, _current_minute() if until is None else "")
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        
+        response.headers["ETag"] = etag
+        with data_version_scope(version):
+            return await get_latency(
+                since=since,
+                until=until,
+                test_type=test_type,
+                environment=environment,
+                categoria=categoria,
+                group_by=[dimension.strip() for dimension in group_by.split(",") if dimension.strip()],
+                exact=exact
+            )
+    except InvalidLatencyQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error obteniendo latencias: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error obteniendo latencias: {str(e)}")
+
+@app.get("/api/questions/flaky", response_model=List[FlakyQuestion])
+async def get_flaky_questions_endpoint(
+    request: Request,
+    response: Response,
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None,
+    min_runs: int = Query(5, ge=1, description="Mínimo de ejecuciones de la pregunta"),
+    sort: str = Query("flakiness", description="flakiness (alternan) o fail_rate (fallan siempre)"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Ranking de preguntas por flakiness a partir del historial por pregunta"""
+    if sort not in ("flakiness", "fail_rate"):
+        raise HTTPException(status_code=400, detail="sort debe ser flakiness o fail_rate")
+    if not db_connected:
+        return []
+    try:
+        version = await data_version()
+        etag = _etag(request, version)
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        
+        response.headers["ETag"] = etag
+        with data_version_scope(version):
+            return await get_flaky_questions(
+                test_type=test_type,
+                environment=environment,
+                min_runs=min_runs,
+                sort=sort,
+                limit=limit
+            )
+    except Exception as e:
+        logger.error(f"Error obteniendo preguntas inestables: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error obteniendo preguntas inestables: {str(e)}")
+
+@app.get("/api/runs/{run_a}/diff/{run_b}")
+async def get_run_diff(
+    run_a: str,
+    run_b: str,
+    status: str = Query(
+        "newly_failing,newly_passing,still_failing,added,removed",
+        description=f"Estados a incluir separados por coma: {', '.join(RUN_DIFF_STATUSES)}"
+    )
+):
+    """
+    Comparar dos ejecuciones por pregunta, en streaming; el resumen va al final.
+    run_a y run_b son run_id (el test_id de /api/tests/run para las ejecuciones lanzadas desde la API)
+    """
+    statuses = [value.strip() for value in status.split(",") if value.strip()]
+    unknown = [value for value in statuses if value not in RUN_DIFF_STATUSES]
+    if unknown or not statuses:
+        raise HTTPException(status_code=400, detail=f"status debe ser uno o más de: {RUN_DIFF_STATUSES}")
+    try:
+        for run in (run_a, run_b):
+            if not await run_exists(run):
+                raise HTTPException(status_code=404, detail=f"No hay resultados para la ejecución {run}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error comparando ejecuciones: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error comparando ejecuciones: {str(e)}")
+    
+    return StreamingResponse(run_diff_chunks(run_a, run_b, statuses), media_type="application/json")
+
 @app.get("/api/summary", response_model=SummaryResponse)
-def get_summary_endpoint(
+async def get_summary_endpoint(
+    request: Request,
+    response: Response,
     test_type: Optional[str] = None,
     environment: Optional[str] = None
 ):
@@ -219,36 +607,107 @@ def get_summary_endpoint(
     if not db_connected:
         return SummaryResponse(total=0, passed=0, failed=0, success_rate=0.0)
     try:
-        summary = get_summary(test_type=test_type, environment=environment)
+        version = await data_version()
+        etag = _etag(request, version)
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        
+        response.headers["ETag"] = etag
+        with data_version_scope(version):
+            summary = await get_summary(test_type=test_type, environment=environment)
         return SummaryResponse(**summary)
     except Exception as e:
-        print(f"[ERROR] Error obteniendo resumen: {str(e)}", flush=True)
+        logger.error(f"Error obteniendo resumen: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error obteniendo resumen: {str(e)}")
 
+@app.get("/api/trends", response_model=List[TrendPoint])
+async def get_trends_endpoint(
+    request: Request,
+    response: Response,
+    bucket: str = Query("1h", description="Tamaño del bucket: 15m, 1h o 1d"),
+    since: Optional[datetime] = Query(None, description="Desde (inclusive), ISO 8601 UTC; por defecto últimas 24 horas"),
+    until: Optional[datetime] = Query(None, description="Hasta (exclusivo), ISO 8601 UTC"),
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None,
+    include_archive: bool = Query(False, description="Sumar los resultados archivados en Parquet")
+):
+    """Tendencia agregada por bucket de tiempo (un punto por bucket, tipo, entorno y PASS/FAIL)"""
+    if bucket not in TREND_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket debe ser uno de: {list(TREND_BUCKETS)}")
+    if not db_connected:
+        return []
+    try:
+        version = await data_version()
+        # Sin since, la ventana por defecto (últimas 24 horas) se mueve con el reloj
+        etag = _etag(request, version, _current_minute() if since is None else "")
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        
+        response.headers["ETag"] = etag
+        with data_version_scope(version):
+            trends = await get_trends(
+                bucket=bucket,
+                since=since,
+                until=until,
+                test_type=test_type,
+                environment=environment
+            )
+            if include_archive:
+                trends = merge_trends(trends, await run_in_threadpool(
+                    get_archived_trends,
+                    bucket=bucket,
+                    since=since,
+                    until=until,
+                    test_type=test_type,
+                    environment=environment
+                ))
+            return trends
+    except ArchiveUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error obteniendo tendencias: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error obteniendo tendencias: {str(e)}")
+
 @app.get("/api/results/{result_id}", response_model=TestResultResponse)
-def get_result(result_id: str):
+async def get_result(result_id: str):
     """Obtener un resultado específico"""
     try:
-        result = get_test_result(result_id)
+        result = await get_test_result(result_id)
         if not result:
             raise HTTPException(status_code=404, detail="Result not found")
-        return TestResultResponse(**result)
+        return ResultsResponse(result)
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[ERROR] Error obteniendo resultado: {str(e)}", flush=True)
+        logger.error(f"Error obteniendo resultado: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error obteniendo resultado: {str(e)}")
 
-@app.get("/api/results/recent/{hours}")
-def get_recent_results_endpoint(hours: int = 24):
+@app.get("/api/results/recent/{hours}", response_model=List[TestResultProjection])
+async def get_recent_results_endpoint(
+    request: Request,
+    hours: int = 24,
+    fields: Optional[str] = Query(None, description="Columnas a devolver separadas por coma (id y timestamp siempre)")
+):
     """Obtener resultados de las últimas N horas"""
     if not db_connected:
         return []
     try:
-        results = get_recent_results(hours=hours)
-        return [TestResultResponse(**r) for r in results]
+        selected_fields = parse_fields(fields)
+        version = await data_version()
+        etag = _etag(request, version, _current_minute())
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        
+        with data_version_scope(version):
+            results = await get_recent_results(hours=hours, fields=selected_fields)
+        return ResultsResponse(results, headers={"ETag": etag})
+    except InvalidFields as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"[ERROR] Error obteniendo resultados recientes: {str(e)}", flush=True)
+        logger.error(f"Error obteniendo resultados recientes: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error obteniendo resultados recientes: {str(e)}")
 
 @app.get("/api/tests/bases")
@@ -258,7 +717,7 @@ def get_test_bases_endpoint():
         bases = get_test_bases()
         return {"bases": bases}
     except Exception as e:
-        print(f"[ERROR] Error obteniendo bases: {str(e)}", flush=True)
+        logger.error(f"Error obteniendo bases: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error obteniendo bases: {str(e)}")
 
 class TestRunRequest(BaseModel):
@@ -272,7 +731,7 @@ def run_test_endpoint(request: TestRunRequest):
         req = request
         test_type = req.test_type
         environment = req.environment or "preprod"
-        print(f"[REQUEST] POST /api/tests/run - test_type: {test_type}, environment: {environment}", flush=True)
+        logger.debug(f"POST /api/tests/run - test_type: {test_type}, environment: {environment}")
         
         # Validar test_type
         valid_types = ["automotor", "inmobiliario", "embarcaciones"]
@@ -287,7 +746,7 @@ def run_test_endpoint(request: TestRunRequest):
         # Iniciar ejecución
         test_id = start_test_execution(test_type, environment)
         
-        print(f"[OK] POST /api/tests/run - Test {test_id} iniciado en ambiente {environment}", flush=True)
+        logger.info(f"POST /api/tests/run - Test {test_id} iniciado en ambiente {environment}")
         
         return {
             "test_id": test_id,
@@ -299,52 +758,50 @@ def run_test_endpoint(request: TestRunRequest):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[ERROR] Error iniciando test: {str(e)}", flush=True)
-        import traceback
-        print(f"[ERROR] Traceback: {traceback.format_exc()}", flush=True)
+        logger.exception(f"Error iniciando test: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error iniciando test: {str(e)}")
 
 @app.get("/api/tests/status/{test_id}")
-def get_test_status_endpoint(test_id: str):
+async def get_test_status_endpoint(test_id: str):
     """Obtener estado de una ejecución de test"""
     try:
-        print(f"[REQUEST] GET /api/tests/status/{test_id}", flush=True)
-        status = get_test_status(test_id)
+        logger.debug(f"GET /api/tests/status/{test_id}")
+        status = await get_test_status(test_id)
         if not status:
-            print(f"[WARNING] Test {test_id} no encontrado", flush=True)
+            logger.warning(f"Test {test_id} no encontrado")
             raise HTTPException(status_code=404, detail=f"Test execution not found: {test_id}")
-        print(f"[OK] GET /api/tests/status/{test_id} - Status: 200", flush=True)
+        logger.debug(f"GET /api/tests/status/{test_id} - Status: 200")
         return status
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[ERROR] Error obteniendo estado: {str(e)}", flush=True)
+        logger.error(f"Error obteniendo estado: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error obteniendo estado: {str(e)}")
 
 @app.get("/api/tests/running")
-def get_running_tests_endpoint():
+async def get_running_tests_endpoint():
     """Obtener lista de tests que están corriendo o en cola"""
     try:
-        running = get_running_tests()
+        running = await get_running_tests()
         return {"running_tests": running, "count": len(running)}
     except Exception as e:
-        print(f"[ERROR] Error obteniendo tests corriendo: {str(e)}", flush=True)
+        logger.error(f"Error obteniendo tests corriendo: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error obteniendo tests corriendo: {str(e)}")
 
 @app.post("/api/tests/cancel/{test_id}")
 def cancel_test_endpoint(test_id: str):
     """Cancelar ejecución de un test"""
     try:
-        print(f"[REQUEST] POST /api/tests/cancel/{test_id}", flush=True)
+        logger.debug(f"POST /api/tests/cancel/{test_id}")
         success = cancel_test_execution(test_id)
         if not success:
             raise HTTPException(status_code=400, detail="No se pudo cancelar el test. Puede que no esté corriendo o ya haya terminado.")
-        print(f"[OK] POST /api/tests/cancel/{test_id} - Test cancelado", flush=True)
+        logger.info(f"POST /api/tests/cancel/{test_id} - Test cancelado")
         return {"message": f"Test {test_id} cancelado exitosamente", "test_id": test_id}
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[ERROR] Error cancelando test: {str(e)}", flush=True)
+        logger.error(f"Error cancelando test: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error cancelando test: {str(e)}")
 
 @app.post("/api/tests/cleanup-stuck")
@@ -354,7 +811,7 @@ def cleanup_stuck_tests_endpoint():
         from app.test_executor import get_test_status, update_test_status, get_running_tests
         from datetime import datetime, timedelta
         
-        print(f"[REQUEST] POST /api/tests/cleanup-stuck", flush=True)
+        logger.debug("POST /api/tests/cleanup-stuck")
         
         running_tests = get_running_tests()
         cleaned_count = 0
@@ -375,16 +832,14 @@ def cleanup_stuck_tests_endpoint():
                                 "completed_at": datetime.utcnow().isoformat()
                             })
                             cleaned_count += 1
-                            print(f"[INFO] Limpiado test stuck: {test_id}", flush=True)
+                            logger.info(f"Limpiado test stuck: {test_id}")
                     except Exception as e:
-                        print(f"[WARNING] Error procesando test {test_id}: {str(e)}", flush=True)
+                        logger.warning(f"Error procesando test {test_id}: {str(e)}")
         
-        print(f"[OK] POST /api/tests/cleanup-stuck - Limpiados {cleaned_count} tests", flush=True)
+        logger.info(f"POST /api/tests/cleanup-stuck - Limpiados {cleaned_count} tests")
         return {"message": f"Limpiados {cleaned_count} tests atascados", "cleaned_count": cleaned_count}
     except Exception as e:
-        print(f"[ERROR] Error limpiando tests: {str(e)}", flush=True)
-        import traceback
-        print(f"[ERROR] Traceback: {traceback.format_exc()}", flush=True)
+        logger.exception(f"Error limpiando tests: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error limpiando tests: {str(e)}")
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+"""
+Métricas de la API en formato de texto de Prometheus (GET /metrics).
+
+MetricsMiddleware es un middleware ASGI (sin BaseHTTPMiddleware ni prints por request)
+que registra por método y ruta (la plantilla, /api/results/{result_id}, no la URL):
+- http_requests_total por código de estado;
+- http_request_duration_seconds: histograma de latencia;
+- http_request_db_seconds e http_request_db_queries_total: tiempo y cantidad de
+  llamadas a la base de cada request (run_query, run_query_async y run_write, que
+  llaman a record_db_time; el export en streaming no pasa por ellas). Se mide por
+  llamada y no por sentencia SQL: los eventos before/after_cursor_execute de
+  SQLAlchemy costaban más por consulta que todo el resto del middleware;
+- http_requests_in_progress por método.
+
+Todo se actualiza desde el event loop, así que no hace falta lock; las llamadas que
+corren en el threadpool suman sobre la misma lista del request porque el contexto
+(contextvars) viaja con ellas. Las rutas sin match se agrupan en "<unmatched>" para no
+abrir una serie por URL.
+"""
+import contextvars
+import os
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Límites superiores (segundos) de los buckets de los histogramas
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+# [segundos, llamadas] en la base del request en curso
+_db_time: contextvars.ContextVar = contextvars.ContextVar("db_time", default=None)
+
+
+class _RouteStats:
+    """Contadores e histogramas de una ruta; los buckets no son acumulados hasta render()"""
+    __slots__ = ("statuses", "latency", "latency_sum", "db", "db_sum", "db_queries")
+
+    def __init__(self):
+        self.statuses: Dict[int, int] = {}
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)  # el último es +Inf
+        self.latency_sum = 0.0
+        self.db = [0] * (len(DB_BUCKETS) + 1)
+        self.db_sum = 0.0
+        self.db_queries = 0
+
+
+class RequestMetrics:
+    """Contadores e histogramas por (método, ruta)"""
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], _RouteStats] = {}
+        self.in_progress: Dict[str, int] = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: float, db_seconds: float, db_queries: int):
+        stats = self.routes.get((method, route))
+        if stats is None:
+            stats = self.routes[(method, route)] = _RouteStats()
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        stats.latency[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        stats.latency_sum += seconds
+        stats.db[bisect_left(DB_BUCKETS, db_seconds)] += 1
+        stats.db_sum += db_seconds
+        stats.db_queries += db_queries
+
+    def render(self) -> str:
+        routes = sorted(self.routes.items())
+        lines: List[str] = []
+        lines.append("# HELP http_requests_total Requests atendidos por método, ruta y código de estado")
+        lines.append("# TYPE http_requests_total counter")
+        for (method, route), stats in routes:
+            for status, value in sorted(stats.statuses.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {value}')
+
+        lines.append("# HELP http_requests_in_progress Requests en curso por método")
+        lines.append("# TYPE http_requests_in_progress gauge")
+        for method, value in sorted(self.in_progress.items()):
+            lines.append(f'http_requests_in_progress{{method="{method}"}} {value}')
+
+        _render_histogram(lines, "http_request_duration_seconds", "Latencia de los requests por método y ruta",
+                          LATENCY_BUCKETS, [(key, stats.latency, stats.latency_sum) for key, stats in routes])
+        _render_histogram(lines, "http_request_db_seconds", "Tiempo en la base por request, por método y ruta",
+                          DB_BUCKETS, [(key, stats.db, stats.db_sum) for key, stats in routes])
+
+        lines.append("# HELP http_request_db_queries_total Llamadas a la base por método y ruta")
+        lines.append("# TYPE http_request_db_queries_total counter")
+        for (method, route), stats in routes:
+            lines.append(f'http_request_db_queries_total{{method="{method}",route="{_escape(route)}"}} {stats.db_queries}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _render_histogram(lines: List[str], name: str, help_text: str, buckets: Tuple[float, ...],
+                      histograms: List[Tuple[Tuple[str, str], List[int], float]]):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for (method, route), counts, total in histograms:
+        labels = f'method="{method}",route="{_escape(route)}"'
+        cumulative = 0
+        for bound, count in zip(buckets, counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {total:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {cumulative}")
+
+
+def render_gauges(name: str, help_text: str, values: Dict[str, float], label: str) -> str:
+    """Un gauge con una serie por valor de `label` (por ejemplo, el estado del pool por engine)"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for label_value, value in sorted(values.items()):
+        lines.append(f'{name}{{{label}="{_escape(label_value)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics()
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que alimenta request_metrics"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        in_progress = request_metrics.in_progress
+        in_progress[method] = in_progress.get(method, 0) + 1
+        db_time = [0.0, 0]
+        token = _db_time.set(db_time)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _db_time.reset(token)
+            in_progress[method] -= 1
+            # El router de FastAPI deja la ruta que atendió el request en el scope
+            route = scope.get("route")
+            request_metrics.observe(
+                method, getattr(route, "path", UNMATCHED_ROUTE), status[0], elapsed, db_time[0], db_time[1]
+            )
+
+
+def record_db_time(seconds: float):
+    """Sumar una llamada a la base (run_query, run_query_async, run_write) al request en curso"""
+    db_time = _db_time.get()
+    if db_time is not None:
+        db_time[0] += seconds
+        db_time[1] += 1
@@ -0,0 +1,56 @@
+"""
+Script para agregar la columna pregunta_hash (hash de la pregunta) a test_results y
+calcularla en los registros que no la tienen.
+La clave de idempotencia que la usa la crea la migración 0010 (app/migrations/m0010_run_id.py).
+"""
+from app.database import engine, SessionLocal
+from app.db_models import question_hash
+from sqlalchemy import text, inspect
+
+BACKFILL_CHUNK = 1000
+
+def migrate():
+    """Agregar pregunta_hash si no existe y completarla en todos los registros"""
+    db = SessionLocal()
+    try:
+        inspector = inspect(engine)
+        if 'test_results' not in inspector.get_table_names():
+            print("[INFO] La tabla test_results no existe, se creará automáticamente")
+            return
+
+        columns = [col['name'] for col in inspector.get_columns('test_results')]
+        if 'pregunta_hash' not in columns:
+            print("[INFO] Agregando columna pregunta_hash a test_results...")
+            db.execute(text("ALTER TABLE test_results ADD COLUMN pregunta_hash VARCHAR(64)"))
+            db.commit()
+
+        last_id = 0
+        updated = 0
+        while True:
+            rows = db.execute(text("""
+                SELECT id, pregunta FROM test_results
+                WHERE pregunta_hash IS NULL AND id > :last_id
+                ORDER BY id LIMIT :limit
+            """), {"last_id": last_id, "limit": BACKFILL_CHUNK}).all()
+            if not rows:
+                break
+
+            db.execute(
+                text("UPDATE test_results SET pregunta_hash = :hash WHERE id = :id"),
+                [{"id": row.id, "hash": question_hash(row.pregunta)} for row in rows]
+            )
+            db.commit()
+            updated += len(rows)
+            last_id = rows[-1].id
+
+        if updated:
+            print(f"[INFO] pregunta_hash calculado para {updated} registros")
+    except Exception as e:
+        print(f"[ERROR] Error en migración: {str(e)}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    migrate()
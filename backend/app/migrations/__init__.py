@@ -0,0 +1,148 @@
+"""
+Migraciones versionadas del esquema.
+
+Cada migración es un módulo de este paquete con VERSION, DESCRIPTION, TRANSACTIONAL y
+upgrade(connection), registrado en MIGRATIONS en orden. run_migrations() aplica las que
+no figuran en schema_migrations y registra cada una al terminar; en PostgreSQL toma un
+advisory lock para que varios workers arrancando a la vez no la apliquen dos veces.
+
+Las migraciones con TRANSACTIONAL = False reciben una conexión en autocommit (por
+ejemplo para CREATE INDEX CONCURRENTLY) y deben ser idempotentes, porque si fallan a
+mitad de camino se vuelven a ejecutar completas.
+
+Una migración no llama al código de rebuild de las tablas derivadas (rollup, sketch de
+latencia, question_history): ese código usa los modelos actuales, que pueden depender de
+columnas que agrega una migración posterior. En cambio declara REBUILDS = ["rollup", ...];
+al registrarla se anotan en schema_rebuilds y se reconstruyen una sola vez cuando ya no
+quedan migraciones pendientes. Si un rebuild falla queda anotado y se reintenta en el
+próximo arranque.
+
+Uso (desde backend/):
+    python -m app.migrations            # aplicar pendientes
+    python -m app.migrations --status   # listar aplicadas y pendientes
+"""
+from datetime import datetime
+from typing import Optional, List
+
+from sqlalchemy import Table, Column, String, DateTime, MetaData, select, insert
+
+from app.database import engine
+from app.models import Base, ResultRollup, LatencySketch, QuestionHistory
+from app.rollup import rebuild_rollup
+from app.flakiness import rebuild_question_history
+from app.migrations import (
+    m0001_pregunta_hash, m0002_rollup, m0003_query_indexes, m0004_fulltext_search,
+    m0005_latency_sketch, m0006_question_history, m0007_text_blobs, m0008_dimensions,
+    m0009_aggregates_by_id, m0010_run_id, m0011_run_diff_index, m0012_question_hash_backfill
+)
+
+MIGRATIONS = [
+    m0001_pregunta_hash, m0002_rollup, m0003_query_indexes, m0004_fulltext_search,
+    m0005_latency_sketch, m0006_question_history, m0007_text_blobs, m0008_dimensions,
+    m0009_aggregates_by_id, m0010_run_id, m0011_run_diff_index, m0012_question_hash_backfill
+]
+
+# Clave del advisory lock de PostgreSQL que serializa run_migrations entre procesos
+MIGRATIONS_LOCK_ID = 7310012
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", String(20), primary_key=True),
+    Column("description", String(200)),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+# Rebuilds pendientes pedidos por migraciones ya aplicadas
+schema_rebuilds = Table(
+    "schema_rebuilds",
+    MetaData(),
+    Column("name", String(50), primary_key=True),
+    Column("requested_by", String(20)),
+)
+
+# Nombre del rebuild -> (tablas que reconstruye, función)
+REBUILDS = {
+    "rollup": ([ResultRollup.__table__, LatencySketch.__table__], rebuild_rollup),
+    "question_history": ([QuestionHistory.__table__], rebuild_question_history),
+}
+
+
+def applied_versions() -> List[str]:
+    """Versiones ya aplicadas, en orden"""
+    schema_migrations.create(bind=engine, checkfirst=True)
+    schema_rebuilds.create(bind=engine, checkfirst=True)
+    with engine.connect() as connection:
+        return list(connection.execute(
+            select(schema_migrations.c.version).order_by(schema_migrations.c.version)
+        ).scalars())
+
+
+def _record(connection, migration):
+    """Registrar la migración y anotar los rebuilds que pide"""
+    for name in getattr(migration, "REBUILDS", []):
+        pending = connection.execute(
+            select(schema_rebuilds.c.name).where(schema_rebuilds.c.name == name)
+        ).first()
+        if pending is None:
+            connection.execute(insert(schema_rebuilds).values(name=name, requested_by=migration.VERSION))
+    connection.execute(insert(schema_migrations).values(
+        version=migration.VERSION, description=migration.DESCRIPTION
+    ))
+
+
+def _apply(migration):
+    print(f"[INFO] Aplicando migración {migration.VERSION} - {migration.DESCRIPTION}", flush=True)
+    if migration.TRANSACTIONAL:
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            _record(connection, migration)
+    else:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            migration.upgrade(connection)
+            _record(connection, migration)
+    print(f"[OK] Migración {migration.VERSION} aplicada", flush=True)
+
+
+def run_pending_rebuilds() -> List[str]:
+    """Reconstruir las tablas derivadas anotadas en schema_rebuilds (con el esquema ya al día)"""
+    with engine.connect() as connection:
+        pending = list(connection.execute(select(schema_rebuilds.c.name).order_by(schema_rebuilds.c.name)).scalars())
+    done = []
+    for name in pending:
+        tables, rebuild = REBUILDS[name]
+        Base.metadata.create_all(bind=engine, tables=tables)
+        rebuild()
+        with engine.begin() as connection:
+            connection.execute(schema_rebuilds.delete().where(schema_rebuilds.c.name == name))
+        done.append(name)
+    return done
+
+
+def run_migrations(target: Optional[str] = None) -> List[str]:
+    """Aplicar las migraciones pendientes (hasta `target` inclusive); retorna las aplicadas"""
+    lock_connection = None
+    if engine.dialect.name == "postgresql":
+        lock_connection = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        lock_connection.exec_driver_sql(f"SELECT pg_advisory_lock({MIGRATIONS_LOCK_ID})")
+    try:
+        done = set(applied_versions())
+        applied = []
+        for migration in MIGRATIONS:
+            if target is not None and migration.VERSION > target:
+                break
+            if migration.VERSION in done:
+                continue
+            _apply(migration)
+            applied.append(migration.VERSION)
+            done.add(migration.VERSION)
+        if all(migration.VERSION in done for migration in MIGRATIONS):
+            run_pending_rebuilds()
+        else:
+            print("[INFO] Quedan migraciones pendientes: los rebuilds de tablas derivadas esperan a que terminen", flush=True)
+        return applied
+    finally:
+        if lock_connection is not None:
+            lock_connection.exec_driver_sql(f"SELECT pg_advisory_unlock({MIGRATIONS_LOCK_ID})")
+            lock_connection.close()
+
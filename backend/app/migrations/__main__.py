@@ -0,0 +1,24 @@
+"""
+CLI de migraciones (ver app/migrations/__init__.py).
+
+Uso (desde backend/):
+    python -m app.migrations            # aplicar pendientes
+    python -m app.migrations --status   # listar aplicadas y pendientes
+"""
+import argparse
+
+from app.migrations import MIGRATIONS, applied_versions, run_migrations
+
+parser = argparse.ArgumentParser(description="Migraciones del esquema")
+parser.add_argument("--status", action="store_true", help="Listar migraciones aplicadas y pendientes")
+parser.add_argument("--target", default=None, help="Aplicar solo hasta esta versión")
+args = parser.parse_args()
+
+if args.status:
+    done = set(applied_versions())
+    for migration in MIGRATIONS:
+        state = "aplicada " if migration.VERSION in done else "pendiente"
+        print(f"{migration.VERSION}  {state}  {migration.DESCRIPTION}")
+else:
+    applied = run_migrations(target=args.target)
+    print(f"[OK] {len(applied)} migraciones aplicadas" if applied else "[INFO] El esquema está al día")
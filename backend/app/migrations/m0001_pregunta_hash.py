@@ -0,0 +1,14 @@
+"""
+0001: columna pregunta_hash (hash de la pregunta), calculada en los registros existentes.
+La lógica (backfill por lotes) está en app/migrate_add_pregunta_hash.py. Hasta la 0010
+esta migración también creaba el índice único (test_id, pregunta_hash), que borra la 0010.
+"""
+from app.migrate_add_pregunta_hash import migrate
+
+VERSION = "0001"
+DESCRIPTION = "columna pregunta_hash"
+TRANSACTIONAL = False  # Hace commit por lote durante el backfill
+
+
+def upgrade(connection):
+    migrate()
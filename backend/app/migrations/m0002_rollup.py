@@ -0,0 +1,14 @@
+"""
+0002: carga inicial de test_results_rollup a partir de los resultados existentes.
+
+La carga la hace rebuild_rollup después de la última migración (ver REBUILDS en
+app/migrations/__init__.py): el rebuild lee columnas que agregan migraciones posteriores.
+"""
+VERSION = "0002"
+DESCRIPTION = "carga inicial de test_results_rollup"
+TRANSACTIONAL = True
+REBUILDS = ["rollup"]
+
+
+def upgrade(connection):
+    pass
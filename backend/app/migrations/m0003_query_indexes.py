@@ -0,0 +1,69 @@
+"""
+0003: índices compuestos con la forma de las consultas de la API.
+
+- ix_test_results_ts_id: listado sin filtros ordenado por (timestamp, id) y rangos de
+  tiempo de trends/recent; cubre test_type, environment, resultado_final y tiempo_segundos.
+- ix_test_results_type_env_ts: filtro por test_type[, environment] ordenado por timestamp.
+- ix_test_results_type_env_result_ts: lo mismo con resultado_final exacto (PASS).
+- ix_test_results_not_pass_ts: parcial, solo filas que no son PASS (filtro FAIL).
+
+Reemplazan a los índices simples de timestamp y test_type, que quedan cubiertos.
+PostgreSQL usa INCLUDE para las columnas cubiertas y CONCURRENTLY para no bloquear la
+ingesta; SQLite no tiene INCLUDE, así que esas columnas van al final de la clave.
+"""
+from sqlalchemy import text
+
+VERSION = "0003"
+DESCRIPTION = "índices compuestos, cubrientes y parcial (no PASS) para las consultas de la API"
+TRANSACTIONAL = False  # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+
+POSTGRESQL_INDEXES = {
+    "ix_test_results_ts_id":
+        'ON test_results ("timestamp", id) '
+        'INCLUDE (test_type, environment, resultado_final, tiempo_segundos)',
+    "ix_test_results_type_env_ts":
+        'ON test_results (test_type, environment, "timestamp", id) '
+        'INCLUDE (resultado_final, tiempo_segundos)',
+    "ix_test_results_type_env_result_ts":
+        'ON test_results (test_type, environment, resultado_final, "timestamp", id)',
+    "ix_test_results_not_pass_ts":
+        'ON test_results ("timestamp", id) WHERE resultado_final <> \'PASS\'',
+}
+
+SQLITE_INDEXES = {
+    "ix_test_results_ts_id":
+        'ON test_results ("timestamp", id, test_type, environment, resultado_final, tiempo_segundos)',
+    "ix_test_results_type_env_ts":
+        'ON test_results (test_type, environment, "timestamp", id, resultado_final, tiempo_segundos)',
+    "ix_test_results_type_env_result_ts":
+        'ON test_results (test_type, environment, resultado_final, "timestamp", id)',
+    "ix_test_results_not_pass_ts":
+        'ON test_results ("timestamp", id) WHERE resultado_final <> \'PASS\'',
+}
+
+REPLACED_INDEXES = ["ix_test_results_timestamp", "ix_test_results_test_type"]
+
+
+def upgrade(connection):
+    if connection.dialect.name == "postgresql":
+        # Un CREATE INDEX CONCURRENTLY interrumpido deja el índice inválido: se borra y se recrea
+        invalid = connection.execute(text("""
+            SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE NOT i.indisvalid AND c.relname = ANY(:names)
+        """), {"names": list(POSTGRESQL_INDEXES)}).scalars().all()
+        for name in invalid:
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+        for name, definition in POSTGRESQL_INDEXES.items():
+            print(f"[INFO] Creando índice {name}...", flush=True)
+            connection.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}"))
+        for name in REPLACED_INDEXES:
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        connection.execute(text("ANALYZE test_results"))
+    else:
+        for name, definition in SQLITE_INDEXES.items():
+            print(f"[INFO] Creando índice {name}...", flush=True)
+            connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} {definition}"))
+        for name in REPLACED_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        connection.execute(text("ANALYZE test_results"))
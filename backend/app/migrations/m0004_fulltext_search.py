@@ -0,0 +1,76 @@
+"""
+0004: búsqueda de texto completo sobre pregunta y respuesta_bot.
+
+- PostgreSQL: columna generada search_vector (tsvector con stemming en español; la
+  pregunta pesa más que la respuesta) e índice GIN. La mantiene la base en cada INSERT,
+  incluido el camino con COPY. Agregar la columna reescribe la tabla una sola vez.
+- SQLite: tabla FTS5 test_results_fts con contenido externo (no duplica el texto),
+  sincronizada con triggers. FTS5 no tiene stemming en español: se normalizan acentos
+  y la búsqueda usa prefijos (ver search_test_results).
+"""
+from sqlalchemy import text
+
+VERSION = "0004"
+DESCRIPTION = "búsqueda de texto completo (tsvector + GIN en PostgreSQL, FTS5 en SQLite)"
+TRANSACTIONAL = False  # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+
+POSTGRESQL_STATEMENTS = [
+    """
+    ALTER TABLE test_results ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish'::regconfig, coalesce(pregunta, '')), 'A') ||
+        setweight(to_tsvector('spanish'::regconfig, coalesce(respuesta_bot, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_test_results_search_vector "
+    "ON test_results USING GIN (search_vector)",
+]
+
+SQLITE_STATEMENTS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS test_results_fts USING fts5(
+        pregunta, respuesta_bot,
+        content='test_results', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS test_results_fts_ai AFTER INSERT ON test_results BEGIN
+        INSERT INTO test_results_fts (rowid, pregunta, respuesta_bot)
+        VALUES (new.id, new.pregunta, new.respuesta_bot);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS test_results_fts_ad AFTER DELETE ON test_results BEGIN
+        INSERT INTO test_results_fts (test_results_fts, rowid, pregunta, respuesta_bot)
+        VALUES ('delete', old.id, old.pregunta, old.respuesta_bot);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS test_results_fts_au AFTER UPDATE OF pregunta, respuesta_bot ON test_results BEGIN
+        INSERT INTO test_results_fts (test_results_fts, rowid, pregunta, respuesta_bot)
+        VALUES ('delete', old.id, old.pregunta, old.respuesta_bot);
+        INSERT INTO test_results_fts (rowid, pregunta, respuesta_bot)
+        VALUES (new.id, new.pregunta, new.respuesta_bot);
+    END
+    """,
+    # Indexar las filas que ya existían
+    "INSERT INTO test_results_fts (test_results_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade(connection):
+    if connection.dialect.name == "postgresql":
+        # Un CREATE INDEX CONCURRENTLY interrumpido deja el índice inválido: se borra y se recrea
+        invalid = connection.execute(text("""
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE NOT i.indisvalid AND c.relname = 'ix_test_results_search_vector'
+        """)).first()
+        if invalid:
+            connection.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_test_results_search_vector"))
+        print("[INFO] Calculando search_vector e índice GIN (puede tardar en tablas grandes)...", flush=True)
+        for statement in POSTGRESQL_STATEMENTS:
+            connection.execute(text(statement))
+    else:
+        for statement in SQLITE_STATEMENTS:
+            connection.execute(text(statement))
@@ -0,0 +1,14 @@
+"""
+0005: carga inicial de test_results_latency_sketch (percentiles de tiempo_segundos).
+
+La carga la hace rebuild_rollup (que arma también el sketch) después de la última
+migración, igual que en 0002.
+"""
+VERSION = "0005"
+DESCRIPTION = "carga inicial de test_results_latency_sketch"
+TRANSACTIONAL = True
+REBUILDS = ["rollup"]
+
+
+def upgrade(connection):
+    pass
@@ -0,0 +1,13 @@
+"""
+0006: carga inicial de question_history a partir de los resultados existentes.
+
+La carga la hace rebuild_question_history después de la última migración, igual que en 0002.
+"""
+VERSION = "0006"
+DESCRIPTION = "carga inicial de question_history (flakiness por pregunta)"
+TRANSACTIONAL = True
+REBUILDS = ["question_history"]
+
+
+def upgrade(connection):
+    pass
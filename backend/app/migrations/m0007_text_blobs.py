@@ -0,0 +1,122 @@
+"""
+0007: textos repetidos (respuesta_bot, palabras_clave, palabras_encontradas) a text_blobs.
+
+Las filas existentes pasan sus textos a text_blobs por bloques (backfill_text_blobs) y
+las columnas viejas quedan en NULL. La búsqueda de texto completo deja de leer
+respuesta_bot de test_results:
+
+- PostgreSQL: search_vector pasa de columna generada a columna normal que mantiene un
+  trigger, leyendo la respuesta desde text_blobs (una columna generada no puede leer
+  otra tabla). DROP EXPRESSION conserva los valores ya calculados, así que el backfill
+  no recalcula ningún tsvector. En PostgreSQL el espacio de los textos viejos se
+  reutiliza después del VACUUM (autovacuum); VACUUM FULL lo devuelve al sistema.
+- SQLite: la tabla FTS5 pasa a usar como contenido la vista test_results_search, que
+  une test_results con text_blobs; los triggers leen la respuesta de text_blobs.
+"""
+from sqlalchemy import text, inspect
+
+from app.models import TextBlob
+from app.text_store import TEXT_FIELDS, backfill_text_blobs, storage_report, print_storage_report
+
+VERSION = "0007"
+DESCRIPTION = "textos repetidos de test_results guardados una vez en text_blobs"
+TRANSACTIONAL = False  # El backfill confirma por bloques
+
+# Respuesta de una fila: desde text_blobs o, si todavía no se migró, la columna vieja
+_POSTGRESQL_ANSWER = "coalesce((SELECT content FROM text_blobs WHERE hash = NEW.respuesta_bot_hash), NEW.respuesta_bot, '')"
+
+POSTGRESQL_TRIGGER = [
+    f"""
+    CREATE OR REPLACE FUNCTION test_results_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('spanish'::regconfig, coalesce(NEW.pregunta, '')), 'A') ||
+            setweight(to_tsvector('spanish'::regconfig, {_POSTGRESQL_ANSWER}), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS test_results_search_vector ON test_results",
+    """
+    CREATE TRIGGER test_results_search_vector
+    BEFORE INSERT OR UPDATE OF pregunta, respuesta_bot_hash ON test_results
+    FOR EACH ROW EXECUTE FUNCTION test_results_search_vector()
+    """,
+]
+
+SQLITE_DROP_FTS = [
+    "DROP TRIGGER IF EXISTS test_results_fts_ai",
+    "DROP TRIGGER IF EXISTS test_results_fts_ad",
+    "DROP TRIGGER IF EXISTS test_results_fts_au",
+    "DROP TABLE IF EXISTS test_results_fts",
+]
+
+
+def _sqlite_answer(row: str) -> str:
+    return f"coalesce((SELECT content FROM text_blobs WHERE hash = {row}.respuesta_bot_hash), {row}.respuesta_bot)"
+
+
+SQLITE_CREATE_FTS = [
+    """
+    CREATE VIEW IF NOT EXISTS test_results_search AS
+    SELECT r.id AS id, r.pregunta AS pregunta, coalesce(b.content, r.respuesta_bot) AS respuesta_bot
+    FROM test_results r LEFT JOIN text_blobs b ON b.hash = r.respuesta_bot_hash
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS test_results_fts USING fts5(
+        pregunta, respuesta_bot,
+        content='test_results_search', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS test_results_fts_ai AFTER INSERT ON test_results BEGIN
+        INSERT INTO test_results_fts (rowid, pregunta, respuesta_bot)
+        VALUES (new.id, new.pregunta, {_sqlite_answer("new")});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS test_results_fts_ad AFTER DELETE ON test_results BEGIN
+        INSERT INTO test_results_fts (test_results_fts, rowid, pregunta, respuesta_bot)
+        VALUES ('delete', old.id, old.pregunta, {_sqlite_answer("old")});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS test_results_fts_au
+    AFTER UPDATE OF pregunta, respuesta_bot, respuesta_bot_hash ON test_results BEGIN
+        INSERT INTO test_results_fts (test_results_fts, rowid, pregunta, respuesta_bot)
+        VALUES ('delete', old.id, old.pregunta, {_sqlite_answer("old")});
+        INSERT INTO test_results_fts (rowid, pregunta, respuesta_bot)
+        VALUES (new.id, new.pregunta, {_sqlite_answer("new")});
+    END
+    """,
+    "INSERT INTO test_results_fts (test_results_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade(connection):
+    # create_all crea text_blobs pero no agrega columnas a una test_results existente
+    TextBlob.__table__.create(bind=connection, checkfirst=True)
+    columns = [column["name"] for column in inspect(connection).get_columns("test_results")]
+    for hash_column in TEXT_FIELDS.values():
+        if hash_column not in columns:
+            connection.execute(text(f"ALTER TABLE test_results ADD COLUMN {hash_column} VARCHAR(64)"))
+
+    if connection.dialect.name == "postgresql":
+        generated = connection.execute(text("""
+            SELECT attgenerated FROM pg_attribute
+            WHERE attrelid = 'test_results'::regclass AND attname = 'search_vector'
+        """)).scalar()
+        if generated == "s":
+            connection.execute(text("ALTER TABLE test_results ALTER COLUMN search_vector DROP EXPRESSION"))
+        backfill_text_blobs()
+        for statement in POSTGRESQL_TRIGGER:
+            connection.execute(text(statement))
+    else:
+        # Sin los triggers viejos el backfill no reindexa fila por fila; el índice se arma al final
+        for statement in SQLITE_DROP_FTS:
+            connection.execute(text(statement))
+        backfill_text_blobs()
+        for statement in SQLITE_CREATE_FTS:
+            connection.execute(text(statement))
+    print_storage_report(storage_report())
@@ -0,0 +1,94 @@
+"""
+0008: dimensiones y resultado de test_results como enteros (ver app/dimensions.py).
+
+Agrega passed, fail_reason_id, test_type_id, environment_id, categoria_id y
+sheet_name_id, pasa los valores de las filas existentes a las tablas dim_* por rangos
+de id (backfill_dimensions) y deja en NULL las columnas de texto viejas.
+
+Los índices de la migración 0003 (y los simples de resultado_final y environment)
+quedan sobre columnas vacías: se borran antes del backfill, para que el UPDATE no los
+mantenga, y se recrean con la misma forma sobre los enteros. El parcial de filas no PASS
+pasa a ser WHERE NOT passed.
+
+El rollup, el sketch de latencia y question_history se recalculan desde los ids: se
+piden sus rebuilds (REBUILDS), que corren después de la última migración.
+"""
+from sqlalchemy import text, inspect
+
+from app.models import Base, TestResult
+from app.dimensions import DIMENSIONS, backfill_dimensions
+
+VERSION = "0008"
+DESCRIPTION = "dimensiones de test_results en tablas dim_* y passed/fail_reason_id"
+TRANSACTIONAL = False  # El backfill confirma por bloques y los índices usan CONCURRENTLY
+REBUILDS = ["rollup", "question_history"]
+
+NEW_COLUMNS = {
+    "passed": "BOOLEAN",
+    "fail_reason_id": "SMALLINT",
+    "test_type_id": "SMALLINT",
+    "environment_id": "SMALLINT",
+    "categoria_id": "INTEGER",
+    "sheet_name_id": "INTEGER",
+}
+
+REPLACED_INDEXES = [
+    "ix_test_results_ts_id",
+    "ix_test_results_type_env_ts",
+    "ix_test_results_type_env_result_ts",
+    "ix_test_results_not_pass_ts",
+    "ix_test_results_resultado_final",
+    "ix_test_results_environment",
+]
+
+POSTGRESQL_INDEXES = {
+    "ix_test_results_ts_dims":
+        'ON test_results ("timestamp", id) '
+        'INCLUDE (test_type_id, environment_id, passed, tiempo_segundos)',
+    "ix_test_results_type_env_ids_ts":
+        'ON test_results (test_type_id, environment_id, "timestamp", id) '
+        'INCLUDE (passed, tiempo_segundos)',
+    "ix_test_results_type_env_passed_ts":
+        'ON test_results (test_type_id, environment_id, passed, "timestamp", id)',
+    "ix_test_results_failed_ts":
+        'ON test_results ("timestamp", id) WHERE NOT passed',
+}
+
+SQLITE_INDEXES = {
+    "ix_test_results_ts_dims":
+        'ON test_results ("timestamp", id, test_type_id, environment_id, passed, tiempo_segundos)',
+    "ix_test_results_type_env_ids_ts":
+        'ON test_results (test_type_id, environment_id, "timestamp", id, passed, tiempo_segundos)',
+    "ix_test_results_type_env_passed_ts":
+        'ON test_results (test_type_id, environment_id, passed, "timestamp", id)',
+    "ix_test_results_failed_ts":
+        'ON test_results ("timestamp", id) WHERE passed = 0',
+}
+
+
+def upgrade(connection):
+    postgresql = connection.dialect.name == "postgresql"
+    Base.metadata.create_all(bind=connection, tables=[model.__table__ for model in DIMENSIONS.values()])
+    columns = [column["name"] for column in inspect(connection).get_columns(TestResult.__tablename__)]
+    for name, column_type in NEW_COLUMNS.items():
+        if name not in columns:
+            connection.execute(text(f"ALTER TABLE test_results ADD COLUMN {name} {column_type}"))
+
+    concurrently = "CONCURRENTLY " if postgresql else ""
+    for name in REPLACED_INDEXES:
+        connection.execute(text(f"DROP INDEX {concurrently}IF EXISTS {name}"))
+
+    backfill_dimensions()
+
+    if postgresql:
+        # Un CREATE INDEX CONCURRENTLY interrumpido deja el índice inválido: se borra y se recrea
+        invalid = connection.execute(text("""
+            SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE NOT i.indisvalid AND c.relname = ANY(:names)
+        """), {"names": list(POSTGRESQL_INDEXES)}).scalars().all()
+        for name in invalid:
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    for name, definition in (POSTGRESQL_INDEXES if postgresql else SQLITE_INDEXES).items():
+        print(f"[INFO] Creando índice {name}...", flush=True)
+        connection.execute(text(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} {definition}"))
+    connection.execute(text("ANALYZE test_results"))
@@ -0,0 +1,28 @@
+"""
+0009: test_results_rollup, test_results_latency_sketch y question_history con clave por ids.
+
+Las tres tablas guardaban y agrupaban los nombres de test_type, environment, categoria
+(y resultado_final como 'PASS'/'FAIL'); ahora usan test_type_id, environment_id,
+categoria_id y passed, igual que test_results, y los nombres se traducen al responder.
+Son tablas derivadas: si todavía tienen las columnas de texto se borran, y el rebuild
+(REBUILDS) las vuelve a crear y las llena desde test_results.
+"""
+from sqlalchemy import text, inspect
+
+VERSION = "0009"
+DESCRIPTION = "rollup, sketch de latencia y question_history agrupados por ids de dimensión"
+TRANSACTIONAL = True
+REBUILDS = ["rollup", "question_history"]
+
+TABLES = ["test_results_rollup", "test_results_latency_sketch", "question_history"]
+
+
+def upgrade(connection):
+    inspector = inspect(connection)
+    for table in TABLES:
+        if not inspector.has_table(table):
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        if "test_type" in columns:
+            print(f"[INFO] Borrando {table} con claves de texto (se reconstruye por ids)", flush=True)
+            connection.execute(text(f"DROP TABLE {table}"))
@@ -0,0 +1,41 @@
+"""
+0010: run_id en test_results y clave de idempotencia por ejecución.
+
+El índice único (test_id, pregunta_hash) de la 0001 tomaba como reintento cualquier
+resultado con el mismo test_id y pregunta, pero test_id es el número de la pregunta en
+la planilla (columna ID): la segunda ejecución de una pregunta, o la misma pregunta en
+otro environment, se descartaba como duplicado. La clave pasa a ser
+(run_id, test_type_id, environment_id, test_id, pregunta_hash). Los resultados
+históricos quedan con run_id NULL, que nunca choca con otro.
+"""
+from sqlalchemy import text, inspect
+
+VERSION = "0010"
+DESCRIPTION = "run_id e índice único por (run_id, test_type, environment, test_id, pregunta)"
+TRANSACTIONAL = False  # Los índices usan CONCURRENTLY en PostgreSQL
+
+OLD_INDEX = "uq_test_results_test_id_pregunta_hash"
+NEW_INDEX = "uq_test_results_run_question"
+NEW_INDEX_COLUMNS = "(run_id, test_type_id, environment_id, test_id, pregunta_hash)"
+
+
+def upgrade(connection):
+    postgresql = connection.dialect.name == "postgresql"
+    concurrently = "CONCURRENTLY " if postgresql else ""
+    columns = [column["name"] for column in inspect(connection).get_columns("test_results")]
+    if "run_id" not in columns:
+        connection.execute(text("ALTER TABLE test_results ADD COLUMN run_id VARCHAR(100)"))
+
+    if postgresql:
+        # Un CREATE INDEX CONCURRENTLY interrumpido deja el índice inválido: se borra y se recrea
+        invalid = connection.execute(text("""
+            SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE NOT i.indisvalid AND c.relname = :name
+        """), {"name": NEW_INDEX}).scalars().all()
+        for name in invalid:
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    print(f"[INFO] Creando índice {NEW_INDEX}...", flush=True)
+    connection.execute(text(
+        f"CREATE UNIQUE INDEX {concurrently}IF NOT EXISTS {NEW_INDEX} ON test_results {NEW_INDEX_COLUMNS}"
+    ))
+    connection.execute(text(f"DROP INDEX {concurrently}IF EXISTS {OLD_INDEX}"))
@@ -0,0 +1,30 @@
+"""
+0011: índice (run_id, pregunta_hash) para comparar ejecuciones (/api/runs/{a}/diff/{b}).
+
+El diff une las dos ejecuciones por pregunta_hash y las recorre en ese orden; el índice
+único de la 0010 empieza por run_id pero sigue por test_type_id, environment_id y test_id.
+"""
+from sqlalchemy import text
+
+VERSION = "0011"
+DESCRIPTION = "índice (run_id, pregunta_hash) para el diff entre ejecuciones"
+TRANSACTIONAL = False  # CREATE INDEX CONCURRENTLY en PostgreSQL
+
+INDEX = "ix_test_results_run_pregunta"
+
+
+def upgrade(connection):
+    postgresql = connection.dialect.name == "postgresql"
+    concurrently = "CONCURRENTLY " if postgresql else ""
+    if postgresql:
+        # Un CREATE INDEX CONCURRENTLY interrumpido deja el índice inválido: se borra y se recrea
+        invalid = connection.execute(text("""
+            SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE NOT i.indisvalid AND c.relname = :name
+        """), {"name": INDEX}).scalars().all()
+        for name in invalid:
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    print(f"[INFO] Creando índice {INDEX}...", flush=True)
+    connection.execute(text(
+        f"CREATE INDEX {concurrently}IF NOT EXISTS {INDEX} ON test_results (run_id, pregunta_hash)"
+    ))
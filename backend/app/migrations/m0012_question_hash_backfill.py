@@ -0,0 +1,19 @@
+"""
+0012: pregunta_hash en todos los resultados y question_history recalculado desde ellos.
+
+Hasta la 0010 el índice único (test_id, pregunta_hash) obligaba a dejar pregunta_hash en
+NULL en los resultados históricos que repetían test_id y pregunta, es decir, en cada
+ejecución después de la primera: el historial por pregunta las salteaba y quedaba con una
+sola ejecución. Se completa el hash en esas filas (app/migrate_add_pregunta_hash.py) y se
+pide el rebuild de question_history.
+"""
+from app.migrate_add_pregunta_hash import migrate
+
+VERSION = "0012"
+DESCRIPTION = "pregunta_hash en los resultados históricos y rebuild de question_history"
+TRANSACTIONAL = False  # Hace commit por lote durante el backfill
+REBUILDS = ["question_history"]
+
+
+def upgrade(connection):
+    migrate()
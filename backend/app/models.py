@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, Float, DateTime
+from sqlalchemy import Column, Integer, SmallInteger, BigInteger, String, Text, Boolean, Float, DateTime, Date, Index
 from sqlalchemy.orm import declarative_base
 from datetime import datetime
 
@@ -9,19 +9,144 @@ class TestResult(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     test_id = Column(String(50), index=True)
-    categoria = Column(String(100))
     pregunta = Column(Text)
+    # Legado: desde la migración 0007 estos textos se guardan una sola vez en text_blobs y
+    # las filas apuntan a ellos por hash (ver app/text_store.py); aquí quedan en NULL
     palabras_clave = Column(Text)
     respuesta_bot = Column(Text)
     validacion_correcta = Column(Boolean, default=False)
     palabras_encontradas = Column(Text)
-    resultado_final = Column(String(50), index=True)  # 'PASS', 'FAIL', 'FAIL (JSON)', etc.
+    palabras_clave_hash = Column(String(64), nullable=True)
+    respuesta_bot_hash = Column(String(64), nullable=True)
+    palabras_encontradas_hash = Column(String(64), nullable=True)
     tiempo_segundos = Column(Float)
-    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    timestamp = Column(DateTime, default=datetime.utcnow)
     error = Column(Text, nullable=True)
-    test_type = Column(String(50), index=True)  # 'automotor', 'inmobiliario', 'embarcaciones'
-    environment = Column(String(20), index=True)  # 'test', 'preprod', 'localhost'
-    sheet_name = Column(String(200), nullable=True)  # Nombre de la hoja de Google Sheets
+    pregunta_hash = Column(String(64), nullable=True)  # sha256 de la pregunta (espacios normalizados)
+    run_id = Column(String(100), nullable=True)  # Ejecución que envió el resultado; NULL en los históricos
+    # Resultado: passed (resultado_final == 'PASS') y, si falló, el texto exacto del fallo en dim_fail_reason
+    passed = Column(Boolean, nullable=True)  # NULL si el resultado no tenía resultado_final
+    fail_reason_id = Column(SmallInteger, nullable=True)
+    # Dimensiones repetidas, como id de su tabla dim_* (ver app/dimensions.py)
+    test_type_id = Column(SmallInteger, nullable=True)  # 'automotor', 'inmobiliario', 'embarcaciones'
+    environment_id = Column(SmallInteger, nullable=True)  # 'test', 'preprod', 'localhost'
+    categoria_id = Column(Integer, nullable=True)
+    sheet_name_id = Column(Integer, nullable=True)  # Hoja de Google Sheets
+    # Legado: desde la migración 0008 estos valores están en las columnas de arriba; aquí quedan en NULL
+    categoria = Column(String(100))
+    resultado_final = Column(String(50))
+    test_type = Column(String(50))
+    environment = Column(String(20))
+    sheet_name = Column(String(200), nullable=True)
+    
+    # Los índices compuestos por (test_type_id, environment_id, timestamp) y el parcial de
+    # filas que no pasaron los crea la migración 0008 (app/migrations/m0008_dimensions.py)
+    __table_args__ = (
+        # Clave de idempotencia: reintentar un envío no duplica resultados (ver IDEMPOTENCY_KEY_COLUMNS
+        # en app/db_models.py). También sirve para leer una ejecución (run_id, ...)
+        Index(
+            "uq_test_results_run_question",
+            "run_id", "test_type_id", "environment_id", "test_id", "pregunta_hash",
+            unique=True
+        ),
+        # Resultados de una ejecución en orden de pregunta: diff entre ejecuciones (iter_run_diff)
+        Index("ix_test_results_run_pregunta", "run_id", "pregunta_hash"),
+    )
+
+class TextBlob(Base):
+    """Texto repetido entre resultados (respuesta del bot, palabras clave), guardado una vez por contenido"""
+    __tablename__ = "text_blobs"
+    
+    hash = Column(String(64), primary_key=True)  # sha256 del texto exacto
+    content = Column(Text, nullable=False)
+
+class DimTestType(Base):
+    """Valores distintos de test_type (test_results.test_type_id)"""
+    __tablename__ = "dim_test_type"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), nullable=False, unique=True)
+
+class DimEnvironment(Base):
+    """Valores distintos de environment (test_results.environment_id)"""
+    __tablename__ = "dim_environment"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(20), nullable=False, unique=True)
+
+class DimCategoria(Base):
+    """Valores distintos de categoria (test_results.categoria_id)"""
+    __tablename__ = "dim_categoria"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False, unique=True)
+
+class DimSheetName(Base):
+    """Valores distintos de sheet_name (test_results.sheet_name_id)"""
+    __tablename__ = "dim_sheet_name"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(200), nullable=False, unique=True)
+
+class DimFailReason(Base):
+    """resultado_final de los fallos: 'FAIL', 'FAIL (JSON)', 'FAIL (TIMEOUT)', ... (test_results.fail_reason_id)"""
+    __tablename__ = "dim_fail_reason"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), nullable=False, unique=True)
+
+class ResultRollup(Base):
+    """Agregado diario de test_results; se actualiza en la misma transacción que la ingesta"""
+    __tablename__ = "test_results_rollup"
+    
+    # Ids de las tablas dim_*; los NULL de test_results se guardan como 0 (no se admiten
+    # NULL en la clave primaria y los ids de dim_* empiezan en 1)
+    day = Column(Date, primary_key=True)
+    test_type_id = Column(SmallInteger, primary_key=True)
+    environment_id = Column(SmallInteger, primary_key=True)
+    passed = Column(Boolean, primary_key=True)  # Todos los tipos de FAIL cuentan como False
+    categoria_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    sum_tiempo = Column(Float, nullable=False, default=0.0)
+    sum_tiempo_sq = Column(Float, nullable=False, default=0.0)  # Para calcular la varianza
+
+class LatencySketch(Base):
+    """
+    Histograma de tiempo_segundos por clave del rollup, en buckets logarítmicos (DDSketch):
+    se combina sumando count, igual que el rollup, y de ahí se calculan los percentiles
+    """
+    __tablename__ = "test_results_latency_sketch"
+    
+    day = Column(Date, primary_key=True)
+    test_type_id = Column(SmallInteger, primary_key=True)
+    environment_id = Column(SmallInteger, primary_key=True)
+    passed = Column(Boolean, primary_key=True)
+    categoria_id = Column(Integer, primary_key=True)
+    bucket = Column(Integer, primary_key=True)  # Índice del bucket (ver app/rollup.py)
+    count = Column(Integer, nullable=False, default=0)
+
+class QuestionHistory(Base):
+    """Historial de resultados por pregunta, test_type y environment (ver app/flakiness.py)"""
+    __tablename__ = "question_history"
+    
+    pregunta_hash = Column(String(64), primary_key=True)
+    test_type_id = Column(SmallInteger, primary_key=True)  # 0 si el resultado no tenía test_type
+    environment_id = Column(SmallInteger, primary_key=True)
+    pregunta = Column(Text)  # Texto de la última ejecución, para mostrar
+    categoria_id = Column(Integer)
+    run_count = Column(Integer, nullable=False, default=0)
+    fail_count = Column(Integer, nullable=False, default=0)
+    flip_count = Column(Integer, nullable=False, default=0)  # Cambios PASS <-> FAIL entre ejecuciones
+    last_outcomes = Column(BigInteger, nullable=False, default=0)  # Bit 0 = última ejecución, 1 = FAIL
+    last_result = Column(String(4))
+    last_test_id = Column(String(50))
+    last_timestamp = Column(DateTime)
+    latency_ewma = Column(Float)
+    flakiness = Column(Float, nullable=False, default=0.0)  # Cambios / pares consecutivos en la ventana
+    
+    __table_args__ = (
+        Index("ix_question_history_flakiness", "flakiness"),
+    )
 
 class TestExecution(Base):
     __tablename__ = "test_executions"
@@ -0,0 +1,258 @@
+"""
+Caché en proceso para las consultas de lectura de db_models.
+
+Cada entrada se guarda con la generación vigente al momento de calcularla. La ingesta
+llama a bump_generation() al confirmar filas nuevas, con lo que todas las entradas
+anteriores quedan obsoletas sin tener que recorrerlas. Además cada entrada vence a los
+QUERY_CACHE_TTL segundos (consultas relativas a "ahora", como las últimas 24 horas) y
+la caché no guarda más de QUERY_CACHE_MAX_ENTRIES entradas (LRU).
+
+Con QUERY_CACHE_REDIS_URL el contador de generación vive en Redis, así una escritura
+en un worker de uvicorn invalida la caché de todos. Los valores siguen siendo locales.
+Las consultas async (db_async) leen la generación con redis.asyncio, con un cliente por
+event loop, para no bloquear el loop; las escrituras y las consultas sync, que corren en
+hilos, usan el cliente sync.
+
+Dentro de data_version_scope(version) la versión de los datos forma parte de la clave,
+de modo que una respuesta con ETag nunca se arma con una entrada calculada sobre datos
+anteriores a esa versión (por ejemplo, escrituras hechas por otro worker sin Redis).
+
+Los valores cacheados se comparten entre requests: quien los recibe no debe modificarlos.
+"""
+import asyncio
+import contextvars
+import inspect
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.log_config import get_logger
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - redis es opcional
+    redis_asyncio = None
+
+logger = get_logger(__name__)
+
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "30"))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "256"))
+QUERY_CACHE_REDIS_URL = os.getenv("QUERY_CACHE_REDIS_URL", "")
+
+_REDIS_GENERATION_KEY = "query_cache:generation"
+
+_data_version: contextvars.ContextVar = contextvars.ContextVar("data_version", default=None)
+
+
+class QueryCache:
+    """LRU con TTL cuyas entradas se invalidan por generación"""
+
+    def __init__(self, ttl: float = QUERY_CACHE_TTL, max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+                 redis_url: str = QUERY_CACHE_REDIS_URL):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._redis_url = redis_url
+        self._redis = self._connect_redis(redis_url) if redis_url else None
+        # Cliente redis.asyncio por event loop (sus conexiones no se pueden usar desde otro loop)
+        self._async_redis: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidated": 0}
+
+    @staticmethod
+    def _connect_redis(redis_url: str):
+        try:
+            import redis
+            client = redis.Redis.from_url(redis_url, socket_timeout=0.5)
+            client.ping()
+            logger.info("Caché de consultas: generación compartida en Redis")
+            return client
+        except Exception as e:
+            logger.warning(f"No se pudo usar Redis para la caché ({str(e)}), se usa generación local")
+            return None
+
+    def generation(self) -> int:
+        """Generación vigente; si Redis no responde se deja de cachear (-1) en lugar de servir datos viejos"""
+        if self._redis is None:
+            return self._generation
+        try:
+            return int(self._redis.get(_REDIS_GENERATION_KEY) or 0)
+        except Exception:
+            return -1
+
+    def _async_client(self):
+        """Cliente redis.asyncio del event loop en curso, o None si no hay redis.asyncio"""
+        if redis_asyncio is None:
+            return None
+        loop = asyncio.get_running_loop()
+        client = self._async_redis.get(loop)
+        if client is None:
+            client = self._async_redis[loop] = redis_asyncio.Redis.from_url(self._redis_url, socket_timeout=0.5)
+        return client
+
+    async def generation_async(self) -> int:
+        """generation() sin bloquear el event loop"""
+        if self._redis is None:
+            return self._generation
+        client = self._async_client()
+        if client is None:
+            return -1
+        try:
+            return int(await client.get(_REDIS_GENERATION_KEY) or 0)
+        except Exception:
+            return -1
+
+    def bump_generation(self):
+        """Invalidar todas las entradas (llamar después de confirmar una escritura)"""
+        with self._lock:
+            self._generation += 1
+        if self._redis is not None:
+            try:
+                self._redis.incr(_REDIS_GENERATION_KEY)
+            except Exception as e:
+                logger.warning(f"No se pudo incrementar la generación en Redis: {str(e)}")
+
+    def lookup(self, key: tuple) -> Tuple[bool, Any, int]:
+        """(encontrado, valor, generación con la que guardar el valor si hay que calcularlo)"""
+        return self._lookup(key, self.generation())
+
+    async def lookup_async(self, key: tuple) -> Tuple[bool, Any, int]:
+        """lookup() desde el event loop"""
+        return self._lookup(key, await self.generation_async())
+
+    def _lookup(self, key: tuple, generation: int) -> Tuple[bool, Any, int]:
+        if generation < 0:
+            return False, None, generation
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_generation, expires_at, value = entry
+                if entry_generation == generation and expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return True, value, generation
+                del self._entries[key]
+                self._counters["invalidated" if entry_generation != generation else "expired"] += 1
+            self._counters["misses"] += 1
+        return False, None, generation
+
+    def store(self, key: tuple, generation: int, value: Any):
+        if generation < 0:
+            return
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def get_or_compute(self, key: tuple, compute: Callable[[], Any]) -> Any:
+        found, value, generation = self.lookup(key)
+        if found:
+            return value
+        value = compute()
+        self.store(key, generation, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["generation"] = self.generation()
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl
+        stats["backend"] = "redis" if self._redis is not None else "local"
+        stats["enabled"] = QUERY_CACHE_ENABLED
+        return stats
+
+
+_query_cache: Optional[QueryCache] = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryCache:
+    """Instancia única de la caché del proceso"""
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = QueryCache()
+    return _query_cache
+
+
+def bump_generation():
+    """Invalidar la caché de consultas tras una escritura confirmada"""
+    if QUERY_CACHE_ENABLED:
+        get_query_cache().bump_generation()
+
+
+@contextmanager
+def data_version_scope(version: str):
+    """Incluir `version` en la clave de las consultas cacheadas dentro del bloque"""
+    token = _data_version.set(version)
+    try:
+        yield
+    finally:
+        _data_version.reset(token)
+
+
+def _freeze(value: Any) -> Any:
+    """Convertir listas en tuplas para que el valor sirva como clave"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def cached_query(func: Callable) -> Callable:
+    """
+    Cachear una función de consulta; la clave son su nombre y sus argumentos normalizados
+    (con defaults). Acepta funciones async: la versión de app/db_async.py de una consulta
+    tiene el mismo nombre y argumentos que la de db_models y comparte sus entradas.
+    """
+    signature = inspect.signature(func)
+
+    def cache_key(args, kwargs) -> tuple:
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return (func.__name__, _data_version.get()) + tuple(
+            (name, _freeze(value)) for name, value in bound.arguments.items()
+        )
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not QUERY_CACHE_ENABLED:
+                return await func(*args, **kwargs)
+            key = cache_key(args, kwargs)
+            cache = get_query_cache()
+            found, value, generation = await cache.lookup_async(key)
+            if found:
+                return value
+            value = await func(*args, **kwargs)
+            cache.store(key, generation, value)
+            return value
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not QUERY_CACHE_ENABLED:
+            return func(*args, **kwargs)
+        return get_query_cache().get_or_compute(cache_key(args, kwargs), lambda: func(*args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,360 @@
+"""
+Retención de test_results con archivo en frío en Parquet.
+
+Los resultados con más de RETENTION_DAYS días se mueven a archivos Parquet comprimidos
+(zstd) particionados por día en ARCHIVE_DIR:
+
+    ARCHIVE_DIR/test_results/day=YYYY-MM-DD/part-<primer id>.parquet
+
+archive_old_results() trabaja en bloques de RETENTION_CHUNK_ROWS filas: escribe el bloque
+en disco y después, en una transacción corta, lo borra de test_results y lo descuenta del
+rollup. La ingesta no espera más que un bloque (solo se tocan filas y claves del rollup
+de días viejos). Si el proceso se corta entre escribir y borrar, la siguiente corrida
+vuelve a leer las mismas filas y reescribe el mismo archivo.
+
+Las estadísticas y el resumen (rollup) reflejan solo los datos en caliente; la exportación
+y las tendencias pueden incluir el archivo con include_archive.
+
+Requiere pyarrow. Uso (desde backend/):
+    python -m app.retention archive [--days 90] [--dry-run]
+    python -m app.retention status
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta, date
+from typing import Optional, List, Dict, Any, Iterator
+
+from sqlalchemy import func
+
+from app.database import SessionLocal, engine
+from app.models import TestResult
+from app.db_models import RESULT_FIELDS, TREND_BUCKETS, _utc_naive
+from app.rollup import update_rollup, ROLLUP_SOURCE_COLUMNS
+from app.dimensions import decode_result
+from app.query_cache import cached_query, bump_generation
+from app.log_config import get_logger
+
+logger = get_logger(__name__)
+
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "90"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+RETENTION_CHUNK_ROWS = int(os.getenv("RETENTION_CHUNK_ROWS", "5000"))
+# Pausa entre bloques para dejar pasar a la ingesta en bases muy cargadas
+RETENTION_PAUSE_MS = int(os.getenv("RETENTION_PAUSE_MS", "0"))
+
+# Clave del advisory lock de PostgreSQL: una sola corrida de archivado a la vez
+RETENTION_LOCK_ID = 7310014
+
+# Columnas que se guardan en el archivo: las de la API más la clave de idempotencia
+ARCHIVE_COLUMNS = list(RESULT_FIELDS) + ["pregunta_hash"]
+
+
+class ArchiveUnavailable(RuntimeError):
+    """pyarrow no está instalado"""
+
+
+def require_pyarrow():
+    """Importar pyarrow (con sus submódulos) o avisar que falta"""
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.dataset
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        raise ArchiveUnavailable("El archivo en Parquet requiere pyarrow (pip install pyarrow)")
+
+
+def _archive_schema():
+    pa = require_pyarrow()
+    types = {
+        "id": pa.int64(),
+        "validacion_correcta": pa.bool_(),
+        "tiempo_segundos": pa.float64(),
+        "timestamp": pa.timestamp("us"),
+    }
+    return pa.schema([(column, types.get(column, pa.string())) for column in ARCHIVE_COLUMNS])
+
+
+def _table_dir() -> str:
+    return os.path.join(ARCHIVE_DIR, "test_results")
+
+
+def _day_dirs(since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[tuple]:
+    """Particiones (día, ruta) que pueden tener filas en [since, until), de la más nueva a la más vieja"""
+    root = _table_dir()
+    if not os.path.isdir(root):
+        return []
+    days = []
+    for name in os.listdir(root):
+        if not name.startswith("day="):
+            continue
+        try:
+            day = date.fromisoformat(name[len("day="):])
+        except ValueError:
+            continue
+        if since is not None and day < _utc_naive(since).date():
+            continue
+        if until is not None and day > _utc_naive(until).date():
+            continue
+        days.append((day, os.path.join(root, name)))
+    return sorted(days, reverse=True)
+
+
+def _write_partition(day: date, rows: List[Dict[str, Any]]):
+    """Escribir las filas de un día en su partición (archivo temporal + rename: nunca queda a medias)"""
+    pa = require_pyarrow()
+    rows = [{column: row[column] for column in ARCHIVE_COLUMNS} for row in rows]
+    directory = os.path.join(_table_dir(), f"day={day.isoformat()}")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"part-{rows[0]['id']:012d}.parquet")
+    # Los nombres con '.' inicial los ignora el lector de datasets de pyarrow
+    tmp_path = os.path.join(directory, f".part-{rows[0]['id']:012d}.parquet.tmp")
+    table = pa.Table.from_pylist(rows, schema=_archive_schema())
+    pa.parquet.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def _select_chunk(db, cutoff: datetime) -> List[Dict[str, Any]]:
+    """
+    Próximo bloque de filas a archivar, en orden (timestamp, id) para usar ix_test_results_ts_id.
+    Cada fila trae ARCHIVE_COLUMNS más los ids con que se descuenta del rollup
+    """
+    rollup_columns = [column for column in ROLLUP_SOURCE_COLUMNS if column not in ARCHIVE_COLUMNS]
+    columns = [RESULT_FIELDS[field] for field in RESULT_FIELDS] + [TestResult.pregunta_hash]
+    columns += [getattr(TestResult, column) for column in rollup_columns]
+    rows = db.query(*columns)\
+        .filter(TestResult.timestamp < cutoff)\
+        .order_by(TestResult.timestamp, TestResult.id)\
+        .limit(RETENTION_CHUNK_ROWS)\
+        .all()
+    return [decode_result(dict(zip(ARCHIVE_COLUMNS + rollup_columns, row))) for row in rows]
+
+
+def archive_old_results(days: int = RETENTION_DAYS, dry_run: bool = False) -> int:
+    """Mover a Parquet los resultados con más de `days` días; retorna la cantidad archivada"""
+    require_pyarrow()
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    if dry_run:
+        db = SessionLocal()
+        try:
+            pending = db.query(func.count(TestResult.id)).filter(TestResult.timestamp < cutoff).scalar()
+        finally:
+            db.close()
+        logger.info(f"{pending} resultados anteriores a {cutoff.isoformat()} se archivarían")
+        return pending
+
+    lock_connection = None
+    if engine.dialect.name == "postgresql":
+        lock_connection = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        if not lock_connection.exec_driver_sql(f"SELECT pg_try_advisory_lock({RETENTION_LOCK_ID})").scalar():
+            lock_connection.close()
+            logger.warning("Ya hay un archivado en curso, se omite esta corrida")
+            return 0
+
+    archived = 0
+    try:
+        logger.info(f"Archivando resultados anteriores a {cutoff.isoformat()} en {_table_dir()}")
+        while True:
+            db = SessionLocal()
+            try:
+                rows = _select_chunk(db, cutoff)
+                db.rollback()  # No retener el snapshot de lectura mientras se escribe el archivo
+                if not rows:
+                    break
+
+                by_day: Dict[date, List[Dict[str, Any]]] = {}
+                for row in rows:
+                    by_day.setdefault(row["timestamp"].date(), []).append(row)
+                for day, day_rows in by_day.items():
+                    _write_partition(day, day_rows)
+
+                # Solo después de que el archivo está en disco se borran las filas
+                ids = [row["id"] for row in rows]
+                deleted = db.query(TestResult).filter(TestResult.id.in_(ids)).delete(synchronize_session=False)
+                update_rollup(db, rows, sign=-1)
+                db.commit()
+            except Exception as e:
+                logger.error(f"Error archivando resultados: {str(e)}")
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+            bump_generation()
+            archived += deleted
+            logger.info(f"{deleted} resultados archivados ({archived} en total)")
+            if len(rows) < RETENTION_CHUNK_ROWS:
+                break
+            if RETENTION_PAUSE_MS:
+                time.sleep(RETENTION_PAUSE_MS / 1000)
+    finally:
+        if lock_connection is not None:
+            lock_connection.exec_driver_sql(f"SELECT pg_advisory_unlock({RETENTION_LOCK_ID})")
+            lock_connection.close()
+
+    logger.info(f"Archivado terminado - {archived} resultados movidos a Parquet")
+    return archived
+
+
+def _archive_filter(
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None,
+    resultado_final: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """Los mismos filtros que iter_test_results, como expresión de pyarrow.dataset"""
+    pa = require_pyarrow()
+    field = pa.dataset.field
+    conditions = []
+    if test_type:
+        conditions.append(field("test_type") == test_type)
+    if environment:
+        conditions.append(field("environment") == environment)
+    if resultado_final == "FAIL":
+        conditions.append(field("resultado_final") != "PASS")
+    elif resultado_final:
+        conditions.append(field("resultado_final") == resultado_final)
+    if since:
+        conditions.append(field("timestamp") >= pa.scalar(_utc_naive(since), pa.timestamp("us")))
+    if until:
+        conditions.append(field("timestamp") < pa.scalar(_utc_naive(until), pa.timestamp("us")))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def iter_archived_results(
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None,
+    resultado_final: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[List[str]] = None,
+    batch_size: int = 1000
+) -> Iterator[Dict[str, Any]]:
+    """
+    Recorrer los resultados archivados que cumplan los filtros, del más nuevo al más viejo.
+    Se lee una partición (un día) a la vez; las que quedan fuera de since/until no se abren.
+    """
+    pa = require_pyarrow()
+    fields = fields or list(RESULT_FIELDS)
+    expression = _archive_filter(test_type, environment, resultado_final, since, until)
+    for _, directory in _day_dirs(since, until):
+        table = pa.dataset.dataset(directory, format="parquet", schema=_archive_schema())\
+            .to_table(columns=fields, filter=expression)
+        if "timestamp" in fields and "id" in fields:
+            table = table.sort_by([("timestamp", "descending"), ("id", "descending")])
+        for batch in table.to_batches(max_chunksize=batch_size):
+            for row in batch.to_pylist():
+                if "id" in row:
+                    row["id"] = str(row["id"])
+                yield row
+
+
+@cached_query
+def get_archived_trends(
+    bucket: str = "1h",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    test_type: Optional[str] = None,
+    environment: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Puntos de tendencia (mismo formato que get_trends) calculados sobre el archivo"""
+    pa = require_pyarrow()
+    pc = pa.compute
+    since = since or datetime.utcnow() - timedelta(hours=24)
+    expression = _archive_filter(test_type, environment, None, since, until)
+    columns = ["timestamp", "test_type", "environment", "resultado_final", "tiempo_segundos"]
+    tables = [
+        pa.dataset.dataset(directory, format="parquet", schema=_archive_schema())
+        .to_table(columns=columns, filter=expression)
+        for _, directory in _day_dirs(since, until)
+    ]
+    if not tables:
+        return []
+    table = pa.concat_tables(tables)
+
+    bucket_us = TREND_BUCKETS[bucket] * 1_000_000
+    epoch_us = pc.cast(table["timestamp"], pa.int64())
+    passed = pc.fill_null(pc.equal(table["resultado_final"], "PASS"), False)
+    grouped = pa.table({
+        "bucket": pc.multiply(pc.divide(epoch_us, bucket_us), bucket_us),
+        "test_type": table["test_type"],
+        "environment": table["environment"],
+        "resultado": pc.if_else(passed, "PASS", "FAIL"),
+        "tiempo_segundos": table["tiempo_segundos"],
+    }).group_by(["bucket", "test_type", "environment", "resultado"]).aggregate([
+        ("bucket", "count"),
+        ("tiempo_segundos", "mean"),
+    ])
+
+    points = [
+        {
+            "bucket": datetime.utcfromtimestamp(row["bucket"] // 1_000_000),
+            "test_type": row["test_type"] or "unknown",
+            "environment": row["environment"] or "all",
+            "resultado_final": row["resultado"],
+            "count": row["bucket_count"],
+            "avg_time": round(float(row["tiempo_segundos_mean"] or 0), 2)
+        }
+        for row in grouped.to_pylist()
+    ]
+    return sorted(points, key=lambda point: point["bucket"])
+
+
+def merge_trends(hot: List[Dict[str, Any]], archived: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Unir puntos de la base y del archivo. En un bucket con filas en los dos lados (el día del
+    corte) se suman las cantidades y avg_time se pondera por cantidad.
+    """
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for point in archived + hot:
+        key = (point["bucket"], point["test_type"], point["environment"], point["resultado_final"])
+        current = merged.get(key)
+        if current is None:
+            merged[key] = dict(point)
+            continue
+        count = current["count"] + point["count"]
+        current["avg_time"] = round(
+            (current["avg_time"] * current["count"] + point["avg_time"] * point["count"]) / count, 2
+        ) if count else 0.0
+        current["count"] = count
+    return sorted(merged.values(), key=lambda point: point["bucket"])
+
+
+def archive_status() -> List[Dict[str, Any]]:
+    """Particiones del archivo con su cantidad de filas y tamaño en disco"""
+    pa = require_pyarrow()
+    status = []
+    for day, directory in sorted(_day_dirs()):
+        files = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".parquet")]
+        status.append({
+            "day": day.isoformat(),
+            "files": len(files),
+            "rows": sum(pa.parquet.ParquetFile(path).metadata.num_rows for path in files),
+            "bytes": sum(os.path.getsize(path) for path in files),
+        })
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retención y archivo en Parquet de test_results")
+    parser.add_argument("command", choices=["archive", "status"],
+                        help="archive: mover resultados viejos a Parquet; status: listar particiones")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS, help="Días que se conservan en la base")
+    parser.add_argument("--dry-run", action="store_true", help="Solo contar las filas que se archivarían")
+    args = parser.parse_args()
+
+    if args.command == "archive":
+        archive_old_results(days=args.days, dry_run=args.dry_run)
+    else:
+        partitions = archive_status()
+        for partition in partitions:
+            print(f"{partition['day']}  {partition['files']:>4} archivos  {partition['rows']:>10} filas  "
+                  f"{partition['bytes'] / 1024:>10.1f} KB")
+        print(f"[INFO] {len(partitions)} días, {sum(p['rows'] for p in partitions)} filas archivadas")
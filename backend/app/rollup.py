@@ -0,0 +1,223 @@
+"""
+Tabla de agregados test_results_rollup, usada por /api/statistics y /api/summary.
+
+Cada fila acumula, por día, test_type, environment, resultado normalizado (passed) y
+categoría, la cantidad de resultados y la suma y suma de cuadrados de tiempo_segundos.
+Las dimensiones se guardan como los ids de dim_* (ver app/dimensions.py); los nombres se
+traducen recién al armar la respuesta.
+La ingesta la actualiza en su misma transacción (update_rollup) y rebuild_rollup la
+recalcula desde cero a partir de test_results.
+
+Junto al rollup se mantiene test_results_latency_sketch: por la misma clave, un
+histograma de tiempo_segundos en buckets logarítmicos con error relativo acotado
+(LATENCY_SKETCH_ALPHA, como DDSketch). Sumar los count de varios días o claves da el
+histograma combinado, así los percentiles de meses de datos salen de unas pocas filas.
+
+Uso (desde backend/):
+    python -m app.rollup rebuild
+"""
+import argparse
+import math
+from typing import Dict, Any, Iterable, List
+
+from sqlalchemy import func, select, insert, text, false
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.database import SessionLocal
+from app.log_config import get_logger
+from app.models import TestResult, ResultRollup, LatencySketch
+from app.dimensions import id_column
+from app.query_cache import bump_generation
+
+logger = get_logger(__name__)
+
+ROLLUP_KEY_COLUMNS = ["day", "test_type_id", "environment_id", "passed", "categoria_id"]
+
+# Columnas de test_results que lee rollup_key (más tiempo_segundos)
+ROLLUP_SOURCE_COLUMNS = ["timestamp", "tiempo_segundos", "passed", "test_type_id", "environment_id", "categoria_id"]
+
+# Id con que se guarda una dimensión NULL (los ids de dim_* empiezan en 1)
+NO_DIMENSION = 0
+
+# Error relativo máximo de los percentiles del sketch. Cambiarlo invalida los buckets
+# guardados: después hay que correr `python -m app.rollup rebuild`
+LATENCY_SKETCH_ALPHA = 0.02
+_SKETCH_GAMMA = (1 + LATENCY_SKETCH_ALPHA) / (1 - LATENCY_SKETCH_ALPHA)
+_SKETCH_LOG_GAMMA = math.log(_SKETCH_GAMMA)
+# Los tiempos menores (incluido 0) van al primer bucket
+LATENCY_SKETCH_MIN_SECONDS = 0.001
+
+
+def rollup_key(row: Dict[str, Any]) -> tuple:
+    """Clave del rollup para una fila de test_results con sus ids (NULL se guarda como NO_DIMENSION)"""
+    return (
+        row["timestamp"].date(),
+        row["test_type_id"] or NO_DIMENSION,
+        row["environment_id"] or NO_DIMENSION,
+        bool(row["passed"]),
+        row["categoria_id"] or NO_DIMENSION,
+    )
+
+
+def latency_bucket(seconds: float) -> int:
+    """Índice del bucket del sketch: el bucket i cubre (gamma^(i-1), gamma^i]"""
+    return math.ceil(math.log(max(seconds, LATENCY_SKETCH_MIN_SECONDS)) / _SKETCH_LOG_GAMMA)
+
+
+def bucket_value(bucket: int) -> float:
+    """Valor representativo del bucket (a menos de LATENCY_SKETCH_ALPHA de cualquier valor del bucket)"""
+    return 2 * _SKETCH_GAMMA ** bucket / (_SKETCH_GAMMA + 1)
+
+
+def sketch_quantiles(buckets: Dict[int, int], quantiles: List[float]) -> List[float]:
+    """Percentiles (0..1) de un histograma {bucket: count}; 0.0 si está vacío"""
+    items = sorted((bucket, count) for bucket, count in buckets.items() if count > 0)
+    total = sum(count for _, count in items)
+    if not total:
+        return [0.0 for _ in quantiles]
+    values = []
+    for quantile in quantiles:
+        rank = quantile * (total - 1)
+        seen = 0
+        for bucket, count in items:
+            seen += count
+            if seen > rank:
+                break
+        values.append(round(bucket_value(bucket), 3))
+    return values
+
+
+def _dialect_insert(db: Session):
+    return postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+
+
+def _update_latency_sketch(db: Session, rows: Iterable[Dict[str, Any]], sign: int):
+    counts = {}
+    for row in rows:
+        if row["tiempo_segundos"] is None:
+            continue
+        key = rollup_key(row) + (latency_bucket(float(row["tiempo_segundos"])),)
+        counts[key] = counts.get(key, 0) + sign
+    if not counts:
+        return
+
+    statement = _dialect_insert(db)(LatencySketch)
+    statement = statement.on_conflict_do_update(
+        index_elements=ROLLUP_KEY_COLUMNS + ["bucket"],
+        set_={"count": LatencySketch.count + statement.excluded.count}
+    )
+    db.execute(statement, [
+        {**dict(zip(ROLLUP_KEY_COLUMNS + ["bucket"], key)), "count": count}
+        for key, count in sorted(counts.items())
+    ])
+    if sign < 0:
+        db.query(LatencySketch).filter(LatencySketch.count <= 0).delete(synchronize_session=False)
+
+
+def update_rollup(db: Session, rows: Iterable[Dict[str, Any]], sign: int = 1):
+    """
+    Sumar filas recién insertadas al rollup (sin commit: usa la transacción de la ingesta).
+    Con sign=-1 las resta (filas borradas de test_results) y elimina las claves que quedan en cero.
+    """
+    totals = {}
+    for row in rows:
+        key = rollup_key(row)
+        tiempo = float(row["tiempo_segundos"] or 0)
+        count, sum_tiempo, sum_tiempo_sq = totals.get(key, (0, 0.0, 0.0))
+        totals[key] = (count + sign, sum_tiempo + sign * tiempo, sum_tiempo_sq + sign * tiempo * tiempo)
+    if not totals:
+        return
+
+    statement = _dialect_insert(db)(ResultRollup)
+    statement = statement.on_conflict_do_update(
+        index_elements=ROLLUP_KEY_COLUMNS,
+        set_={
+            "count": ResultRollup.count + statement.excluded.count,
+            "sum_tiempo": ResultRollup.sum_tiempo + statement.excluded.sum_tiempo,
+            "sum_tiempo_sq": ResultRollup.sum_tiempo_sq + statement.excluded.sum_tiempo_sq,
+        }
+    )
+    # Claves ordenadas: dos lotes concurrentes bloquean las filas del rollup en el mismo orden
+    db.execute(statement, [
+        {
+            **dict(zip(ROLLUP_KEY_COLUMNS, key)),
+            "count": count,
+            "sum_tiempo": sum_tiempo,
+            "sum_tiempo_sq": sum_tiempo_sq,
+        }
+        for key, (count, sum_tiempo, sum_tiempo_sq) in sorted(totals.items())
+    ])
+    if sign < 0:
+        db.query(ResultRollup).filter(ResultRollup.count <= 0).delete(synchronize_session=False)
+    _update_latency_sketch(db, rows, sign)
+
+
+def _rebuild_latency_sketch(db: Session):
+    """Recalcular el sketch recorriendo test_results (el bucket se calcula en Python, igual que al ingerir)"""
+    db.query(LatencySketch).delete()
+    columns = [getattr(TestResult, column) for column in ROLLUP_SOURCE_COLUMNS]
+    counts = {}
+    rows = db.query(*columns)\
+        .filter(TestResult.timestamp.isnot(None), TestResult.tiempo_segundos.isnot(None))\
+        .yield_per(10000)
+    for row in rows:
+        key = rollup_key(row._mapping) + (latency_bucket(float(row.tiempo_segundos)),)
+        counts[key] = counts.get(key, 0) + 1
+    items = sorted(counts.items())
+    for offset in range(0, len(items), 10000):
+        db.execute(insert(LatencySketch), [
+            {**dict(zip(ROLLUP_KEY_COLUMNS + ["bucket"], key)), "count": count}
+            for key, count in items[offset:offset + 10000]
+        ])
+
+
+def rebuild_rollup() -> int:
+    """Recalcular el rollup y el sketch de latencia desde test_results; retorna la cantidad de filas del rollup"""
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            # Las ingestas concurrentes esperan al rebuild en vez de sumar sobre un rollup a medio armar
+            db.execute(text("LOCK TABLE test_results_rollup, test_results_latency_sketch IN EXCLUSIVE MODE"))
+        db.query(ResultRollup).delete()
+
+        tiempo = func.coalesce(TestResult.tiempo_segundos, 0.0)
+        key_columns = [
+            func.date(TestResult.timestamp),
+            func.coalesce(id_column("test_type"), NO_DIMENSION),
+            func.coalesce(id_column("environment"), NO_DIMENSION),
+            func.coalesce(TestResult.passed, false()),
+            func.coalesce(id_column("categoria"), NO_DIMENSION),
+        ]
+        db.execute(insert(ResultRollup).from_select(
+            ROLLUP_KEY_COLUMNS + ["count", "sum_tiempo", "sum_tiempo_sq"],
+            select(
+                *key_columns,
+                func.count(TestResult.id),
+                func.sum(tiempo),
+                func.sum(tiempo * tiempo)
+            ).where(TestResult.timestamp.isnot(None)).group_by(*key_columns)
+        ))
+        _rebuild_latency_sketch(db)
+        db.commit()
+        bump_generation()
+
+        total = db.query(func.count()).select_from(ResultRollup).scalar()
+        logger.info(f"Rollup reconstruido - {total} filas")
+        return total
+    except Exception as e:
+        logger.error(f"Error reconstruyendo el rollup: {str(e)}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de test_results_rollup")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: recalcular rollup y sketch desde test_results")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        rebuild_rollup()
@@ -1,9 +1,10 @@
 from pydantic import BaseModel
-from typing import Optional
-from datetime import datetime
+from typing import Optional, List
+from datetime import datetime, date
 
 class TestResultBase(BaseModel):
-    test_id: str
+    run_id: Optional[str] = None  # Ejecución que produjo el resultado (si falta, uno por envío)
+    test_id: str  # Número de la pregunta en la planilla (columna ID)
     categoria: str
     pregunta: str
     palabras_clave: str
@@ -20,6 +21,9 @@ class TestResultBase(BaseModel):
 class TestResultCreate(TestResultBase):
     pass
 
+class TestResultImport(TestResultBase):
+    timestamp: Optional[datetime] = None  # Para backfills: se conserva el timestamp original
+
 class TestResultResponse(TestResultBase):
     id: str  # Firestore usa strings para IDs
     timestamp: datetime
@@ -27,12 +31,102 @@ class TestResultResponse(TestResultBase):
     class Config:
         from_attributes = True
 
+class TestResultProjection(BaseModel):
+    # Lecturas con ?fields=: solo vienen las columnas pedidas (más id y timestamp)
+    id: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    run_id: Optional[str] = None
+    test_id: Optional[str] = None
+    categoria: Optional[str] = None
+    pregunta: Optional[str] = None
+    palabras_clave: Optional[str] = None
+    respuesta_bot: Optional[str] = None
+    validacion_correcta: Optional[bool] = None
+    palabras_encontradas: Optional[str] = None
+    resultado_final: Optional[str] = None
+    tiempo_segundos: Optional[float] = None
+    error: Optional[str] = None
+    test_type: Optional[str] = None
+    environment: Optional[str] = None
+    sheet_name: Optional[str] = None
+
+class ResultsPage(BaseModel):
+    results: List[TestResultProjection]
+    next_cursor: Optional[str] = None  # También en el header X-Next-Cursor; None en la última página
+
+class BatchItemResult(BaseModel):
+    index: int  # Posición del item en el lote recibido
+    status: str  # 'created', 'duplicate' (ya existía) o 'error'
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchResultResponse(BaseModel):
+    total: int
+    created: int
+    duplicates: int
+    failed: int
+    results: List[BatchItemResult]
+
+class StreamLineError(BaseModel):
+    line: int  # Número de línea (1-based) dentro del NDJSON
+    error: str
+
+class StreamIngestResponse(BaseModel):
+    lines: int
+    created: int
+    duplicates: int
+    failed: int
+    errors: List[StreamLineError]  # Primeros errores, con su número de línea
+    errors_truncated: bool
+
 class StatisticsResponse(BaseModel):
     test_type: str
     environment: str
     resultado_final: str
     count: int
     avg_time: float
+    # Percentiles de tiempo_segundos (del sketch del rollup, error relativo <= 2%)
+    p50: float = 0.0
+    p90: float = 0.0
+    p95: float = 0.0
+    p99: float = 0.0
+
+class LatencyStats(BaseModel):
+    # Solo vienen las dimensiones pedidas en group_by
+    test_type: Optional[str] = None
+    environment: Optional[str] = None
+    categoria: Optional[str] = None
+    day: Optional[date] = None
+    count: int
+    p50: float
+    p90: float
+    p95: float
+    p99: float
+
+class FlakyQuestion(BaseModel):
+    pregunta_hash: str
+    pregunta: str
+    categoria: str
+    test_type: str
+    environment: str
+    runs: int
+    fails: int
+    flips: int  # Cambios PASS <-> FAIL entre ejecuciones consecutivas (histórico)
+    fail_rate: float
+    flakiness: float  # Fracción de cambios en las últimas ejecuciones (0 = estable, 1 = alterna siempre)
+    last_outcomes: str  # Últimas ejecuciones, la más reciente primero (P = PASS, F = FAIL)
+    last_result: Optional[str] = None
+    last_test_id: Optional[str] = None
+    last_timestamp: Optional[datetime] = None
+    latency_ewma: Optional[float] = None
+
+class TrendPoint(BaseModel):
+    bucket: datetime  # Inicio del bucket (UTC)
+    test_type: str
+    environment: str
+    resultado_final: str  # PASS o FAIL (todos los tipos de FAIL normalizados)
+    count: int
+    avg_time: float
 
 class SummaryResponse(BaseModel):
     total: int
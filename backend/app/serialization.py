@@ -0,0 +1,41 @@
+"""
+Serialización de resultados a JSON sin volver a pasar por Pydantic.
+
+Los resultados que arma db_models ya tienen la forma de TestResultResponse (id como
+string, dimensiones con su nombre, timestamp como datetime). Construir un
+TestResultResponse por fila y dejar que FastAPI valide otra vez el response_model solo
+copia los datos dos veces más: las lecturas devuelven ResultsResponse, que codifica la
+lista de diccionarios directo a bytes (con orjson si está instalado, si no con json de
+la biblioteca estándar; el JSON es el mismo).
+"""
+import json
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """JSON compacto en UTF-8 (fechas en ISO 8601, igual que Pydantic)"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_json_default)
+    return json.dumps(content, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class ResultsResponse(Response):
+    """Respuesta JSON para resultados leídos de la base (no se revalidan con el modelo)"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
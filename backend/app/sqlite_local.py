@@ -0,0 +1,148 @@
+"""
+Modo local con SQLite: pragmas de cada conexión y un único hilo escritor.
+
+Sin DATABASE_URL la API usa un archivo SQLite. En modo rollback-journal cada commit
+hace fsync y un escritor bloquea a los lectores, así que la ingesta del executor y las
+lecturas del dashboard terminaban en "database is locked". Ahora:
+
+- Cada conexión (sync, aiosqlite y la del escritor) se abre con journal_mode=WAL,
+  synchronous=NORMAL (en WAL solo el checkpoint hace fsync; un corte de luz puede perder
+  los últimos commits pero no corrompe la base), caché y mmap más grandes y
+  busy_timeout. Se configuran con SQLITE_*.
+- Todas las escrituras de la API (run_write en app/database.py) pasan por SQLiteWriter:
+  un hilo con una conexión propia que ejecuta una escritura por vez, en orden de
+  llegada, con BEGIN IMMEDIATE. Los lectores usan las conexiones del pool y en WAL
+  nunca esperan al escritor. Los scripts de mantenimiento en otro proceso esperan el
+  lock con busy_timeout.
+
+SQLITE_SINGLE_WRITER=false vuelve a escribir desde el hilo de cada request.
+"""
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_MB = int(os.getenv("SQLITE_CACHE_SIZE_MB", "64"))
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SINGLE_WRITER = os.getenv("SQLITE_SINGLE_WRITER", "true").lower() in ("1", "true", "yes")
+
+_WAIT_SAMPLES = 2000
+
+
+def _percentile(samples, pct: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+def apply_pragmas(dbapi_connection, connection_record=None):
+    """Listener de "connect": pragmas de rendimiento de una conexión SQLite nueva"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        # cache_size negativo es en KiB
+        cursor.execute(f"PRAGMA cache_size = {-SQLITE_CACHE_SIZE_MB * 1024}")
+        cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+    finally:
+        cursor.close()
+
+
+def configure_engine(engine):
+    """Aplicar los pragmas a cada conexión nueva del engine (sync o el sync_engine de uno async)"""
+    event.listen(engine, "connect", apply_pragmas)
+
+
+# pysqlite abre la transacción recién en el primer INSERT/UPDATE: con el driver en
+# autocommit la abre SQLAlchemy, y BEGIN IMMEDIATE toma el lock de escritura al empezar
+# en lugar de fallar al querer pasar de lectura a escritura (y los SAVEPOINT funcionan)
+def _driver_autocommit(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+def _begin_immediate(connection):
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+class SQLiteWriter:
+    """Hilo que ejecuta las escrituras write(db, *args) de a una, con su propia conexión"""
+
+    def __init__(self, database_url: str, connect_args: Dict[str, Any]):
+        self.engine = create_engine(database_url, connect_args=connect_args, pool_size=1, max_overflow=0, echo=False)
+        configure_engine(self.engine)
+        event.listen(self.engine, "connect", _driver_autocommit)
+        event.listen(self.engine, "begin", _begin_immediate)
+        self._session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._wait_ms = deque(maxlen=_WAIT_SAMPLES)
+        self._write_ms = deque(maxlen=_WAIT_SAMPLES)
+        self._writes = 0
+        self._errors = 0
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, write: Callable, *args) -> Any:
+        """Ejecutar write(db, *args) en el hilo escritor y esperar su resultado (o su excepción)"""
+        if threading.current_thread() is self._thread:
+            # Esperaría a la escritura que la contiene, que tiene la única conexión y el lock
+            raise RuntimeError("run_write anidado: usar la sesión de la escritura en curso")
+        future: Future = Future()
+        self._queue.put((write, args, future, time.perf_counter()))
+        return future.result()
+
+    def _execute(self, write: Callable, args: tuple) -> Any:
+        db = self._session_factory()
+        try:
+            return write(db, *args)
+        finally:
+            db.close()
+
+    def _run(self):
+        while True:
+            write, args, future, submitted_at = self._queue.get()
+            started_at = time.perf_counter()
+            try:
+                future.set_result(self._execute(write, args))
+            except BaseException as e:
+                future.set_exception(e)
+                with self._lock:
+                    self._errors += 1
+            with self._lock:
+                self._writes += 1
+                self._wait_ms.append((started_at - submitted_at) * 1000)
+                self._write_ms.append((time.perf_counter() - started_at) * 1000)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            wait_ms, write_ms = list(self._wait_ms), list(self._write_ms)
+            writes, errors = self._writes, self._errors
+        return {
+            "running": self._thread.is_alive(),
+            "queue_depth": self._queue.qsize(),
+            "writes": writes,
+            "errors": errors,
+            "queue_wait_ms": {"p50": _percentile(wait_ms, 50), "p99": _percentile(wait_ms, 99)},
+            "write_ms": {"p50": _percentile(write_ms, 50), "p99": _percentile(write_ms, 99)},
+            "pragmas": {
+                "journal_mode": SQLITE_JOURNAL_MODE,
+                "synchronous": SQLITE_SYNCHRONOUS,
+                "cache_size_mb": SQLITE_CACHE_SIZE_MB,
+                "mmap_size_mb": SQLITE_MMAP_SIZE_MB,
+                "busy_timeout_ms": SQLITE_BUSY_TIMEOUT_MS,
+            },
+        }
@@ -0,0 +1,157 @@
+"""
+Ingesta de resultados en streaming (NDJSON, opcionalmente gzip).
+
+El cuerpo se procesa a medida que llega: se descomprime por partes, se corta en líneas,
+cada línea se valida con TestResultImport y las filas válidas se guardan en lotes de
+STREAM_CHUNK_ROWS con create_test_results_batch. Nunca se tiene en memoria más que un
+lote, una línea incompleta y como máximo STREAM_MAX_ERRORS errores detallados.
+"""
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Dict, Any, List, Optional
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from app.db_models import create_test_results_batch, new_run_id
+from app.schemas import TestResultImport
+
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "500"))
+STREAM_MAX_LINE_BYTES = int(os.getenv("STREAM_MAX_LINE_BYTES", str(1024 * 1024)))
+STREAM_MAX_ERRORS = 100
+
+# Tope de bytes descomprimidos por paso, para que un gzip muy comprimido no explote en memoria
+_DECOMPRESS_STEP = 256 * 1024
+
+
+class StreamIngestError(Exception):
+    """Error de base de datos a mitad del stream; incluye lo que ya quedó guardado"""
+
+    def __init__(self, message: str, summary: Dict[str, Any]):
+        super().__init__(message)
+        self.summary = summary
+
+
+async def _decompressed(chunks: AsyncIterator[bytes], gzipped: bool) -> AsyncIterator[bytes]:
+    if not gzipped:
+        async for chunk in chunks:
+            if chunk:
+                yield chunk
+        return
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = decompressor.decompress(chunk, _DECOMPRESS_STEP)
+        while True:
+            if data:
+                yield data
+            if not decompressor.unconsumed_tail:
+                break
+            data = decompressor.decompress(decompressor.unconsumed_tail, _DECOMPRESS_STEP)
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple]:
+    """Producir (número de línea, bytes o None si la línea excede STREAM_MAX_LINE_BYTES)"""
+    pending = b""
+    oversized = False
+    line_number = 0
+    async for data in chunks:
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end == -1:
+                if not oversized:
+                    pending += data[start:]
+                    if len(pending) > STREAM_MAX_LINE_BYTES:
+                        pending = b""
+                        oversized = True
+                break
+            line_number += 1
+            if oversized:
+                yield line_number, None
+            else:
+                yield line_number, pending + data[start:end]
+            pending = b""
+            oversized = False
+            start = end + 1
+    if pending or oversized:
+        line_number += 1
+        yield line_number, None if oversized else pending
+
+
+async def ingest_ndjson(chunks: AsyncIterator[bytes], gzipped: bool = False,
+                        run_id: Optional[str] = None) -> Dict[str, Any]:
+    """Validar y guardar un stream NDJSON; retorna el resumen por línea"""
+    summary = {
+        "lines": 0,
+        "created": 0,
+        "duplicates": 0,
+        "failed": 0,
+        "errors": [],
+        "errors_truncated": False,
+    }
+    rows: List[Dict[str, Any]] = []
+    row_lines: List[int] = []
+    # Las líneas sin run_id comparten uno del stream (se guarda en lotes): el header
+    # Idempotency-Key si vino, así reenviar el mismo stream no duplica filas
+    run_id = run_id or new_run_id()
+
+    def add_error(line_number: int, message: str):
+        summary["failed"] += 1
+        if len(summary["errors"]) < STREAM_MAX_ERRORS:
+            summary["errors"].append({"line": line_number, "error": message})
+        else:
+            summary["errors_truncated"] = True
+
+    async def flush():
+        try:
+            statuses = await run_in_threadpool(create_test_results_batch, rows)
+        except Exception as e:
+            raise StreamIngestError(
+                f"Error guardando el lote que termina en la línea {row_lines[-1]}: {str(e)}",
+                summary
+            )
+        for line_number, status in zip(row_lines, statuses):
+            if status["status"] == "created":
+                summary["created"] += 1
+            elif status["status"] == "duplicate":
+                summary["duplicates"] += 1
+            else:
+                add_error(line_number, status.get("error") or "error desconocido")
+        rows.clear()
+        row_lines.clear()
+
+    async for line_number, raw in _lines(_decompressed(chunks, gzipped)):
+        summary["lines"] = line_number
+        if raw is None:
+            add_error(line_number, f"La línea supera {STREAM_MAX_LINE_BYTES} bytes")
+            continue
+        if not raw.strip():
+            continue
+        try:
+            data = TestResultImport(**json.loads(raw)).dict()
+        except ValidationError as e:
+            add_error(line_number, "; ".join(
+                f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()
+            ))
+            continue
+        except (ValueError, TypeError) as e:
+            add_error(line_number, f"JSON inválido: {str(e)}")
+            continue
+
+        if data["timestamp"] is None:
+            data["timestamp"] = datetime.utcnow()
+        data["run_id"] = data["run_id"] or run_id
+        rows.append(data)
+        row_lines.append(line_number)
+        if len(rows) >= STREAM_CHUNK_ROWS:
+            await flush()
+
+    if rows:
+        await flush()
+    return summary
@@ -10,8 +10,13 @@ from typing import Dict, Optional, List
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
 
-from app.database import SessionLocal
+from app.database import run_query, run_write
 from app.models import TestExecution, TestResult
+from app.log_config import get_logger
+
+logger = get_logger(__name__)
+# La salida de Playwright va a un logger propio para poder subirle el nivel o muestrearla
+output_logger = get_logger(__name__ + ".output")
 
 # Diccionario para guardar procesos activos (para poder cancelarlos)
 active_processes: Dict[str, subprocess.Popen] = {}
@@ -71,18 +76,20 @@ def get_test_bases() -> list:
                         workbook.close()
                         break
                     except Exception as e:
-                        print(f"[WARNING] No se pudo leer {path}: {str(e)}", flush=True)
+                        logger.warning(f"No se pudo leer {path}: {str(e)}")
                         continue
     except ImportError:
-        print("[INFO] openpyxl no está instalado, no se puede contar preguntas", flush=True)
+        logger.info("openpyxl no está instalado, no se puede contar preguntas")
     except Exception as e:
-        print(f"[WARNING] Error al leer archivos Excel: {str(e)}", flush=True)
+        logger.warning(f"Error al leer archivos Excel: {str(e)}")
     
     return bases
 
 def get_test_status(test_id: str) -> Optional[Dict]:
     """Obtener estado de una ejecución de test desde la base de datos"""
-    db = SessionLocal()
+    return run_query(_get_test_status, test_id)
+
+def _get_test_status(db: Session, test_id: str) -> Optional[Dict]:
     try:
         execution = db.query(TestExecution).filter(TestExecution.test_id == test_id).first()
         if execution:
@@ -104,34 +111,34 @@ def get_test_status(test_id: str) -> Optional[Dict]:
                 "error": execution.error,
                 "logs": logs
             }
-            print(f"[INFO] Estado encontrado para {test_id}: {execution.status}", flush=True)
+            logger.debug(f"Estado encontrado para {test_id}: {execution.status}")
             return status
         else:
-            print(f"[WARNING] Estado NO encontrado para {test_id}", flush=True)
+            logger.warning(f"Estado NO encontrado para {test_id}")
             return None
     except Exception as e:
-        print(f"[ERROR] Error obteniendo estado desde BD: {str(e)}", flush=True)
+        logger.error(f"Error obteniendo estado desde BD: {str(e)}")
         return None
-    finally:
-        db.close()
 
 def get_running_tests() -> List[str]:
     """Obtener lista de test_ids que están corriendo o en cola"""
-    db = SessionLocal()
+    return run_query(_get_running_tests)
+
+def _get_running_tests(db: Session) -> List[str]:
     try:
         running = db.query(TestExecution).filter(
             TestExecution.status.in_(["queued", "running"])
         ).all()
         return [t.test_id for t in running]
     except Exception as e:
-        print(f"[ERROR] Error obteniendo tests corriendo: {str(e)}", flush=True)
+        logger.error(f"Error obteniendo tests corriendo: {str(e)}")
         return []
-    finally:
-        db.close()
 
 def update_test_status(test_id: str, status_data: Dict):
     """Actualizar estado de un test en la base de datos"""
-    db = SessionLocal()
+    run_write(_update_test_status, test_id, status_data)
+
+def _update_test_status(db: Session, test_id: str, status_data: Dict):
     try:
         execution = db.query(TestExecution).filter(TestExecution.test_id == test_id).first()
         if not execution:
@@ -161,26 +168,24 @@ def update_test_status(test_id: str, status_data: Dict):
         db.commit()
         db.refresh(execution)
     except Exception as e:
-        print(f"[ERROR] Error actualizando estado en BD: {str(e)}", flush=True)
+        logger.error(f"Error actualizando estado en BD: {str(e)}")
         db.rollback()
-    finally:
-        db.close()
 
 def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
     """
     Ejecutar test en segundo plano
     """
     try:
-        print(f"[INFO] ===== INICIANDO run_test_async para {test_id} =====", flush=True)
+        logger.info(f"===== INICIANDO run_test_async para {test_id} =====")
         
         # Verificar que el test_id existe en BD
         current_status = get_test_status(test_id)
         if not current_status:
-            print(f"[ERROR] Test {test_id} no encontrado en BD al iniciar ejecución", flush=True)
+            logger.error(f"Test {test_id} no encontrado en BD al iniciar ejecución")
             return
         
         test_file = f"tests/specs/{test_type}.playwright.spec.js"
-        print(f"[INFO] Iniciando test {test_id}: {test_file}", flush=True)
+        logger.info(f"Iniciando test {test_id}: {test_file}")
         
         # Actualizar estado en BD
         started_at = datetime.utcnow().isoformat()
@@ -190,7 +195,7 @@ def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
             "logs": []
         })
         
-        print(f"[INFO] Estado actualizado a 'running' para {test_id}", flush=True)
+        logger.info(f"Estado actualizado a 'running' para {test_id}")
         
         # Determinar el directorio de trabajo
         # El backend está en backend/, pero necesitamos la raíz del proyecto
@@ -213,9 +218,9 @@ def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
         if not work_dir:
             # Si no encontramos package.json, usar la raíz del proyecto de todas formas
             work_dir = project_root
-            print(f"[WARNING] No se encontró package.json, usando: {work_dir}", flush=True)
+            logger.warning(f"No se encontró package.json, usando: {work_dir}")
         
-        print(f"[INFO] Ejecutando desde: {work_dir}", flush=True)
+        logger.info(f"Ejecutando desde: {work_dir}")
         
         # Obtener API_URL para pasarla a los tests
         # Railway puede tener RAILWAY_PUBLIC_DOMAIN o podemos construirla
@@ -229,7 +234,7 @@ def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
                 # Fallback: usar localhost en desarrollo
                 api_url = "http://localhost:8000"
         
-        print(f"[INFO] API_URL para tests: {api_url}", flush=True)
+        logger.info(f"API_URL para tests: {api_url}")
         
         # Determinar el comando npm según el sistema operativo
         import platform
@@ -243,7 +248,7 @@ def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
         if not npm_path:
             raise Exception("npm no encontrado. Asegúrate de que Node.js esté instalado y en el PATH.")
         
-        print(f"[INFO] npm encontrado en: {npm_path}", flush=True)
+        logger.info(f"npm encontrado en: {npm_path}")
         
         # En Windows, a veces es necesario usar shell=True
         use_shell = platform.system() == "Windows"
@@ -251,12 +256,14 @@ def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
         # Construir el comando
         test_command = f"test -- {test_file} --project=chromium"
         
-        print(f"[INFO] Ejecutando: {npm_path} {test_command}", flush=True)
-        print(f"[INFO] Usando shell: {use_shell}", flush=True)
+        logger.info(f"Ejecutando: {npm_path} {test_command}")
+        logger.info(f"Usando shell: {use_shell}")
         
         # Preparar variables de entorno para el proceso
         env = os.environ.copy()
         env["API_URL"] = api_url
+        # Los resultados de esta ejecución se guardan con su id (run_id)
+        env["RUN_ID"] = test_id
         
         # Obtener BOT_URL desde el parámetro environment o variable de entorno
         # Mapeo de ambientes a URLs
@@ -275,7 +282,7 @@ def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
             bot_url = env_bot_url
         
         env["BOT_URL"] = bot_url
-        print(f"[INFO] BOT_URL para tests: {bot_url}", flush=True)
+        logger.info(f"BOT_URL para tests: {bot_url}")
         
         # Ejecutar test
         if use_shell:
@@ -323,7 +330,7 @@ def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
                 if check_cancel_counter % 3 == 0:
                     current_status = get_test_status(test_id)
                     if current_status and current_status.get("status") == "cancelled":
-                        print(f"[INFO] Test {test_id} fue cancelado, terminando proceso y sus hijos...", flush=True)
+                        logger.info(f"Test {test_id} fue cancelado, terminando proceso y sus hijos...")
                         # Terminar el proceso y sus hijos
                         try:
                             import platform
@@ -336,9 +343,9 @@ def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
                                         capture_output=True,
                                         timeout=5
                                     )
-                                    print(f"[INFO] Proceso {test_id} y sus hijos terminados con taskkill", flush=True)
+                                    logger.info(f"Proceso {test_id} y sus hijos terminados con taskkill")
                                 except Exception as e:
-                                    print(f"[WARNING] Error con taskkill: {str(e)}", flush=True)
+                                    logger.warning(f"Error con taskkill: {str(e)}")
                                     process.terminate()
                                     try:
                                         process.wait(timeout=2)
@@ -351,7 +358,7 @@ def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
                                 except subprocess.TimeoutExpired:
                                     process.kill()
                         except Exception as e:
-                            print(f"[WARNING] Error terminando proceso: {str(e)}", flush=True)
+                            logger.warning(f"Error terminando proceso: {str(e)}")
                         break
                 
                 output = process.stdout.readline()
@@ -364,7 +371,7 @@ def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
                     
                     # Verificar cancelación antes de procesar la línea
                     if current_status and current_status.get("status") == "cancelled":
-                        print(f"[INFO] Test {test_id} fue cancelado, deteniendo lectura de logs...", flush=True)
+                        logger.info(f"Test {test_id} fue cancelado, deteniendo lectura de logs...")
                         try:
                             import platform
                             if platform.system() == "Windows":
@@ -388,7 +395,7 @@ def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
                                 except subprocess.TimeoutExpired:
                                     process.kill()
                         except Exception as e:
-                            print(f"[WARNING] Error terminando proceso: {str(e)}", flush=True)
+                            logger.warning(f"Error terminando proceso: {str(e)}")
                         break
                     
                     logs = current_status["logs"] if current_status else []
@@ -405,19 +412,19 @@ def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
                         # Solo actualizar logs sin contar preguntas (más rápido)
                         update_test_status(test_id, {"logs": logs})
                     
-                    print(f"[TEST {test_id}] {line}", flush=True)
+                    output_logger.info(line, extra={"test_id": test_id})
             except UnicodeDecodeError as e:
                 # Si hay un error de codificación, intentar leer como bytes y decodificar con errores reemplazados
-                print(f"[WARNING] Error de codificación en línea, omitiendo: {str(e)}", flush=True)
+                logger.warning(f"Error de codificación en línea, omitiendo: {str(e)}")
                 continue
             except Exception as e:
-                print(f"[WARNING] Error leyendo output: {str(e)}", flush=True)
+                logger.warning(f"Error leyendo output: {str(e)}")
                 break
         
         # Verificar si fue cancelado antes de actualizar estado final
         final_status_check = get_test_status(test_id)
         if final_status_check and final_status_check.get("status") == "cancelled":
-            print(f"[INFO] Test {test_id} fue cancelado, no actualizando estado final", flush=True)
+            logger.info(f"Test {test_id} fue cancelado, no actualizando estado final")
             # Remover proceso de la lista de activos
             if test_id in active_processes:
                 del active_processes[test_id]
@@ -440,9 +447,9 @@ def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
             del active_processes[test_id]
         
         if return_code == 0:
-            print(f"[INFO] Test {test_id} completado exitosamente", flush=True)
+            logger.info(f"Test {test_id} completado exitosamente")
         else:
-            print(f"[ERROR] Test {test_id} falló con código {return_code}", flush=True)
+            logger.error(f"Test {test_id} falló con código {return_code}")
             
     except subprocess.TimeoutExpired:
         update_test_status(test_id, {
@@ -451,7 +458,7 @@ def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
         })
         if test_id in active_processes:
             del active_processes[test_id]
-        print(f"[ERROR] Test {test_id} timeout", flush=True)
+        logger.error(f"Test {test_id} timeout")
     except Exception as e:
         # Asegurar que el estado se actualice incluso si hay un error temprano
         try:
@@ -461,13 +468,11 @@ def run_test_async(test_type: str, test_id: str, environment: str = "preprod"):
                 "completed_at": datetime.utcnow().isoformat()
             })
         except Exception as update_error:
-            print(f"[ERROR] Error actualizando estado después de excepción: {str(update_error)}", flush=True)
+            logger.error(f"Error actualizando estado después de excepción: {str(update_error)}")
         
         if test_id in active_processes:
             del active_processes[test_id]
-        print(f"[ERROR] Error ejecutando test {test_id}: {str(e)}", flush=True)
-        import traceback
-        print(f"[ERROR] Traceback: {traceback.format_exc()}", flush=True)
+        logger.exception(f"Error ejecutando test {test_id}: {str(e)}")
 
 def cancel_test_execution(test_id: str) -> bool:
     """Cancelar ejecución de un test"""
@@ -491,7 +496,7 @@ def cancel_test_execution(test_id: str) -> bool:
         if test_id in active_processes:
             process = active_processes[test_id]
             try:
-                print(f"[INFO] Terminando proceso {test_id} (PID: {process.pid})...", flush=True)
+                logger.info(f"Terminando proceso {test_id} (PID: {process.pid})...")
                 
                 # En Windows, necesitamos matar el árbol de procesos
                 import platform
@@ -504,9 +509,9 @@ def cancel_test_execution(test_id: str) -> bool:
                             capture_output=True,
                             timeout=5
                         )
-                        print(f"[INFO] Proceso {test_id} y sus hijos terminados con taskkill", flush=True)
+                        logger.info(f"Proceso {test_id} y sus hijos terminados con taskkill")
                     except Exception as e:
-                        print(f"[WARNING] Error con taskkill: {str(e)}, intentando terminate/kill...", flush=True)
+                        logger.warning(f"Error con taskkill: {str(e)}, intentando terminate/kill...")
                         # Fallback a terminate/kill
                         try:
                             process.terminate()
@@ -519,21 +524,21 @@ def cancel_test_execution(test_id: str) -> bool:
                     process.terminate()
                     try:
                         process.wait(timeout=5)
-                        print(f"[INFO] Proceso {test_id} terminado correctamente", flush=True)
+                        logger.info(f"Proceso {test_id} terminado correctamente")
                     except subprocess.TimeoutExpired:
-                        print(f"[INFO] Proceso {test_id} no terminó, forzando kill...", flush=True)
+                        logger.info(f"Proceso {test_id} no terminó, forzando kill...")
                         process.kill()
                         process.wait(timeout=2)
                 
                 del active_processes[test_id]
-                print(f"[OK] Proceso {test_id} eliminado de active_processes", flush=True)
+                logger.info(f"Proceso {test_id} eliminado de active_processes")
             except ProcessLookupError:
                 # El proceso ya terminó
-                print(f"[INFO] Proceso {test_id} ya había terminado", flush=True)
+                logger.info(f"Proceso {test_id} ya había terminado")
                 if test_id in active_processes:
                     del active_processes[test_id]
             except Exception as e:
-                print(f"[WARNING] Error terminando proceso: {str(e)}", flush=True)
+                logger.warning(f"Error terminando proceso: {str(e)}")
                 # Intentar kill de todas formas
                 try:
                     if test_id in active_processes:
@@ -551,13 +556,11 @@ def cancel_test_execution(test_id: str) -> bool:
                             process.kill()
                         del active_processes[test_id]
                 except Exception as e2:
-                    print(f"[WARNING] Error en fallback kill: {str(e2)}", flush=True)
+                    logger.warning(f"Error en fallback kill: {str(e2)}")
         
         return True
     except Exception as e:
-        print(f"[ERROR] Error cancelando test: {str(e)}", flush=True)
-        import traceback
-        print(f"[ERROR] Traceback: {traceback.format_exc()}", flush=True)
+        logger.exception(f"Error cancelando test: {str(e)}")
         return False
 
 def start_test_execution(test_type: str, environment: str = "preprod") -> str:
@@ -582,16 +585,14 @@ def start_test_execution(test_type: str, environment: str = "preprod") -> str:
         "logs": []
     })
     
-    print(f"[INFO] Test {test_id} creado y guardado en BD", flush=True)
+    logger.info(f"Test {test_id} creado y guardado en BD")
     
     # Ejecutar en thread separado con mejor manejo de errores
     def run_with_error_handling():
         try:
             run_test_async(test_type, test_id, environment)
         except Exception as e:
-            print(f"[ERROR] Excepcion no capturada en thread para {test_id}: {str(e)}", flush=True)
-            import traceback
-            print(f"[ERROR] Traceback: {traceback.format_exc()}", flush=True)
+            logger.exception(f"Excepcion no capturada en thread para {test_id}: {str(e)}")
             # Intentar actualizar estado a error
             try:
                 update_test_status(test_id, {
@@ -605,13 +606,13 @@ def start_test_execution(test_type: str, environment: str = "preprod") -> str:
     thread = threading.Thread(target=run_with_error_handling, daemon=True)
     thread.start()
     
-    print(f"[INFO] Thread iniciado para test {test_id}", flush=True)
+    logger.info(f"Thread iniciado para test {test_id}")
     
     # Verificar que el thread realmente se inició después de un breve delay
     import time
     time.sleep(0.5)
     if not thread.is_alive():
-        print(f"[WARNING] Thread para {test_id} no esta vivo despues de iniciarse", flush=True)
+        logger.warning(f"Thread para {test_id} no esta vivo despues de iniciarse")
         # Intentar actualizar estado a error
         try:
             update_test_status(test_id, {
@@ -0,0 +1,180 @@
+"""
+Textos de test_results guardados por contenido (text_blobs).
+
+El bot repite la misma respuesta_bot para la misma pregunta en cada ejecución, y las
+palabras clave se repiten igual. Cada texto distinto se guarda una sola vez en
+text_blobs con su sha256 como clave; test_results guarda solo el hash
+(respuesta_bot_hash, palabras_clave_hash, palabras_encontradas_hash). La ingesta
+inserta los textos con ON CONFLICT DO NOTHING, así un texto que ya existe no se
+vuelve a escribir, y las lecturas lo resuelven con una búsqueda por clave primaria.
+
+Las filas anteriores a la migración 0007 conservan el texto en las columnas viejas
+hasta que la migración las pasa a text_blobs; las lecturas aceptan las dos formas.
+
+Uso (desde backend/):
+    python -m app.text_store report
+"""
+import argparse
+import hashlib
+from typing import Optional, Dict, Any, Iterable
+
+from sqlalchemy import func, select, text, update, cast, LargeBinary
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.database import SessionLocal
+from app.log_config import get_logger
+from app.models import TestResult, TextBlob
+
+logger = get_logger(__name__)
+
+# Campo de la API -> columna de test_results con el hash del texto
+TEXT_FIELDS = {
+    "palabras_clave": "palabras_clave_hash",
+    "respuesta_bot": "respuesta_bot_hash",
+    "palabras_encontradas": "palabras_encontradas_hash",
+}
+
+# Filas por transacción al migrar los textos existentes
+BACKFILL_CHUNK_ROWS = 5000
+
+
+def text_hash(value: Optional[str]) -> Optional[str]:
+    """sha256 del texto exacto (sin normalizar: el texto se devuelve tal cual se guardó)"""
+    if value is None:
+        return None
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def text_column(field: str):
+    """Expresión que lee el texto de un campo: desde text_blobs o, en filas sin migrar, la columna vieja"""
+    stored = select(TextBlob.content)\
+        .where(TextBlob.hash == getattr(TestResult, TEXT_FIELDS[field]))\
+        .scalar_subquery()
+    return func.coalesce(stored, getattr(TestResult, field)).label(field)
+
+
+def store_texts(db: Session, rows: Iterable[Dict[str, Any]]):
+    """Guardar los textos de filas a insertar (sin commit: usa la transacción de la ingesta)"""
+    blobs = {}
+    for row in rows:
+        for field, hash_column in TEXT_FIELDS.items():
+            if row.get(hash_column):
+                blobs.setdefault(row[hash_column], row[field])
+    if not blobs:
+        return
+    dialect_insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    # Hashes ordenados: dos lotes concurrentes con textos en común se bloquean en el mismo orden
+    db.execute(
+        dialect_insert(TextBlob).on_conflict_do_nothing(index_elements=["hash"]),
+        [{"hash": blob_hash, "content": blobs[blob_hash]} for blob_hash in sorted(blobs)]
+    )
+
+
+def backfill_text_blobs() -> int:
+    """Pasar los textos de las filas existentes a text_blobs, por bloques; retorna las filas migradas"""
+    legacy_columns = [getattr(TestResult, field) for field in TEXT_FIELDS]
+    has_legacy_text = legacy_columns[0].isnot(None)
+    for column in legacy_columns[1:]:
+        has_legacy_text = has_legacy_text | column.isnot(None)
+
+    migrated = 0
+    while True:
+        db = SessionLocal()
+        try:
+            rows = db.query(TestResult.id, *legacy_columns)\
+                .filter(has_legacy_text)\
+                .order_by(TestResult.id)\
+                .limit(BACKFILL_CHUNK_ROWS)\
+                .all()
+            if not rows:
+                break
+            updates = []
+            for row in rows:
+                values = {"id": row.id}
+                for field, hash_column in TEXT_FIELDS.items():
+                    values[field] = getattr(row, field)
+                    values[hash_column] = text_hash(values[field])
+                updates.append(values)
+            store_texts(db, updates)
+            db.execute(update(TestResult), [
+                {"id": values["id"], **{field: None for field in TEXT_FIELDS},
+                 **{hash_column: values[hash_column] for hash_column in TEXT_FIELDS.values()}}
+                for values in updates
+            ])
+            db.commit()
+        except Exception as e:
+            logger.error(f"Error migrando textos a text_blobs: {str(e)}")
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        migrated += len(rows)
+        logger.info(f"{migrated} resultados con textos migrados a text_blobs")
+    return migrated
+
+
+def storage_report() -> Dict[str, Any]:
+    """Bytes de texto que ocuparían las filas sin deduplicar contra los que ocupan en text_blobs"""
+    db = SessionLocal()
+    try:
+        dialect = db.get_bind().dialect.name
+        fields = {}
+        logical_total = 0
+        for field, hash_column in TEXT_FIELDS.items():
+            references, logical = db.query(func.count(TestResult.id), func.sum(_byte_length(dialect, TextBlob.content)))\
+                .join(TextBlob, TextBlob.hash == getattr(TestResult, hash_column))\
+                .one()
+            fields[field] = {"references": int(references or 0), "logical_bytes": int(logical or 0)}
+            logical_total += int(logical or 0)
+
+        blobs, stored = db.query(func.count(TextBlob.hash), func.sum(_byte_length(dialect, TextBlob.content))).one()
+        stored = int(stored or 0)
+        # Cada fila guarda el hash (64 bytes) en lugar del texto
+        hash_bytes = sum(item["references"] for item in fields.values()) * 64
+        report = {
+            "fields": fields,
+            "blobs": int(blobs or 0),
+            "logical_bytes": logical_total,
+            "stored_bytes": stored,
+            "hash_bytes": hash_bytes,
+            "saved_bytes": logical_total - stored - hash_bytes,
+            "dedup_ratio": round(logical_total / (stored + hash_bytes), 2) if stored + hash_bytes else 0.0,
+        }
+        if dialect == "postgresql":
+            report["table_bytes"] = {
+                table: db.execute(text("SELECT pg_total_relation_size(:table)"), {"table": table}).scalar()
+                for table in ("test_results", "text_blobs")
+            }
+        return report
+    finally:
+        db.close()
+
+
+def _byte_length(dialect: str, value):
+    """Largo en bytes (UTF-8) de un texto; en SQLite length() cuenta bytes solo sobre un BLOB"""
+    if dialect == "postgresql":
+        return func.octet_length(value)
+    return func.length(cast(value, LargeBinary))
+
+
+def print_storage_report(report: Dict[str, Any]):
+    mb = 1024 * 1024
+    print("[INFO] Textos deduplicados en text_blobs:", flush=True)
+    for field, item in report["fields"].items():
+        print(f"   {field:>22}: {item['references']:>10} filas, {item['logical_bytes'] / mb:>9.1f} MB sin deduplicar", flush=True)
+    print(f"   {report['blobs']} textos distintos, {report['stored_bytes'] / mb:.1f} MB guardados "
+          f"+ {report['hash_bytes'] / mb:.1f} MB de hashes", flush=True)
+    print(f"[OK] Ahorro: {report['saved_bytes'] / mb:.1f} MB ({report['dedup_ratio']}x)", flush=True)
+    for table, size in report.get("table_bytes", {}).items():
+        print(f"   {table}: {size / mb:.1f} MB en disco (con índices)", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Textos deduplicados de test_results")
+    parser.add_argument("command", choices=["report"], help="report: espacio ahorrado por la deduplicación")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        print_storage_report(storage_report())
@@ -0,0 +1,147 @@
+"""
+Benchmark del costo de instrumentar la API: microsegundos por request y por consulta.
+
+Llama a una app FastAPI mínima directamente por ASGI (sin red ni servidor), con un
+endpoint que no hace nada, y compara el costo por request de:
+- sin middlewares;
+- el middleware anterior: captura de errores + dos prints con flush por request
+  ([REQUEST]/[OK]), con la salida a un archivo como cuando uvicorn corre con logs;
+- el middleware de errores actual (sin prints);
+- el middleware de errores + MetricsMiddleware (app/metrics.py);
+- MetricsMiddleware solo.
+El costo de las métricas es la diferencia contra la misma app sin MetricsMiddleware. Además mide
+lo que agrega a cada llamada a la base sumar su tiempo al request (record_db_time).
+
+Uso (desde backend/):
+    python benchmarks/bench_metricas.py
+    python benchmarks/bench_metricas.py --requests 50000 --repeat 7
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import os
+import sys
+import tempfile
+import time
+import traceback
+
+parser = argparse.ArgumentParser(description="Benchmark del costo de las métricas por request")
+parser.add_argument("--requests", type=int, default=20000, help="Requests por medición")
+parser.add_argument("--queries", type=int, default=200000, help="Llamadas a record_db_time por medición")
+parser.add_argument("--repeat", type=int, default=5, help="Repeticiones de cada medición (se toma la mejor)")
+args = parser.parse_args()
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from app import metrics  # noqa: E402
+
+SCOPE = {
+    "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+    "scheme": "http", "path": "/ping", "raw_path": b"/ping", "root_path": "", "query_string": b"",
+    "headers": [], "server": ("127.0.0.1", 8000), "client": ("127.0.0.1", 50000),
+}
+
+
+def make_app(error_middleware: str = None, with_metrics: bool = False) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    if error_middleware:
+        with_prints = error_middleware == "prints"
+
+        @app.middleware("http")
+        async def catch_exceptions_middleware(request, call_next):
+            try:
+                if with_prints:
+                    print(f"[REQUEST] {request.method} {request.url.path}", flush=True)
+                response = await call_next(request)
+                if with_prints:
+                    print(f"[OK] {request.method} {request.url.path} - Status: {response.status_code}", flush=True)
+                return response
+            except Exception as e:
+                print(f"[ERROR] {str(e)}\n{traceback.format_exc()}", flush=True)
+                return JSONResponse(status_code=500, content={"detail": str(e)})
+
+    if with_metrics:
+        app.add_middleware(metrics.MetricsMiddleware)
+    return app
+
+
+async def run_requests(app, count: int):
+    async def send(message):
+        pass
+
+    for _ in range(count):
+        # Como un servidor: el body en el primer receive; después receive espera una
+        # desconexión que no llega (BaseHTTPMiddleware lo escucha mientras responde)
+        request = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            if request:
+                return request.pop()
+            await asyncio.Event().wait()
+
+        await app(dict(SCOPE), receive, send)
+
+
+def us_per_request(apps: dict) -> dict:
+    """µs por request de cada app, alternando las apps en cada repetición para que el ruido las afecte por igual"""
+    for app in apps.values():
+        asyncio.run(run_requests(app, 100))  # arma el stack de middlewares
+    timings = {label: [] for label in apps}
+    for _ in range(args.repeat):
+        for label, app in apps.items():
+            gc.collect()
+            start = time.perf_counter()
+            asyncio.run(run_requests(app, args.requests))
+            timings[label].append(time.perf_counter() - start)
+    return {label: min(values) / args.requests * 1e6 for label, values in timings.items()}
+
+
+def us_per_db_call() -> float:
+    """Lo que suman run_query/run_write por llamada: dos perf_counter y record_db_time"""
+    token = metrics._db_time.set([0.0, 0])
+    try:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for _ in range(args.queries):
+                call_start = time.perf_counter()
+                metrics.record_db_time(time.perf_counter() - call_start)
+            timings.append(time.perf_counter() - start)
+    finally:
+        metrics._db_time.reset(token)
+    return min(timings) / args.queries * 1e6
+
+
+def main():
+    print(f"\n{args.requests} requests por medición, mejor de {args.repeat} repeticiones")
+    log_path = os.path.join(tempfile.mkdtemp(prefix="bench_metricas_"), "api.log")
+    modes = {
+        "sin middlewares": make_app(),
+        "solo métricas": make_app(with_metrics=True),
+        "antes (errores + prints)": make_app("prints"),
+        "errores sin prints": make_app("plain"),
+        "errores + métricas": make_app("plain", with_metrics=True),
+    }
+    print(f"{'app':>26} | {'µs/request':>10}")
+    print("-" * 40)
+    with open(log_path, "w") as log, contextlib.redirect_stdout(log):
+        results = us_per_request(modes)
+    for label, value in results.items():
+        print(f"{label:>26} | {value:>10.1f}")
+    print(f"\nCosto de las métricas: {results['solo métricas'] - results['sin middlewares']:.1f} µs/request sin otros "
+          f"middlewares, {results['errores + métricas'] - results['errores sin prints']:.1f} µs/request sobre el de errores "
+          f"(antes los prints costaban {results['antes (errores + prints)'] - results['errores sin prints']:.1f} µs/request)")
+
+    print(f"Tiempo en la base por request: {us_per_db_call():.2f} µs por llamada a run_query/run_write")
+
+
+if __name__ == "__main__":
+    main()
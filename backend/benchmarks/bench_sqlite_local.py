@@ -0,0 +1,187 @@
+"""
+Benchmark del modo local SQLite: lecturas y escrituras concurrentes sostenidas.
+
+Mide el mismo escenario con la configuración anterior (journal en modo DELETE,
+synchronous=FULL, caché de 2 MB, sin mmap, cada hilo escribe con su propia conexión) y
+con la actual (WAL, synchronous=NORMAL, caché y mmap grandes, un único hilo escritor,
+ver app/sqlite_local.py). Cada modo corre en un subproceso con su base temporal:
+- escritores: hilos que guardan lotes con create_test_results_batch (como la ingesta
+  del executor) y actualizan el estado de su ejecución con update_test_status;
+- lectores: hilos que repiten get_test_results(limit=100), get_statistics y
+  get_test_status (lo que consulta el dashboard), sin caché de consultas.
+Informa filas escritas y lecturas por segundo, p99 de cada una y los errores
+("database is locked").
+
+Uso (desde backend/):
+    python benchmarks/bench_sqlite_local.py
+    python benchmarks/bench_sqlite_local.py --writers 4 --readers 16 --duration 20
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description="Benchmark del modo local SQLite (lecturas + escrituras concurrentes)")
+parser.add_argument("--writers", type=int, default=2, help="Hilos que escriben lotes")
+parser.add_argument("--readers", type=int, default=8, help="Hilos que leen")
+parser.add_argument("--batch", type=int, default=50, help="Filas por lote")
+parser.add_argument("--rows", type=int, default=20000, help="Resultados a cargar antes de medir")
+parser.add_argument("--duration", type=float, default=10, help="Segundos de carga por modo")
+parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    "antes (DELETE, FULL)": {
+        "SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_CACHE_SIZE_MB": "2",
+        "SQLITE_MMAP_SIZE_MB": "0", "SQLITE_SINGLE_WRITER": "false",
+    },
+    "ahora (WAL, un escritor)": {},
+}
+
+
+def make_rows(tag: str, start: int, size: int) -> list:
+    now = datetime.utcnow()
+    return [
+        {
+            "test_id": tag,
+            "categoria": ["Patentes", "Multas", "Deudas"][i % 3],
+            "pregunta": f"¿Cuánto debo de patente del dominio AB{i:06d}CD?",
+            "palabras_clave": "patente, deuda, cuota",
+            "respuesta_bot": f"La deuda de patente del dominio AB{i:06d}CD es de $ 12.345,67",
+            "validacion_correcta": i % 5 != 0,
+            "palabras_encontradas": "patente, deuda",
+            "resultado_final": "PASS" if i % 5 != 0 else "FAIL",
+            "tiempo_segundos": 1.5 + (i % 7) / 10,
+            "timestamp": now - timedelta(seconds=i),
+            "error": None,
+            "test_type": ["automotor", "inmobiliario", "embarcaciones"][i % 3],
+            "environment": "test",
+            "sheet_name": "Benchmark",
+        }
+        for i in range(start, start + size)
+    ]
+
+
+def percentile(values: list, quantile: float) -> float:
+    if len(values) < 2:
+        return float("nan") if not values else values[0] * 1000
+    return statistics.quantiles(values, n=100, method="inclusive")[round(quantile * 100) - 1] * 1000
+
+
+def worker():
+    """Un modo: la configuración llega por variables de entorno, el resultado sale como JSON"""
+    sys.path.insert(0, BACKEND_DIR)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        from app.database import engine
+        from app.models import Base
+        from app.migrations import run_migrations
+        from app.db_models import create_test_results_batch, get_test_results, get_statistics
+        from app.test_executor import update_test_status, get_test_status
+        Base.metadata.create_all(bind=engine)
+        run_migrations()
+        for start in range(0, args.rows, 5000):
+            create_test_results_batch(make_rows("seed", start, min(5000, args.rows - start)))
+
+    deadline = time.monotonic() + args.duration
+    lock = threading.Lock()
+    write_latencies, read_latencies, errors = [], [], []
+    written = [0]
+
+    def write_loop(index: int):
+        tag = f"bench-{uuid.uuid4().hex[:8]}-{index}"
+        update_test_status(tag, {"test_type": "automotor", "status": "running"})
+        offset = args.rows + index * 10_000_000
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                statuses = create_test_results_batch(make_rows(tag, offset, args.batch))
+                update_test_status(tag, {"status": "running", "logs": [f"{offset} filas"]})
+                elapsed = time.perf_counter() - start
+                with lock:
+                    written[0] += sum(1 for status in statuses if status["status"] == "created")
+                    write_latencies.append(elapsed)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e).splitlines()[0][:80])
+            offset += args.batch
+
+    def read_loop(index: int):
+        rng = random.Random(index)
+        while time.monotonic() < deadline:
+            query = rng.choice([
+                lambda: get_test_results(limit=100),
+                lambda: get_statistics(),
+                lambda: get_test_status("seed"),
+            ])
+            start = time.perf_counter()
+            try:
+                query()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    read_latencies.append(elapsed)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e).splitlines()[0][:80])
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.monotonic()
+        threads = [threading.Thread(target=write_loop, args=(i,)) for i in range(args.writers)]
+        threads += [threading.Thread(target=read_loop, args=(i,)) for i in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+    print(json.dumps({
+        "rows_per_sec": written[0] / elapsed,
+        "write_p99": percentile(write_latencies, 0.99),
+        "reads_per_sec": len(read_latencies) / elapsed,
+        "read_p50": percentile(read_latencies, 0.50),
+        "read_p99": percentile(read_latencies, 0.99),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+    }))
+
+
+def main():
+    print(f"\n{args.writers} escritores (lotes de {args.batch}), {args.readers} lectores, "
+          f"{args.rows} resultados previos, {args.duration:.0f} s por modo")
+    print(f"{'modo':>26} | {'filas/s':>8} | {'p99 lote ms':>11} | {'lecturas/s':>10} | "
+          f"{'p50 lect ms':>11} | {'p99 lect ms':>11} | {'errores':>7}")
+    print("-" * 103)
+    for label, overrides in MODES.items():
+        tmp_dir = tempfile.mkdtemp(prefix="bench_sqlite_")
+        env = dict(os.environ, **overrides)
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+        env["QUERY_CACHE_ENABLED"] = "false"
+        env["ASYNC_DB_ENABLED"] = "false"
+        command = [sys.executable, os.path.abspath(__file__), "--worker", "1"] + sys.argv[1:]
+        output = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+        if output.returncode != 0:
+            print(f"[ERROR] {label}: {output.stderr.strip().splitlines()[-1] if output.stderr.strip() else output.returncode}")
+            continue
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        print(f"{label:>26} | {result['rows_per_sec']:>8.0f} | {result['write_p99']:>11.1f} | "
+              f"{result['reads_per_sec']:>10.0f} | {result['read_p50']:>11.1f} | {result['read_p99']:>11.1f} | "
+              f"{result['errors']:>7}", flush=True)
+        if result["first_error"]:
+            print(f"{'':>26}   primer error: {result['first_error']}")
+
+
+if __name__ == "__main__":
+    if args.worker:
+        worker()
+    else:
+        main()
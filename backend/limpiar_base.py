@@ -12,7 +12,7 @@ try:
 except ImportError:
     print("⚠️  Advertencia: python-dotenv no está instalado. Usando variables de entorno del sistema.")
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, inspect
 from sqlalchemy.orm import sessionmaker
 
 # Obtener DATABASE_URL
@@ -82,6 +82,22 @@ try:
         conn.execute(text("DELETE FROM test_results"))
         print("   [OK] test_results eliminados")
         
+        if inspect(engine).has_table("test_results_rollup"):
+            conn.execute(text("DELETE FROM test_results_rollup"))
+            print("   [OK] test_results_rollup eliminado")
+        
+        if inspect(engine).has_table("test_results_latency_sketch"):
+            conn.execute(text("DELETE FROM test_results_latency_sketch"))
+            print("   [OK] test_results_latency_sketch eliminado")
+        
+        if inspect(engine).has_table("question_history"):
+            conn.execute(text("DELETE FROM question_history"))
+            print("   [OK] question_history eliminado")
+        
+        if inspect(engine).has_table("text_blobs"):
+            conn.execute(text("DELETE FROM text_blobs"))
+            print("   [OK] text_blobs eliminados")
+        
         conn.execute(text("DELETE FROM test_executions"))
         print("   [OK] test_executions eliminados")
         
@@ -39,7 +39,7 @@ export const getStatistics = async (params = {}) => {
 
 export const getResults = async (params = {}) => {
   const response = await api.get('/api/results', { params })
-  return response.data
+  return response.data.results
 }
 
 export const getRecentResults = async (hours = 24) => {
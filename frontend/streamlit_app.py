@@ -7,6 +7,26 @@ import plotly.graph_objects as go
 
 API_URL = st.secrets.get("API_URL", "http://localhost:8000")
 
+# Respuestas guardadas por URL para reutilizarlas cuando el backend responde 304
+MAX_ETAG_ENTRIES = 50
+
+def api_get(path, params=None, timeout=5):
+    """GET con If-None-Match: si los datos no cambiaron se reutiliza la respuesta anterior"""
+    key = (path, tuple(sorted((params or {}).items())))
+    etag_cache = st.session_state.setdefault("etag_cache", {})
+    cached = etag_cache.get(key)
+    headers = {"If-None-Match": cached.headers["ETag"]} if cached is not None else {}
+    
+    response = requests.get(f"{API_URL}{path}", params=params, headers=headers, timeout=timeout)
+    if response.status_code == 304 and cached is not None:
+        return cached
+    if response.status_code == 200 and "ETag" in response.headers:
+        etag_cache.pop(key, None)
+        etag_cache[key] = response
+        while len(etag_cache) > MAX_ETAG_ENTRIES:
+            etag_cache.pop(next(iter(etag_cache)))
+    return response
+
 st.set_page_config(
     page_title="Dashboard de Tests",
     page_icon="📊",
@@ -48,7 +68,7 @@ if resultado_final:
 
 # Obtener resumen
 try:
-    summary_response = requests.get(f"{API_URL}/api/summary", params=params, timeout=5)
+    summary_response = api_get("/api/summary", params=params)
     if summary_response.status_code == 200:
         summary = summary_response.json()
         
@@ -72,7 +92,7 @@ st.markdown("---")
 # Estadísticas
 st.subheader("📈 Estadísticas por Tipo y Entorno")
 try:
-    stats_response = requests.get(f"{API_URL}/api/statistics", params=params, timeout=5)
+    stats_response = api_get("/api/statistics", params=params)
     if stats_response.status_code == 200:
         stats = stats_response.json()
         if stats:
@@ -106,17 +126,44 @@ st.markdown("---")
 # Resultados detallados
 st.subheader("📋 Resultados Detallados")
 
-# Paginación
+# Paginación por cursor: se guarda la pila de cursores de las páginas visitadas
 limit = st.sidebar.slider("Resultados por página", 10, 100, 50)
-offset = st.sidebar.number_input("Página", min_value=0, value=0, step=1) * limit
+
+filtros_actuales = (test_type, environment, resultado_final, limit)
+if st.session_state.get("cursor_filters") != filtros_actuales:
+    st.session_state["cursor_filters"] = filtros_actuales
+    st.session_state["cursor_stack"] = [None]
+cursor_stack = st.session_state["cursor_stack"]
+
+# Columnas que muestra la tabla; con "Mostrar todas las columnas" se piden todas
+display_cols = ['test_id', 'test_type', 'categoria', 'pregunta', 
+              'resultado_final', 'tiempo_segundos', 'timestamp']
+mostrar_todas = st.checkbox("Mostrar todas las columnas")
 
 params["limit"] = limit
-params["offset"] = offset
+if cursor_stack[-1]:
+    params["cursor"] = cursor_stack[-1]
+if not mostrar_todas:
+    params["fields"] = ",".join(display_cols)
 
 try:
-    results_response = requests.get(f"{API_URL}/api/results", params=params, timeout=5)
+    results_response = api_get("/api/results", params=params)
     if results_response.status_code == 200:
-        results = results_response.json()
+        page = results_response.json()
+        results = page["results"]
+        next_cursor = page["next_cursor"]
+        
+        col_prev, col_page, col_next = st.sidebar.columns(3)
+        with col_prev:
+            if st.button("⬅️", disabled=len(cursor_stack) == 1, help="Página anterior"):
+                cursor_stack.pop()
+                st.rerun()
+        with col_page:
+            st.markdown(f"Página {len(cursor_stack)}")
+        with col_next:
+            if st.button("➡️", disabled=not next_cursor, help="Página siguiente"):
+                cursor_stack.append(next_cursor)
+                st.rerun()
         
         if results:
             df = pd.DataFrame(results)
@@ -127,19 +174,12 @@ try:
                 lambda x: f"✅ {x}" if x == "PASS" else f"❌ {x}"
             )
             
-            # Mostrar columnas seleccionadas
-            display_cols = ['test_id', 'test_type', 'categoria', 'pregunta', 
-                          'resultado_final', 'tiempo_segundos', 'timestamp']
-            
+            # Mostrar columnas seleccionadas (o todas si se pidieron)
             st.dataframe(
-                df[display_cols],
+                df if mostrar_todas else df[display_cols],
                 use_container_width=True,
                 hide_index=True
             )
-            
-            # Botón para ver detalles completos
-            if st.checkbox("Mostrar todas las columnas"):
-                st.dataframe(df, use_container_width=True, hide_index=True)
         else:
             st.info("No hay resultados con los filtros seleccionados")
 except Exception as e:
@@ -149,21 +189,22 @@ except Exception as e:
 st.markdown("---")
 st.subheader("📉 Tendencia (Últimas 24 horas)")
 try:
-    recent_response = requests.get(f"{API_URL}/api/results/recent/24", timeout=5)
-    if recent_response.status_code == 200:
-        recent_results = recent_response.json()
-        if recent_results:
-            recent_df = pd.DataFrame(recent_results)
-            recent_df['timestamp'] = pd.to_datetime(recent_df['timestamp'])
-            recent_df['hour'] = recent_df['timestamp'].dt.floor('H')
-            
-            # Normalizar todos los tipos de FAIL a un solo 'FAIL'
-            recent_df['resultado_final_normalizado'] = recent_df['resultado_final'].apply(
-                lambda x: 'PASS' if x == 'PASS' else 'FAIL'
-            )
-            
-            hourly_stats = recent_df.groupby(['hour', 'resultado_final_normalizado']).size().reset_index(name='count')
-            hourly_stats = hourly_stats.rename(columns={'resultado_final_normalizado': 'resultado_final'})
+    trends_response = api_get(
+        "/api/trends",
+        params={
+            "bucket": "1h",
+            # Alineado a la hora: la misma consulta en cada rerun aprovecha la caché del backend
+            "since": (datetime.utcnow() - timedelta(hours=24)).replace(minute=0, second=0, microsecond=0).isoformat()
+        },
+        timeout=5
+    )
+    if trends_response.status_code == 200:
+        trend_points = trends_response.json()
+        if trend_points:
+            # El backend ya agrupa por hora y PASS/FAIL; solo se suman tipos y entornos
+            trends_df = pd.DataFrame(trend_points)
+            trends_df['hour'] = pd.to_datetime(trends_df['bucket'])
+            hourly_stats = trends_df.groupby(['hour', 'resultado_final'])['count'].sum().reset_index()
             
             fig = px.line(
                 hourly_stats,
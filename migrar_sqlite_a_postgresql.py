@@ -71,18 +71,60 @@ except Exception as e:
     sqlite_conn.close()
     sys.exit(1)
 
+# Tamaño de cada lote enviado a PostgreSQL (una transacción por lote)
+LOTE_MIGRACION = 1000
+
+def _parse_timestamp(value):
+    """SQLite puede devolver el timestamp como texto"""
+    if not value:
+        return datetime.utcnow()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
 # Migrar datos
 try:
+    from app.db_models import create_test_results_batch
+    from app.models import Base
+    from app.migrations import run_migrations
+    
+    # Asegurar el esquema actual (tablas y migraciones) en PostgreSQL
+    Base.metadata.create_all(bind=pg_engine)
+    run_migrations()
+    
     print("\n[INFO] Iniciando migracion...")
     
     # Obtener todos los registros de SQLite
     # Nota: PostgreSQL usa 'timestamp' en lugar de 'created_at'
-    sqlite_results = sqlite_conn.execute(text("""
+    # Si la base SQLite ya tiene la migración 0007, los textos están en text_blobs
+    if inspect(sqlite_engine).has_table("text_blobs"):
+        text_columns = """
+            coalesce((SELECT content FROM text_blobs WHERE hash = palabras_clave_hash), palabras_clave) AS palabras_clave,
+            coalesce((SELECT content FROM text_blobs WHERE hash = respuesta_bot_hash), respuesta_bot) AS respuesta_bot,
+            coalesce((SELECT content FROM text_blobs WHERE hash = palabras_encontradas_hash), palabras_encontradas) AS palabras_encontradas
+        """
+    else:
+        text_columns = "palabras_clave, respuesta_bot, palabras_encontradas"
+    # Si ya tiene la migración 0008, las dimensiones y el resultado están como ids en tablas dim_*
+    if inspect(sqlite_engine).has_table("dim_test_type"):
+        dimension_columns = """
+            coalesce((SELECT name FROM dim_categoria WHERE id = categoria_id), categoria) AS categoria,
+            coalesce(CASE WHEN passed THEN 'PASS' ELSE (SELECT name FROM dim_fail_reason WHERE id = fail_reason_id) END,
+                     resultado_final) AS resultado_final,
+            coalesce((SELECT name FROM dim_test_type WHERE id = test_type_id), test_type) AS test_type,
+            coalesce((SELECT name FROM dim_environment WHERE id = environment_id), environment) AS environment,
+            coalesce((SELECT name FROM dim_sheet_name WHERE id = sheet_name_id), sheet_name) AS sheet_name
+        """
+    else:
+        dimension_columns = "categoria, resultado_final, test_type, environment, sheet_name"
+    # Los resultados sin run_id (anteriores a la migración 0010) reciben uno fijo por fila,
+    # así volver a correr el script los encuentra como duplicados (ON CONFLICT) en vez de copiarlos de nuevo
+    sqlite_columns = [column["name"] for column in inspect(sqlite_engine).get_columns("test_results")]
+    run_id_column = "run_id" if "run_id" in sqlite_columns else "NULL AS run_id"
+    sqlite_results = sqlite_conn.execute(text(f"""
         SELECT 
-            id, test_id, categoria, pregunta, palabras_clave, 
-            respuesta_bot, validacion_correcta, palabras_encontradas,
-            resultado_final, tiempo_segundos, error, test_type,
-            environment, sheet_name, timestamp
+            id, {run_id_column}, test_id, pregunta, {text_columns}, {dimension_columns},
+            validacion_correcta, tiempo_segundos, error, timestamp
         FROM test_results
         ORDER BY timestamp
     """))
@@ -91,64 +133,47 @@ try:
     skipped = 0
     errors = 0
     
-    for row in sqlite_results:
-        try:
-            # Verificar si ya existe en PostgreSQL (por test_id + pregunta)
-            check = pg_conn.execute(
-                text("SELECT id FROM test_results WHERE test_id = :test_id AND pregunta = :pregunta"),
-                {"test_id": row.test_id, "pregunta": row.pregunta}
-            )
-            existing = check.fetchone()
-            
-            if existing:
+    def migrar_lote(rows):
+        """Insertar un lote en PostgreSQL; los duplicados se detectan en la base (ON CONFLICT)"""
+        global migrated, skipped, errors
+        statuses = create_test_results_batch([
+            {
+                "run_id": row.run_id or f"legacy-{row.id}",
+                "test_id": row.test_id,
+                "categoria": row.categoria,
+                "pregunta": row.pregunta,
+                "palabras_clave": row.palabras_clave,
+                "respuesta_bot": row.respuesta_bot,
+                "validacion_correcta": bool(row.validacion_correcta),
+                "palabras_encontradas": row.palabras_encontradas,
+                "resultado_final": row.resultado_final,
+                "tiempo_segundos": float(row.tiempo_segundos) if row.tiempo_segundos else 0.0,
+                "error": row.error,
+                "test_type": row.test_type,
+                "environment": row.environment,
+                "sheet_name": row.sheet_name,
+                "timestamp": _parse_timestamp(row.timestamp)
+            }
+            for row in rows
+        ])
+        for row, status in zip(rows, statuses):
+            if status["status"] == "created":
+                migrated += 1
+            elif status["status"] == "duplicate":
                 skipped += 1
-                continue
-            
-            # Insertar en PostgreSQL
-            # Nota: PostgreSQL usa 'timestamp' en lugar de 'created_at'
-            pg_conn.execute(
-                text("""
-                    INSERT INTO test_results (
-                        test_id, categoria, pregunta, palabras_clave,
-                        respuesta_bot, validacion_correcta, palabras_encontradas,
-                        resultado_final, tiempo_segundos, error, test_type,
-                        environment, sheet_name, timestamp
-                    ) VALUES (
-                        :test_id, :categoria, :pregunta, :palabras_clave,
-                        :respuesta_bot, :validacion_correcta, :palabras_encontradas,
-                        :resultado_final, :tiempo_segundos, :error, :test_type,
-                        :environment, :sheet_name, :timestamp
-                    )
-                """),
-                {
-                    "test_id": row.test_id,
-                    "categoria": row.categoria,
-                    "pregunta": row.pregunta,
-                    "palabras_clave": row.palabras_clave,
-                    "respuesta_bot": row.respuesta_bot,
-                    "validacion_correcta": row.validacion_correcta,
-                    "palabras_encontradas": row.palabras_encontradas,
-                    "resultado_final": row.resultado_final,
-                    "tiempo_segundos": float(row.tiempo_segundos) if row.tiempo_segundos else 0.0,
-                    "error": row.error,
-                    "test_type": row.test_type,
-                    "environment": row.environment,
-                    "sheet_name": row.sheet_name,
-                    "timestamp": row.timestamp if row.timestamp else datetime.utcnow()
-                }
-            )
-            migrated += 1
-            
-            if migrated % 10 == 0:
-                print(f"  Migrados: {migrated} registros...")
-                
-        except Exception as e:
-            errors += 1
-            print(f"  [ERROR] Error migrando registro {row.id}: {e}")
-            continue
-    
-    # Commit
-    pg_conn.commit()
+            else:
+                errors += 1
+                print(f"  [ERROR] Error migrando registro {row.id}: {status.get('error')}")
+        print(f"  Migrados: {migrated} registros (omitidos: {skipped})...")
+    
+    lote = []
+    for row in sqlite_results:
+        lote.append(row)
+        if len(lote) >= LOTE_MIGRACION:
+            migrar_lote(lote)
+            lote = []
+    if lote:
+        migrar_lote(lote)
     
     # Contar registros en PostgreSQL después
     result = pg_conn.execute(text("SELECT COUNT(*) FROM test_results"))
@@ -1,5 +1,10 @@
+import { randomUUID } from 'crypto';
 import { defineConfig, devices } from '@playwright/test';
 
+/* Id de esta ejecución, enviado con cada resultado (run_id). El executor del backend pasa
+   el suyo; si se corre a mano se genera uno acá y los workers lo heredan del proceso principal. */
+process.env.RUN_ID = process.env.RUN_ID || randomUUID();
+
 /**
  * @see https://playwright.dev/docs/test-configuration
  */
@@ -70,7 +70,7 @@ async function testBackend() {
   console.log('3️⃣ Probando GET /api/results...');
   try {
     const response = await fetch(`${API_URL}/api/results?limit=5`);
-    const results = await response.json();
+    const { results } = await response.json();
     console.log(`✅ Se pueden leer resultados`);
     console.log(`   Total de resultados: ${results.length}`);
     if (results.length > 0) {
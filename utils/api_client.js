@@ -6,6 +6,11 @@
 // Los tests cargan dotenv antes de importar este módulo
 const API_URL = process.env.API_URL || 'http://localhost:8000';
 
+// Id de la ejecución (lo fija playwright.config.ts o el executor del backend): junto con
+// test_type, environment, test_id y la pregunta identifica cada resultado, así un reintento
+// del mismo envío no se duplica y dos ejecuciones distintas nunca se pisan
+const RUN_ID = process.env.RUN_ID || null;
+
 // Log para debug - mostrar qué URL se está usando
 if (process.env.API_URL) {
   console.log(`🔍 [api_client] API_URL configurada: ${API_URL}`);
@@ -21,6 +26,7 @@ if (process.env.API_URL) {
 async function guardarResultadoEnBD(resultado) {
   try {
     const payload = {
+      run_id: RUN_ID,
       test_id: resultado.id,
       categoria: resultado.categoria,
       pregunta: resultado.pregunta,
@@ -52,7 +58,12 @@ async function guardarResultadoEnBD(resultado) {
 
     if (response.ok) {
       const data = await response.json();
-      console.log(`💾 [${resultado.id}] Resultado guardado en BD: ID ${data.id}`);
+      if (response.status === 202) {
+        // Backend con INGEST_MODE=queue: el resultado queda encolado y se guarda en lote
+        console.log(`💾 [${resultado.id}] Resultado encolado para guardar en BD`);
+      } else {
+        console.log(`💾 [${resultado.id}] Resultado guardado en BD: ID ${data.id}`);
+      }
       return true;
     } else {
       const errorText = await response.text();
@@ -75,6 +86,7 @@ async function guardarResultadoEnBD(resultado) {
 async function guardarResultadosEnLote(resultados) {
   try {
     const payload = resultados.map(resultado => ({
+      run_id: RUN_ID,
       test_id: resultado.id,
       categoria: resultado.categoria,
       pregunta: resultado.pregunta,
@@ -101,8 +113,13 @@ async function guardarResultadosEnLote(resultados) {
 
     if (response.ok) {
       const data = await response.json();
-      console.log(`💾 Guardados ${data.length} resultados en BD`);
-      return true;
+      console.log(`💾 Guardados ${data.created}/${data.total} resultados en BD`);
+      if (data.failed > 0) {
+        data.results
+          .filter(item => item.status === 'error')
+          .forEach(item => console.warn(`⚠️ Item ${item.index} no guardado: ${item.error}`));
+      }
+      return data.failed === 0;
     } else {
       const errorText = await response.text();
       console.warn(`⚠️ Error guardando lote en BD: ${response.status} - ${errorText}`);